@@ -0,0 +1,42 @@
+"""Time the typo tolerant game search
+
+    python benchmarks/fuzzy_search.py --games 100000
+"""
+import argparse
+import time
+from support import setup_django, test_database, create_games, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    setup_django()
+    from gamer_rater_server_api.models import Game
+    from gamer_rater_server_api.search import fuzzy
+
+    with test_database():
+        create_games(arguments.games)
+        titles = list(Game.objects.values_list('title', flat=True)[:3])
+
+        started = time.perf_counter()
+        fuzzy.game_index.clear()
+        fuzzy.search('warm up')
+        print(f'{arguments.games} games, index built in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+        # Misspell a few real titles and designers by dropping or swapping letters
+        queries = ['Milton Bradly', 'Reiner Knizya', 'Uwe Rosenburg', 'dragn']
+        queries += [title[:5] + title[6:] for title in titles]
+        queries += [title[:3] + title[4] + title[3] + title[5:] for title in titles]
+
+        print(f'{"query":<40}{"matches":>8}{"median ms":>11}')
+        for query in queries:
+            matches = fuzzy.search(query)
+            elapsed = timed(lambda: fuzzy.search(query), arguments.repeat)
+            print(f'{query:<40}{len(matches):>8}{elapsed:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Compare the FTS5 game search with the old LIKE '%x%' title scan
+
+    python benchmarks/game_search.py --games 100000
+"""
+import argparse
+from support import setup_django, test_database, create_games, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    setup_django()
+    from gamer_rater_server_api.models import Game
+    from gamer_rater_server_api.search import fulltext
+
+    with test_database():
+        create_games(arguments.games)
+
+        print(f'{arguments.games} games, median of {arguments.repeat} runs, first page of 10 plus count')
+        print(f'{"query":<16}{"LIKE scan ms":>14}{"FTS5 ms":>10}')
+        for search_text in ('dragon', 'knizia', 'castle quest', 'treas', 'nomatch'):
+            def like_scan():
+                games = Game.objects.filter(title__contains=search_text).order_by('id')
+                games.count()
+                list(games[:10])
+
+            def full_text():
+                games = fulltext.search(Game.objects.all(), search_text).order_by('search_rank', 'id')
+                games.count()
+                list(games[:10])
+
+            print(f'{search_text:<16}{timed(like_scan, arguments.repeat):>14.1f}'
+                  f'{timed(full_text, arguments.repeat):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Compare writing each rating in its own transaction with the write-behind buffer
+
+    python benchmarks/rating_ingest.py --ratings 5000 --threads 8
+
+`--threads` threads submit `--ratings` ratings between them, spread over a
+few popular games, first writing each one like RatingView.create does and
+then through an ingest.RatingBuffer. The buffered time runs until the last
+batch is committed. The database is a file, so that commits cost what
+they do in production.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from support import setup_django, test_database, create_games
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ratings', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--users', type=int, default=2000)
+    arguments = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, connection
+    from gamer_rater_server_api.ingest import RatingBuffer
+    from gamer_rater_server_api.models import Game, Rating
+
+    directory = tempfile.mkdtemp()
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    with test_database():
+        create_games(arguments.games)
+        game_ids = list(Game.objects.values_list('id', flat=True))
+        User.objects.bulk_create([User(username=f'rater{index}') for index in range(arguments.users)])
+        user_ids = list(User.objects.filter(username__startswith='rater').values_list('id', flat=True))
+        rng = random.Random(1)
+        ratings = [(rng.choice(game_ids), rng.choice(user_ids), rng.randint(1, 10)) for _ in range(arguments.ratings)]
+        # Every rating of a pair goes through the same thread, so the
+        # last one submitted is also the last one in `ratings`
+        shares = [[] for _ in range(arguments.threads)]
+        for game_id, user_id, rating in ratings:
+            shares[(game_id * 7919 + user_id) % arguments.threads].append((game_id, user_id, rating))
+
+        print(f'{len(ratings)} ratings of {len(game_ids)} games')
+        for threads in (1, arguments.threads):
+            failures = []
+
+            def write_directly(index):
+                for game_id, user_id, rating in ratings[index::threads]:
+                    try:
+                        Rating.objects.upsert(user_id, {game_id: rating})
+                    except OperationalError:
+                        failures.append(1)
+                connection.close()
+
+            Rating.objects.all().delete()
+            elapsed = run_threads(threads, write_directly)
+            written = len(ratings) - len(failures)
+            print(f'one transaction each, {threads} threads: {written / elapsed:8.0f} ratings/s, '
+                  f'{len(failures)} failed on a locked database')
+
+        Rating.objects.all().delete()
+        buffer = RatingBuffer()
+
+        def submit(index):
+            for game_id, user_id, rating in shares[index]:
+                buffer.submit(game_id, user_id, rating)
+
+        started = time.perf_counter()
+        run_threads(arguments.threads, submit)
+        buffer.close()
+        elapsed = time.perf_counter() - started
+        print(f'write-behind buffer, {arguments.threads} threads: {len(ratings) / elapsed:8.0f} ratings/s')
+
+        # Coalescing keeps the last rating of each pair, like the direct writes
+        expected = {(game_id, user_id): rating for game_id, user_id, rating in ratings}
+        stored = {(game_id, user_id): rating for game_id, user_id, rating
+                  in Rating.objects.values_list('game_id', 'user_id', 'rating')}
+        print(f'stored ratings match the submissions: {stored == expected}')
+
+
+if __name__ == '__main__':
+    main()
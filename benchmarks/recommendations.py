@@ -0,0 +1,75 @@
+"""Time the factorization job and the recommendations of the profile endpoint
+
+    python benchmarks/recommendations.py --games 100000 --ratings 300000
+
+Rates `--ratings` random games by `--users` users with ratings that follow
+a few hidden tastes, runs build_recommendations over them, then times
+recommend() alone and a whole GET /profile for one of the users.
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from support import setup_django, test_database, create_games, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--ratings', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=20)
+    arguments = parser.parse_args()
+
+    setup_django()
+    from io import StringIO
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import override_settings
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+    from gamer_rater_server_api.models import Game, Rating
+    from gamer_rater_server_api.recommendations import current_recommender
+
+    with test_database(), tempfile.TemporaryDirectory() as directory, \
+            override_settings(RECOMMENDATIONS_DIR=directory, ALLOWED_HOSTS=['testserver']):
+        rng = np.random.default_rng(1)
+        create_games(arguments.games)
+        game_ids = np.array(Game.objects.order_by('id').values_list('id', flat=True))
+        User.objects.bulk_create([User(username=f'rater{index}') for index in range(arguments.users)])
+        user_ids = np.array(User.objects.filter(username__startswith='rater').values_list('id', flat=True))
+
+        # Ratings from 3 hidden tastes, so there is something to find
+        user_tastes = rng.normal(size=(len(user_ids), 3))
+        game_tastes = rng.normal(size=(len(game_ids), 3))
+        cells = np.unique(rng.integers(len(user_ids), size=arguments.ratings) * len(game_ids)
+                          + rng.integers(len(game_ids), size=arguments.ratings))
+        users, games = cells // len(game_ids), cells % len(game_ids)
+        ratings = np.clip(np.rint(5.5 + 1.5 * np.einsum('ij,ij->i', user_tastes[users], game_tastes[games])), 1, 10)
+        for start in range(0, len(cells), 50000):
+            Rating.objects.bulk_create([
+                Rating(user_id=user_id, game_id=game_id, rating=rating)
+                for user_id, game_id, rating in zip(user_ids[users[start:start + 50000]].tolist(),
+                                                    game_ids[games[start:start + 50000]].tolist(),
+                                                    ratings[start:start + 50000].astype(int).tolist())
+            ], batch_size=5000)
+
+        started = time.perf_counter()
+        output = StringIO()
+        call_command('build_recommendations', stdout=output)
+        print(output.getvalue().strip())
+        print(f'build_recommendations: {time.perf_counter() - started:.1f} s')
+
+        user = User.objects.get(pk=int(user_ids[0]))
+        rated = list(Rating.objects.filter(user=user).values_list('game_id', flat=True))
+        recommender = current_recommender(directory)
+        print(f'recommend() over {len(recommender.games)} games: '
+              f'{timed(lambda: recommender.recommend(user.id, exclude=rated), arguments.repeat):.2f} ms')
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+        print(f'GET /profile: {timed(lambda: client.get("/profile"), arguments.repeat):.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Compare the DRF list serializers with the fast values_list() serializers
+
+    python benchmarks/serializers.py --rows 2000
+
+Both paths run the queries for a page of `--rows` rows and build the
+response data, but do not render JSON.
+"""
+import argparse
+import random
+from support import setup_django, test_database, create_games, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from gamer_rater_server_api.fast_serializers import FastSerializer
+    from gamer_rater_server_api.models import Category, Game, GameCategory, Image, Rating, Review
+    from gamer_rater_server_api.views.game import GameSerializer
+    from gamer_rater_server_api.views.image import ImageSerializer
+    from gamer_rater_server_api.views.rating import RatingSerializer
+    from gamer_rater_server_api.views.review import ReviewSerializer
+
+    with test_database():
+        rng = random.Random(1)
+        create_games(arguments.games)
+        game_ids = list(Game.objects.values_list('id', flat=True))
+        Category.objects.bulk_create([Category(label=f'Category {index}') for index in range(20)])
+        categories = list(Category.objects.all())
+        GameCategory.objects.bulk_create([
+            GameCategory(game_id=game_id, category_id=category.id)
+            for game_id in game_ids for category in rng.sample(categories, 3)
+        ], batch_size=5000)
+        User.objects.bulk_create([User(username=f'rater{index}') for index in range(100)])
+        users = list(User.objects.filter(username__startswith='rater'))
+        for model, values in ((Rating, {'rating': 5}), (Review, {'review': 'Pretty good'}),
+                              (Image, {'image': 'actionimages/cover.png'})):
+            model.objects.bulk_create([
+                model(game_id=rng.choice(game_ids), user=rng.choice(users), **values)
+                for _ in range(arguments.rows)
+            ], batch_size=5000)
+
+        print(f'{arguments.rows} rows per page, median of {arguments.repeat} runs')
+        print(f'{"endpoint":<10}{"DRF rows/s":>14}{"fast rows/s":>14}{"speedup":>10}')
+        cases = (
+            ('games', GameSerializer, Game.objects.for_display()),
+            ('ratings', RatingSerializer, Rating.objects.all()),
+            ('reviews', ReviewSerializer, Review.objects.all()),
+            ('images', ImageSerializer, Image.objects.all()),
+        )
+        for name, serializer_class, queryset in cases:
+            queryset = queryset.order_by('id')
+            fast = FastSerializer(serializer_class)
+
+            def drf():
+                serializer_class(list(queryset[:arguments.rows]), many=True).data
+
+            def fast_path():
+                fast.serialize(fast.rows(queryset)[:arguments.rows])
+
+            drf_ms = timed(drf, arguments.repeat)
+            fast_ms = timed(fast_path, arguments.repeat)
+            print(f'{name:<10}{arguments.rows / drf_ms * 1000:>14.0f}'
+                  f'{arguments.rows / fast_ms * 1000:>14.0f}{drf_ms / fast_ms:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Shared setup for the benchmark scripts
+
+Every benchmark runs against a throwaway test database built from the
+migrations, so it never touches db.sqlite3. Run them from the repository
+root, for example:
+
+    python benchmarks/game_search.py --games 100000
+"""
+import contextlib
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    'dragon', 'castle', 'empire', 'quest', 'island', 'pirate', 'galaxy', 'dungeon', 'kingdom',
+    'railway', 'harvest', 'mystery', 'shadow', 'legend', 'frontier', 'colony', 'ocean', 'forest',
+    'ticket', 'settler', 'tower', 'crown', 'battle', 'garden', 'market', 'zombie', 'robot',
+    'wizard', 'knight', 'storm', 'temple', 'desert', 'village', 'canyon', 'rocket', 'treasure',
+)
+SYLLABLES = tuple(consonant + vowel for consonant in 'bcdfghklmnprstvz' for vowel in 'aeiou') + ('ar', 'en', 'ix', 'or')
+DESIGNERS = (
+    'Milton Bradley', 'Hasbro', 'Reiner Knizia', 'Uwe Rosenberg', 'Klaus Teuber',
+    'Alan Moon', 'Vlaada Chvatil', 'Stefan Feld', 'Jamey Stegmaier', 'Elizabeth Hargrave',
+)
+
+
+def setup_django():
+    """Configure Django so the benchmark can use the ORM"""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gamer_rater_server.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    """Create a fresh test database for the duration of the block"""
+    from django.db import connection
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def create_games(count, batch_size=5000, seed=1):
+    """Insert `count` games with made up titles and return their owner"""
+    from django.contrib.auth.models import User
+    from gamer_rater_server_api.models import Game
+
+    rng = random.Random(seed)
+    # A few thousand made up words on top of the real ones, so that word
+    # frequencies look more like a real catalog than a tiny vocabulary would
+    vocabulary = list(WORDS) + sorted({
+        ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(5000)
+    })
+    user = User.objects.create(username='benchmark')
+    for start in range(0, count, batch_size):
+        Game.objects.bulk_create([
+            Game(
+                title=' '.join(rng.sample(vocabulary, 3)).title()[:50],
+                description=' '.join(rng.choice(vocabulary) for _ in range(12))[:150],
+                designer=rng.choice(DESIGNERS),
+                release_year=rng.randint(1950, 2021),
+                number_of_player=rng.randint(1, 8),
+                game_duration=rng.choice((15, 30, 45, 60, 90, 120, 180)),
+                age_range=rng.choice((6, 8, 10, 12, 14, 18)),
+                user=user,
+            )
+            for _ in range(min(batch_size, count - start))
+        ])
+    return user
+
+
+def timed(function, repeat=5):
+    """Run `function` `repeat` times and return the median time in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
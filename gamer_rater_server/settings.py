@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,7 +54,18 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # JSON through orjson when it is installed, and MessagePack for
+    # clients that ask for it when msgpack is, see gamer_rater_server_api.renderers
+    'DEFAULT_RENDERER_CLASSES': [
+        'gamer_rater_server_api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['gamer_rater_server_api.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'gamer_rater_server_api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['gamer_rater_server_api.parsers.MessagePackParser'] if find_spec('msgpack') else []),
 }
 
 CORS_ORIGIN_WHITELIST = (
@@ -80,7 +92,18 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # JSON through orjson when it is installed, and MessagePack for
+    # clients that ask for it when msgpack is, see gamer_rater_server_api.renderers
+    'DEFAULT_RENDERER_CLASSES': [
+        'gamer_rater_server_api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['gamer_rater_server_api.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'gamer_rater_server_api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['gamer_rater_server_api.parsers.MessagePackParser'] if find_spec('msgpack') else []),
 }
 
 CORS_ORIGIN_WHITELIST = (
@@ -120,6 +143,83 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+#
+# `responses` holds the versioned API response bodies, see gamer_rater_server_api.cache.
+# The table versions they are keyed by live in the database, so each process may keep
+# its own bodies. The local memory backend evicts the least recently used entries past
+# MAX_ENTRIES, point it at a shared backend such as Redis or Memcached to share them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+
+# Most games written by one INSERT statement of POST /games/bulk
+
+GAME_BULK_BATCH_SIZE = 500
+
+
+# Serialize list pages straight from .values_list() rows rather than through
+# DRF, see gamer_rater_server_api.fast_serializers. The output is the same.
+
+FAST_READ_SERIALIZERS = True
+
+
+# The leaderboards rank games by their ratings pooled with PRIOR_WEIGHT
+# ratings of PRIOR_RATING, so a game needs many votes to leave the middle.
+# Run `manage.py rebuild_rating_totals` after changing either.
+
+LEADERBOARD_PRIOR_RATING = 5.5
+LEADERBOARD_PRIOR_WEIGHT = 10
+
+
+# Queue POST /ratings in process and write them in batches from a background
+# thread, see gamer_rater_server_api.ingest. Off by default, as queued ratings
+# are lost if the process is killed before their batch is written.
+
+RATING_WRITE_BEHIND = False
+RATING_WRITE_BEHIND_MAX_PENDING = 10000
+RATING_WRITE_BEHIND_BATCH_SIZE = 1000
+# Seconds a rating waits for its batch, and a request for room in a full buffer
+RATING_WRITE_BEHIND_INTERVAL = 0.05
+RATING_WRITE_BEHIND_TIMEOUT = 1
+
+
+# /games/trending ranks games by their new ratings, and new reviews counting
+# REVIEW_WEIGHT ratings each, decaying by half every HALF_LIFE_HOURS. Run
+# `manage.py update_trending` every few minutes to fold in new activity,
+# which leaves the last SETTLE_SECONDS for the next run.
+
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_REVIEW_WEIGHT = 2
+TRENDING_SETTLE_SECONDS = 30
+
+
+# Most similar games kept per game by `manage.py build_similar_games`
+
+SIMILAR_GAMES_NEIGHBORS = 20
+
+
+# `manage.py build_recommendations` writes the rating factorization here,
+# and the profile endpoint recommends RECOMMENDED_GAMES games from it
+
+RECOMMENDATIONS_DIR = BASE_DIR / 'recommendations'
+RECOMMENDATIONS_FACTORS = 32
+RECOMMENDED_GAMES = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class GamerRaterServerApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gamer_rater_server_api'
+
+    def ready(self):
+        from gamer_rater_server_api import signals  # noqa: F401 registers the receivers
+        from gamer_rater_server_api.search import fulltext
+        post_migrate.connect(fulltext.install_triggers, sender=self)
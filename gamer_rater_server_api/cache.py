@@ -0,0 +1,240 @@
+"""Versioned response cache and conditional GET for read heavy endpoints
+
+Every table a response is built from has a version number, a
+TableVersion row in the database. Responses are stored under a key made
+of the URL and the versions of their tables, so bumping a version, see
+gamer_rater_server_api.signals, makes every response built from that
+table unreachable at once without having to find and delete them. The
+orphaned entries age out through the backend's LRU eviction.
+
+The same versions, together with the time each table was last written,
+give the ETag and Last-Modified of a response before it is built, so an
+unchanged response is answered with 304 Not Modified.
+
+The versions live in the database so that every process sees a bump
+made by any other, including management commands. Writes made through
+the ORM bump once their transaction commits, each written table once,
+see bump_versions_on_commit, so a transaction writing many rows costs
+one small UPDATE per table and holds no TableVersion row locked while it
+runs. The response bodies are kept in the `responses` alias of the
+CACHES setting, which may be local to each process, as their keys
+already carry the versions they were built at.
+"""
+import functools
+import hashlib
+import time
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from gamer_rater_server_api.models import TableVersion
+
+CACHE_ALIAS = 'responses'
+
+
+def response_cache():
+    return caches[CACHE_ALIAS]
+
+
+def table_stamps(tables, using=None, request=None):
+    """{table: (version, unix time of its last write)}, one query
+
+    A table without a row yet starts at the current time, above any
+    version it could have had before. With a `request` the stamps are
+    read once per request, for the decorators stacked on one view.
+    """
+    known = getattr(request, '_table_stamps', {}) if request is not None else {}
+    wanted = [table for table in dict.fromkeys(tables) if table not in known]
+    stamps = dict(known)
+    if wanted:
+        rows = TableVersion.objects.db_manager(using)
+        stamps.update((table, (version, modified)) for table, version, modified
+                      in rows.filter(table__in=wanted).values_list('table', 'version', 'modified'))
+        missing = [table for table in wanted if table not in stamps]
+        if missing:
+            rows.bulk_create([TableVersion(table=table, version=time.time_ns(), modified=time.time())
+                              for table in missing], ignore_conflicts=True)
+            stamps.update((table, (version, modified)) for table, version, modified
+                          in rows.filter(table__in=missing).values_list('table', 'version', 'modified'))
+    if request is not None:
+        request._table_stamps = stamps
+    return stamps
+
+
+def table_versions(tables, request=None):
+    """Current version of each table"""
+    stamps = table_stamps(tables, request=request)
+    return [stamps[table][0] for table in tables]
+
+
+def bump_versions(*tables, using=None):
+    """Invalidate every cached response and ETag built from these tables, in every process
+
+    Inside a transaction the bump only shows once it commits, together
+    with the write it is for.
+    """
+    tables = sorted(set(tables))
+    rows = TableVersion.objects.db_manager(using).filter(table__in=tables)
+    if rows.update(version=F('version') + 1, modified=time.time()) < len(tables):
+        # A table seen for the first time starts above anything read before
+        table_stamps(tables, using)
+        rows.update(version=F('version') + 1, modified=time.time())
+
+
+def bump_versions_on_commit(*tables, using=None):
+    """bump_versions once the current transaction commits, at once outside of one
+
+    The tables are collected on the connection and the first commit hook
+    bumps them all, so a table written many times in one transaction is
+    bumped once. Tables of a rolled back transaction are bumped with the
+    next commit on the connection, which is harmless.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    connection = connections[using]
+    if not hasattr(connection, 'pending_table_bumps'):
+        connection.pending_table_bumps = set()
+    connection.pending_table_bumps.update(tables)
+    transaction.on_commit(lambda: flush_bumps(using), using=using)
+
+
+def flush_bumps(using):
+    """Bump the tables bump_versions_on_commit collected on a connection"""
+    connection = connections[using]
+    tables, connection.pending_table_bumps = connection.pending_table_bumps, set()
+    if tables:
+        bump_versions(*tables, using=using)
+
+
+def request_key(request, ignore=()):
+    """The URL with its query parameters in a canonical order, leaving out `ignore`"""
+    params = sorted(item for item in request.query_params.lists() if item[0] not in ignore)
+    return (request.build_absolute_uri(request.path), params)
+
+
+def cached_response(*models, ignore_params=()):
+    """Cache the successful responses of a ViewSet method
+
+    Arguments:
+        models -- the models the response is built from, a write to any of
+                  them invalidates it
+        ignore_params -- query parameters the method's response does not
+                         depend on, requests that only differ in them
+                         share a cache entry
+    """
+    tables = [model._meta.db_table for model in models]
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            versions = table_versions(tables, request)
+            key = 'response:' + hashlib.sha1(repr((request_key(request, ignore_params), versions)).encode('utf-8')).hexdigest()
+
+            cache = response_cache()
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+                cache.set(key, response.data)
+            return response
+        return wrapper
+    return decorator
+
+
+def rows_by_pk(model):
+    """`rows` for a detail route, the one row its URL points at"""
+    return lambda view, request, pk=None: model.objects.filter(pk=pk)
+
+
+def rows_listed(view, request, *args, **kwargs):
+    """`rows` for a list route, the rows of the view's get_queryset()"""
+    return view.get_queryset()
+
+
+def rows_stamp(rows, related=()):
+    """Number of rows and their latest updated_at, one aggregate query
+
+    Edits move the latest updated_at and deletions lower the count, so the
+    pair changes whenever the set of rows does. `related` foreign keys add
+    the latest updated_at of the rows they point at.
+    """
+    fields = ['updated_at'] + [f'{name}__updated_at' for name in related]
+    stamp = rows.order_by().aggregate(
+        count=Count('pk'), **{f'latest_{index}': Max(field) for index, field in enumerate(fields)})
+    return tuple(value.isoformat() if hasattr(value, 'isoformat') else value for value in stamp.values())
+
+
+def conditional_response(*models, rows=None, related=(), per_user=None):
+    """Answer GET requests on a ViewSet method with 304 when the client's copy is current
+
+    The ETag and Last-Modified are worked out without building the response.
+
+    Arguments:
+        models -- the models the response is built from, their table
+                  versions go into the ETag
+        rows -- optional `rows(view, request, *args, **kwargs)` returning
+                the queryset of rows the response shows. When it is
+                filtered, their count and latest updated_at go into the
+                ETag instead of their table's version, so a write to other
+                rows leaves it unchanged. An unfiltered queryset is the
+                whole table, and its table version is used without
+                reading any rows.
+        related -- foreign keys of `rows` whose latest updated_at also go
+                   into the ETag
+        per_user -- optional `per_user(request)` returning the models a
+                    request's response reads for its user, or None when
+                    it is the same for everyone. The user and the
+                    versions of those models then go into the ETag.
+    """
+    tables = [model._meta.db_table for model in models]
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            user_models = per_user(request) if per_user is not None else None
+            user_tables = [model._meta.db_table for model in user_models or ()]
+            queryset = None
+            if rows is not None:
+                try:
+                    queryset = rows(self, request, *args, **kwargs)
+                except ValueError:
+                    # A malformed id in the URL, left for the view to report
+                    return method(self, request, *args, **kwargs)
+            row_tables = [] if queryset is None else [queryset.model._meta.db_table] + [
+                queryset.model._meta.get_field(name).related_model._meta.db_table for name in related]
+            stamps = table_stamps(tables + user_tables + row_tables, request=request)
+
+            parts = [request_key(request), request.accepted_media_type, [stamps[table][0] for table in tables]]
+            if user_models:
+                parts += [request.auth.user_id, [stamps[table][0] for table in user_tables]]
+            if queryset is not None and queryset.query.where:
+                parts.append(rows_stamp(queryset, related))
+            elif queryset is not None:
+                # Every row of the table, whose versions are as exact and
+                # cost no scan
+                parts.append([stamps[table][0] for table in row_tables])
+            etag = quote_etag(hashlib.sha1(repr(parts).encode('utf-8')).hexdigest())
+
+            # HTTP dates only have whole seconds, so a table written during
+            # the current second gets no Last-Modified. Another write in the
+            # same second would otherwise be hidden from If-Modified-Since.
+            modified = max((modified for _, modified in stamps.values()), default=time.time())
+            last_modified = int(modified) if time.time() - modified >= 1 else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+
+            if not response.has_header('ETag'):
+                response['ETag'] = etag
+            if last_modified is not None and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
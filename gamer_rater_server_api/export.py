@@ -0,0 +1,85 @@
+"""Streaming export of the whole game catalog as NDJSON or CSV
+
+Games are read a chunk at a time with `.iterator()`, and the categories of
+each chunk are fetched with one query, so memory use does not grow with
+the catalog and the first lines go out before the last games are read.
+The rating totals are stored on the game rows and need no extra query.
+"""
+import csv
+import io
+import json
+from gamer_rater_server_api.models import Game, GameCategory
+
+# Game columns in the order they are exported, `categories` is added last
+COLUMNS = (
+    'id', 'title', 'description', 'designer', 'number_of_player', 'release_year',
+    'game_duration', 'age_range', 'rating_count', 'average_rating',
+)
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CHUNK_SIZE = 2000
+
+
+def game_chunks(chunk_size=CHUNK_SIZE, using='default'):
+    """Lists of game dicts in id order, each with its categories as {id, label}"""
+    rows = Game.objects.using(using).order_by('id').values(*COLUMNS).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield with_categories(chunk, using)
+            chunk = []
+    if chunk:
+        yield with_categories(chunk, using)
+
+
+def with_categories(games, using='default'):
+    categories = {game['id']: [] for game in games}
+    game_categories = (GameCategory.objects.using(using)
+                       .filter(game_id__in=list(categories))
+                       .order_by('game_id', 'category_id')
+                       .values_list('game_id', 'category_id', 'category__label'))
+    for game_id, category_id, label in game_categories:
+        categories[game_id].append({'id': category_id, 'label': label})
+    for game in games:
+        game['categories'] = categories[game['id']]
+    return games
+
+
+def ndjson_lines(chunks):
+    """One JSON object per line, a string per chunk"""
+    for games in chunks:
+        yield ''.join(json.dumps(game, separators=(',', ':')) + '\n' for game in games)
+
+
+def csv_lines(chunks):
+    """A header row, then a row per game with its category labels joined by `|`"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS + ('categories',))
+    for games in chunks:
+        for game in games:
+            writer.writerow([game[column] for column in COLUMNS] +
+                            ['|'.join(category['label'] for category in game['categories'])])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # No games at all still gets its header
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_lines(output, chunk_size=CHUNK_SIZE, using='default'):
+    """The catalog in `output` format, one string per chunk of games
+
+    Raises:
+        ValueError -- for an unknown output format
+    """
+    if output not in CONTENT_TYPES:
+        raise ValueError(f'output must be one of {", ".join(CONTENT_TYPES)}')
+    chunks = game_chunks(chunk_size, using)
+    return ndjson_lines(chunks) if output == 'ndjson' else csv_lines(chunks)
@@ -0,0 +1,222 @@
+"""Fast path for serializing list pages without building model instances
+
+A DRF ModelSerializer creates a model instance per row and then walks its
+field objects for every one of them. The list endpoints get the same
+output from `.values_list()` rows instead: the serializer's fields are
+compiled once into a plan of columns and converters, and each row tuple
+is turned straight into a dict. Nested serializers of a foreign key
+become joined columns of the same query, and nested lists of a many to
+many field are read for the whole page with one more query.
+
+The plan is derived from the serializer class, so the output is the same
+as the serializer's, field for field and in the same order. Serializers
+with fields the plan does not understand, such as method fields or dotted
+sources, are left to DRF. FAST_READ_SERIALIZERS = False in settings
+turns the fast path off.
+"""
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import relations, serializers
+from rest_framework.settings import api_settings
+from gamer_rater_server_api.fieldsets import serializer_fields
+
+# Field types whose to_representation is exactly this builtin
+BUILTIN_CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+    serializers.CharField: str,
+}
+
+# Kinds of plan steps
+VALUE, FILE, NESTED, MANY = range(4)
+
+
+class Unsupported(Exception):
+    """The serializer has a field the fast path cannot reproduce"""
+
+
+class Plan:
+    """Columns to read and the steps that turn a row of them into a dict
+
+    Steps are (key, kind, index, detail) in output order:
+        VALUE -- detail converts the non-null value at `index`
+        FILE -- detail is the storage of the file name at `index`
+        NESTED -- detail is the steps of the nested object, `index` is the
+                  column of its foreign key when it may be null
+        MANY -- detail is a ManyPlan, `index` is the primary key column
+    """
+
+    def __init__(self):
+        self.columns = []
+        self.steps = []
+
+    def column(self, lookup):
+        """Index of `lookup` among the columns, adding it when missing"""
+        if lookup not in self.columns:
+            self.columns.append(lookup)
+        return self.columns.index(lookup)
+
+
+class ManyPlan:
+    """How to read the related objects of a many to many field for a page of rows
+
+    They are read off the join table, joined to the related table, in
+    the order of their primary keys.
+    """
+
+    def __init__(self, model_field, plan):
+        self.through = model_field.remote_field.through
+        self.source = model_field.m2m_field_name()
+        self.target = model_field.m2m_reverse_field_name()
+        self.plan = plan
+
+
+def readable_fields(serializer, names=None):
+    """Fields of `serializer` it would write out, only those in `names` when given"""
+    return [
+        field for field in serializer.fields.values()
+        if not field.write_only and (names is None or field.field_name in names)
+    ]
+
+
+def compile_fields(fields, model, plan, prefix=''):
+    """Add `fields`, read off `model` through `prefix`, to the columns of `plan`
+
+    Returns:
+        list -- the steps for the fields
+    """
+    steps = []
+    opts = model._meta
+    for field in fields:
+        source = field.source
+        if source == '*' or '.' in source:
+            raise Unsupported(field.field_name)
+        try:
+            model_field = opts.get_field(source)
+        except FieldDoesNotExist:
+            raise Unsupported(field.field_name)
+
+        if isinstance(field, serializers.ListSerializer):
+            if prefix or not model_field.many_to_many:
+                raise Unsupported(field.field_name)
+            related = Plan()
+            many = ManyPlan(model_field, related)
+            related.steps = compile_fields(
+                readable_fields(field.child), model_field.related_model, related, f'{many.target}__')
+            steps.append((field.field_name, MANY, plan.column(opts.pk.name), many))
+        elif isinstance(field, serializers.BaseSerializer):
+            if not model_field.many_to_one:
+                raise Unsupported(field.field_name)
+            null_index = plan.column(prefix + source) if model_field.null else None
+            nested = compile_fields(
+                readable_fields(field), model_field.related_model, plan, f'{prefix}{source}__')
+            steps.append((field.field_name, NESTED, null_index, nested))
+        elif isinstance(field, (relations.RelatedField, relations.ManyRelatedField)):
+            if not isinstance(field, relations.PrimaryKeyRelatedField) or not model_field.many_to_one:
+                raise Unsupported(field.field_name)
+            steps.append((field.field_name, VALUE, plan.column(prefix + source), lambda value: value))
+        elif not model_field.concrete or model_field.is_relation:
+            raise Unsupported(field.field_name)
+        elif isinstance(field, serializers.FileField):
+            if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+                raise Unsupported(field.field_name)
+            steps.append((field.field_name, FILE, plan.column(prefix + source), model_field.storage))
+        else:
+            convert = BUILTIN_CONVERTERS.get(type(field), field.to_representation)
+            steps.append((field.field_name, VALUE, plan.column(prefix + source), convert))
+    return steps
+
+
+def run_steps(steps, row, related, request):
+    """The dict for one row, as the compiled serializer would have built it"""
+    data = {}
+    for key, kind, index, detail in steps:
+        if kind == VALUE:
+            value = row[index]
+            data[key] = None if value is None else detail(value)
+        elif kind == NESTED:
+            if index is not None and row[index] is None:
+                data[key] = None
+            else:
+                data[key] = run_steps(detail, row, related, request)
+        elif kind == MANY:
+            data[key] = related[key].get(row[index], [])
+        else:
+            name = row[index]
+            if not name:
+                data[key] = None
+            else:
+                url = detail.url(name)
+                data[key] = request.build_absolute_uri(url) if request is not None else url
+    return data
+
+
+class FastSerializer:
+    """Serializes `.values_list()` rows of a queryset the way `serializer_class` would
+
+    Arguments:
+        serializer_class -- the ModelSerializer to reproduce
+        fields -- the field names a `?fields=` request narrowed it to, or None
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        model = serializer_class.Meta.model
+        self.plan = Plan()
+        self.plan.steps = compile_fields(readable_fields(serializer_class(), fields), model, self.plan)
+
+    def rows(self, queryset, keep=()):
+        """`queryset` as named rows of the plan's columns
+
+        The plan's columns come first, so the steps find them where they
+        expect. `keep` adds more, such as the ordering the pages are cut
+        by, with an optional leading `-`.
+        """
+        extra = ['id'] + [name.lstrip('-') for name in keep]
+        columns = list(dict.fromkeys(self.plan.columns + extra))
+        return queryset.prefetch_related(None).values_list(*columns, named=True)
+
+    def serialize(self, rows, request=None):
+        """A list of dicts, one per row from rows()"""
+        rows = list(rows)
+        related = {
+            key: self.read_many(detail, [row[index] for row in rows], request)
+            for key, kind, index, detail in self.plan.steps if kind == MANY
+        }
+        return [run_steps(self.plan.steps, row, related, request) for row in rows]
+
+    def read_many(self, many, ids, request):
+        """{row id: list of related dicts} for the given row ids"""
+        plan = many.plan
+        rows = (many.through.objects
+                .filter(**{f'{many.source}__in': ids})
+                .order_by(many.source, many.target)
+                .values_list(many.source, *plan.columns))
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row[0], []).append(run_steps(plan.steps, row[1:], {}, request))
+        return grouped
+
+
+# Compiled serializers by (serializer class, requested fields). The fields
+# are cut down to the serializer's own, so each class has a bounded number
+# of entries however many different `?fields=` clients send
+compiled = {}
+
+
+def fast_serializer(serializer_class, request):
+    """The FastSerializer for `serializer_class` and the request's `?fields=`
+
+    Returns:
+        FastSerializer -- or None when the fast path is off or cannot
+                          reproduce the serializer, to use DRF instead
+    """
+    if not getattr(settings, 'FAST_READ_SERIALIZERS', False):
+        return None
+    fields = serializer_fields(serializer_class, request)
+    key = (serializer_class, fields)
+    if key not in compiled:
+        try:
+            compiled[key] = FastSerializer(serializer_class, fields)
+        except Unsupported:
+            compiled[key] = None
+    return compiled[key]
@@ -0,0 +1,143 @@
+"""Sparse fieldsets for the resource endpoints
+
+    http://localhost:8000/games?fields=id,title,average_rating
+
+A `fields` query parameter narrows each serialized object down to the
+listed fields, in their usual order. Unknown names are ignored, and a
+request that names none of the serializer's fields gets all of them. The
+queryset is narrowed to match: columns that are not needed are deferred,
+and prefetches and joins for relations that are left out are dropped, so
+a narrow request also costs less in the database.
+
+Serializers that nest the object a foreign key points at load it through
+eager_queryset, joined into the same query with only the columns the
+nested serializer shows.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+
+
+def requested_fields(request):
+    """The set of field names asked for, or None when the request did not narrow them"""
+    params = getattr(request, 'query_params', None)
+    if params is None or not params.get(FIELDS_PARAM):
+        return None
+    return {name.strip() for name in params[FIELDS_PARAM].split(',') if name.strip()}
+
+
+def serializer_fields(serializer_class, request):
+    """The requested names `serializer_class` shows, or None for all of its fields
+
+    Names the serializer does not have are dropped, so the result is one of
+    a fixed set per serializer whatever the client sends. When none are
+    left the request is treated like one without `?fields=`.
+    """
+    wanted = requested_fields(request)
+    if wanted is None:
+        return None
+    return frozenset(wanted.intersection(serializer_class.Meta.fields)) or None
+
+
+class SparseFieldsMixin:
+    """Serializer mixin that leaves out the fields a `?fields=` request did not ask for"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        wanted = serializer_fields(type(self), self.context.get('request'))
+        if wanted is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in wanted}
+
+
+def nested_objects(serializer_class):
+    """{field name: nested serializer} of the foreign keys `serializer_class` shows as objects"""
+    opts = serializer_class.Meta.model._meta
+    nested = {}
+    for name, field in serializer_class().fields.items():
+        if not isinstance(field, serializers.BaseSerializer) or isinstance(field, serializers.ListSerializer):
+            continue
+        try:
+            if opts.get_field(field.source).many_to_one:
+                nested[name] = field
+        except FieldDoesNotExist:
+            pass
+    return nested
+
+
+def nested_columns(name, serializer):
+    """The `name__column` lookups of the columns a nested serializer shows"""
+    opts = serializer.Meta.model._meta
+    columns = []
+    for field in serializer.fields.values():
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if model_field.concrete and not model_field.is_relation:
+            columns.append(f'{name}__{field.source}')
+    return columns
+
+
+def eager_queryset(queryset, serializer_class):
+    """`queryset` with the objects `serializer_class` nests joined in, and no unused columns
+
+    The nested foreign keys are select_related, so a page of rows is one
+    query rather than one more per row and nested object, and only() the
+    columns the serializers show are read, of this model and the joined ones.
+    """
+    opts = queryset.model._meta
+    nested = nested_objects(serializer_class)
+    columns = [opts.pk.name]
+    for name in serializer_class.Meta.fields:
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.many_to_many:
+            columns.append(name)
+        if name in nested:
+            columns.extend(nested_columns(name, nested[name]))
+    return queryset.select_related(*nested).only(*dict.fromkeys(columns))
+
+
+def prune_queryset(queryset, serializer_class, request, keep=()):
+    """Narrow `queryset` to what `serializer_class` needs for the requested fields
+
+    Arguments:
+        keep -- more model fields to load whatever was asked for, such as
+                the list ordering, with an optional leading `-`
+    """
+    wanted = serializer_fields(serializer_class, request)
+    if wanted is None:
+        return queryset
+
+    opts = queryset.model._meta
+    names = [name for name in serializer_class.Meta.fields if name in wanted]
+    columns, relations = [opts.pk.name], set()
+    for name in names + [name.lstrip('-') for name in keep]:
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.is_relation:
+            relations.add(name)
+        if field.concrete and not field.many_to_many:
+            columns.append(name)
+
+    prefetches = [
+        lookup for lookup in queryset._prefetch_related_lookups
+        if (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split('__')[0] in relations
+    ]
+    queryset = queryset.prefetch_related(None).prefetch_related(*prefetches)
+    if isinstance(queryset.query.select_related, dict):
+        joins = [name for name in queryset.query.select_related if name in relations]
+        queryset = queryset.select_related(None)
+        if joins:
+            queryset = queryset.select_related(*joins)
+            nested = nested_objects(serializer_class)
+            columns.extend(column for name in joins if name in nested
+                           for column in nested_columns(name, nested[name]))
+    return queryset.only(*dict.fromkeys(columns))
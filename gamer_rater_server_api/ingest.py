@@ -0,0 +1,151 @@
+"""Write-behind buffer for rating submissions
+
+With RATING_WRITE_BEHIND on, POST /ratings does not write the rating
+itself. It hands it to the process's RatingBuffer and answers 202
+Accepted, and a background thread writes everything that has piled up
+in one transaction, see RatingQuerySet.upsert_pairs. A burst of ratings
+then costs one commit and one rating totals update per game per batch,
+instead of a commit per rating queued up on the database's write lock.
+
+Ratings of the same game by the same user that arrive before their batch
+is written are coalesced, the last one wins. At most
+RATING_WRITE_BEHIND_MAX_PENDING ratings wait at a time. Past that a
+request waits up to RATING_WRITE_BEHIND_TIMEOUT seconds for room and is
+then answered 503, so a flood slows clients down instead of growing the
+queue. The buffer is flushed on interpreter exit, but ratings waiting
+in a process that is killed are lost, which is why this is off by
+default. Each process has its own buffer.
+"""
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+from gamer_rater_server_api.models import Rating
+
+logger = logging.getLogger(__name__)
+
+
+class RatingBuffer:
+    """Ratings waiting to be written, by (game id, user id)
+
+    Arguments:
+        max_pending -- most ratings waiting at a time, besides the batch
+                       being written
+        batch_size -- pending ratings that wake the writer early
+        interval -- most seconds a rating waits before its batch is written
+        background -- whether to start the writer thread, flush() writes
+                      the pending ratings on the calling thread either way
+    """
+
+    def __init__(self, max_pending=10000, batch_size=1000, interval=0.05, background=True):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.interval = interval
+        self.background = background
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        # Keeps batches in order, a later rating must not be written first
+        self.writing = threading.Lock()
+        self.thread = None
+        self.closed = False
+
+    def submit(self, game_id, user_id, rating, timeout=None):
+        """Queue a rating, replacing one of the same pair still waiting
+
+        Returns:
+            bool -- False when the buffer stayed full for `timeout` seconds
+                    or is closed, and the rating was not taken
+        """
+        pair = (game_id, user_id)
+        with self.changed:
+            has_room = lambda: self.closed or pair in self.pending or len(self.pending) < self.max_pending
+            if not self.changed.wait_for(has_room, timeout) or self.closed:
+                return False
+            self.pending[pair] = rating
+            if len(self.pending) >= self.batch_size:
+                self.changed.notify_all()
+            if self.background and self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='rating-write-behind', daemon=True)
+                self.thread.start()
+        return True
+
+    def flush(self):
+        """Write every rating waiting now, one transaction per batch
+
+        Returns:
+            int -- the number of ratings written
+        """
+        with self.writing:
+            with self.changed:
+                batch, self.pending = self.pending, {}
+                self.changed.notify_all()
+            if not batch:
+                return 0
+            try:
+                Rating.objects.upsert_pairs(batch)
+            except DatabaseError:
+                # Most likely a game deleted since its rating was taken,
+                # write the rest one by one and drop what still fails
+                logger.exception('Writing a batch of %d ratings failed, retrying them one by one', len(batch))
+                for pair, rating in batch.items():
+                    try:
+                        Rating.objects.upsert_pairs({pair: rating})
+                    except DatabaseError:
+                        logger.exception('Dropped the rating %s of game %s by user %s', rating, *pair)
+            return len(batch)
+
+    def run(self):
+        """Body of the writer thread, flushes until the buffer is closed
+
+        A batch that fails for any other reason than a DatabaseError is
+        logged and dropped, and the thread goes on with the next one, so
+        the buffer cannot fill up for good behind a dead writer.
+        """
+        try:
+            while True:
+                with self.changed:
+                    self.changed.wait_for(lambda: self.closed or len(self.pending) >= self.batch_size,
+                                          self.interval)
+                    if self.closed:
+                        return
+                try:
+                    close_old_connections()
+                    self.flush()
+                except Exception:
+                    logger.exception('Writing a batch of ratings failed, they were dropped')
+        finally:
+            connection.close()
+            with self.changed:
+                # Should the thread die anyway, the next submit starts another
+                if self.thread is threading.current_thread():
+                    self.thread = None
+
+    def close(self):
+        """Stop the writer thread and write what is still waiting"""
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+
+# The process's buffer, made on first use
+buffer = None
+buffer_lock = threading.Lock()
+
+
+def rating_buffer():
+    """The RatingBuffer of this process, set up from the RATING_WRITE_BEHIND settings"""
+    global buffer
+    with buffer_lock:
+        if buffer is None:
+            buffer = RatingBuffer(
+                max_pending=settings.RATING_WRITE_BEHIND_MAX_PENDING,
+                batch_size=settings.RATING_WRITE_BEHIND_BATCH_SIZE,
+                interval=settings.RATING_WRITE_BEHIND_INTERVAL,
+            )
+            atexit.register(buffer.close)
+        return buffer
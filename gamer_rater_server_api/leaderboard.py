@@ -0,0 +1,29 @@
+"""Top rated games overall and per category
+
+Games are ranked by their Bayesian rating, which is stored on the game and
+copied onto its GameCategory rows whenever a rating is written, see
+GameQuerySet.apply_rating_change. Both columns have a descending index, so
+a leaderboard reads only as many index entries as it returns games, however
+large the catalog is.
+"""
+from gamer_rater_server_api.models import Game, GameCategory
+
+# Most games a single leaderboard request can ask for
+MAX_LIMIT = 100
+
+
+def top_games(limit=10):
+    """The `limit` games with the highest Bayesian rating, best first"""
+    limit = max(1, min(limit, MAX_LIMIT))
+    return list(Game.objects.for_display().order_by('-bayesian_rating', 'id')[:limit])
+
+
+def top_games_in_category(category_id, limit=10):
+    """The `limit` games of a category with the highest Bayesian rating, best first"""
+    limit = max(1, min(limit, MAX_LIMIT))
+    game_ids = list(GameCategory.objects
+                    .filter(category_id=category_id)
+                    .order_by('-bayesian_rating', 'game_id')
+                    .values_list('game_id', flat=True)[:limit])
+    games = Game.objects.for_display().in_bulk(game_ids)
+    return [games[game_id] for game_id in game_ids if game_id in games]
@@ -0,0 +1,51 @@
+"""Management command to factorize the ratings for personalized recommendations
+
+    python manage.py build_recommendations [--factors 32] [--iterations 10]
+
+Fits the model of gamer_rater_server_api.recommendations to every rating
+and writes the factors under RECOMMENDATIONS_DIR, where the profile
+endpoint picks them up on its next request.
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gamer_rater_server_api.models import Rating
+
+
+class Command(BaseCommand):
+    help = 'Factorize the ratings into the user and game factors the profile recommendations are scored with'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=settings.RECOMMENDATIONS_FACTORS,
+                            help='Factors per user and game')
+        parser.add_argument('--iterations', type=int, default=10, help='Alternating least squares iterations')
+        parser.add_argument('--regularization', type=float, default=0.1,
+                            help='Ridge penalty per rating a user or game has')
+        parser.add_argument('--workers', type=int, default=None, help='Threads to solve with, every core by default')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            from gamer_rater_server_api import recommendations
+            from gamer_rater_server_api.similarity import RatingMatrix
+        except ImportError:
+            raise CommandError('build_recommendations needs NumPy, pip install numpy')
+
+        started = time.perf_counter()
+        name = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        matrix = RatingMatrix.from_ratings(Rating.objects.using(options['database']))
+        self.stdout.write(f'Loaded {len(matrix.user_values)} ratings of '
+                          f'{len(matrix.games)} games by {len(matrix.users)} users')
+
+        def report(iteration, error):
+            self.stdout.write(f'Iteration {iteration}: training RMSE {error:.3f}')
+
+        user_factors, game_factors = recommendations.factorize(
+            matrix, factors=options['factors'], iterations=options['iterations'],
+            regularization=options['regularization'], workers=options['workers'], report=report)
+        recommendations.save(str(settings.RECOMMENDATIONS_DIR), name, matrix, user_factors, game_factors)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote the factors of {len(matrix.users)} users and {len(matrix.games)} games in {elapsed:.1f} s'))
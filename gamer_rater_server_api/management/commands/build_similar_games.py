@@ -0,0 +1,139 @@
+"""Management command to work out the games most similar to each game
+
+    python manage.py build_similar_games [--full]
+
+Reads every rating into a gamer_rater_server_api.similarity.RatingMatrix
+and writes the top neighbors of each game to the SimilarGame table, which
+/games/{id}/similar reads.
+
+After the first run only games whose ratings changed since the previous
+run are redone, found by their updated_at, which every rating write
+moves. A changed game's similarity to every other game is worked out
+anyway, so the other games' lists are patched with it. A list is only
+redone from scratch when a changed game drops out of it and nothing
+known can take its place.
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from gamer_rater_server_api.cache import bump_versions
+from gamer_rater_server_api.models import Game, Rating, SimilarGame, SimilarityRun
+
+
+class Command(BaseCommand):
+    help = 'Work out the most similar games of each game from the ratings, for /games/{id}/similar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Redo every game, not just the changed ones')
+        parser.add_argument('--neighbors', type=int, default=settings.SIMILAR_GAMES_NEIGHBORS,
+                            help='Most similar games kept per game')
+        parser.add_argument('--block-size', type=int, default=256, help='Games worked out together')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            from gamer_rater_server_api import similarity
+        except ImportError:
+            raise CommandError('build_similar_games needs NumPy, pip install numpy')
+        self.similarity = similarity
+        self.using = options['database']
+        self.k = options['neighbors']
+        self.block_size = options['block_size']
+
+        started = time.perf_counter()
+        started_at = timezone.now()
+        last = SimilarityRun.objects.using(self.using).order_by('-started_at').first()
+        full = options['full'] or last is None or last.neighbors != self.k
+
+        self.matrix = similarity.RatingMatrix.from_ratings(Rating.objects.using(self.using))
+        self.stdout.write(f'Loaded {len(self.matrix.user_values)} ratings of '
+                          f'{len(self.matrix.games)} games by {len(self.matrix.users)} users')
+
+        with transaction.atomic(using=self.using):
+            if full:
+                SimilarGame.objects.using(self.using).all().delete()
+                lists = self.top_lists(self.matrix.games)
+            else:
+                changed = list(Game.objects.using(self.using)
+                               .filter(updated_at__gte=last.started_at).values_list('id', flat=True))
+                self.stdout.write(f'{len(changed)} games changed since {last.started_at:%Y-%m-%d %H:%M:%S}')
+                lists = self.patched_lists(changed)
+                SimilarGame.objects.using(self.using).filter(game_id__in=list(lists)).delete()
+
+            SimilarGame.objects.using(self.using).bulk_create([
+                SimilarGame(game_id=game_id, similar_game_id=neighbor_id, score=score)
+                for game_id, neighbors in lists.items()
+                for neighbor_id, score in neighbors
+            ], batch_size=5000)
+            SimilarityRun.objects.using(self.using).create(
+                started_at=started_at, neighbors=self.k, full=full, games=len(lists))
+            # Committed with the new lists, so no server keeps answering
+            # 304 for the old ones
+            bump_versions(SimilarGame._meta.db_table, SimilarityRun._meta.db_table, using=self.using)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rewrote the similar games of {len(lists)} games in {elapsed:.1f} s'))
+
+    def similarities(self, game_ids):
+        """(game id, columns, scores) for blocks of the given games, see RatingMatrix.similarities"""
+        columns = self.matrix.columns(game_ids)
+        columns = columns[columns >= 0]
+        for start in range(0, len(columns), self.block_size):
+            block = columns[start:start + self.block_size]
+            yield (self.matrix.games[block],) + self.matrix.similarities(block)
+
+    def top_lists(self, game_ids):
+        """{game id: [(neighbor id, score)]} for the given games, best first"""
+        lists = {int(game_id): [] for game_id in game_ids}
+        for block_ids, columns, scores in self.similarities(game_ids):
+            top = self.similarity.top_neighbors(columns, scores, self.k)
+            for game_id, (neighbors, values) in zip(block_ids, top):
+                lists[int(game_id)] = list(zip(self.matrix.games[neighbors].tolist(), values.tolist()))
+        return lists
+
+    def patched_lists(self, changed):
+        """{game id: [(neighbor id, score)]} for the changed games and the lists they appear in"""
+        changed_set = set(changed)
+        lists = {game_id: [] for game_id in changed}
+
+        # Every nonzero similarity between a changed game and any other
+        found = {}
+        for block_ids, columns, scores in self.similarities(changed):
+            top = self.similarity.top_neighbors(columns, scores, self.k)
+            for game_id, (neighbors, values) in zip(block_ids, top):
+                lists[int(game_id)] = list(zip(self.matrix.games[neighbors].tolist(), values.tolist()))
+            rows, positions = scores.nonzero()
+            for other_id, game_id, score in zip(self.matrix.games[columns[rows]].tolist(),
+                                                block_ids[positions].tolist(),
+                                                scores[rows, positions].tolist()):
+                found.setdefault(other_id, {})[game_id] = score
+
+        # The lists of the other games that gain or lose a changed game
+        others = set(found) | set(SimilarGame.objects.using(self.using)
+                                  .filter(similar_game_id__in=changed).values_list('game_id', flat=True))
+        others -= changed_set
+        old_lists = {game_id: [] for game_id in others}
+        rows = (SimilarGame.objects.using(self.using)
+                .filter(game_id__in=list(others))
+                .order_by('game_id', '-score', 'similar_game_id')
+                .values_list('game_id', 'similar_game_id', 'score'))
+        for game_id, neighbor_id, score in rows.iterator():
+            old_lists[game_id].append((neighbor_id, score))
+
+        redo = []
+        for game_id, old in old_lists.items():
+            merged = {neighbor_id: score for neighbor_id, score in old if neighbor_id not in changed_set}
+            merged.update(found.get(game_id, {}))
+            top = sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:self.k]
+            # Games off a full list score no more than its last game. Off a
+            # short list they score zero, as every nonzero score made it in.
+            if len(old) < self.k or (len(top) == self.k and top[-1][1] >= old[-1][1]):
+                lists[game_id] = top
+            else:
+                redo.append(game_id)
+
+        lists.update(self.top_lists(redo))
+        return lists
@@ -0,0 +1,25 @@
+"""Management command to export the game catalog"""
+from django.core.management.base import BaseCommand
+from gamer_rater_server_api import export
+
+
+class Command(BaseCommand):
+    help = 'Write every game with its categories and rating totals as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=sorted(export.CONTENT_TYPES), default='ndjson')
+        parser.add_argument('--file', help='Write to this file instead of standard output')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        lines = export.export_lines(options['output'], options['chunk_size'], options['database'])
+        if options['file'] is None:
+            for chunk in lines:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['file'], 'w', newline='', encoding='utf-8') as file:
+            for chunk in lines:
+                file.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exported the games to {options["file"]}'))
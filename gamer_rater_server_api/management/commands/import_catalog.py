@@ -0,0 +1,308 @@
+"""Management command to load games, categories, ratings and reviews from files
+
+    python manage.py import_catalog --categories categories.csv --games games.ndjson \
+        --game-categories game_categories.csv --ratings ratings.ndjson --reviews reviews.csv
+
+Every file is NDJSON (.ndjson or .jsonl) or CSV with a header row:
+
+    categories       id, label
+    games            id, title, description, designer, number_of_player, release_year,
+                     game_duration, age_range, and optionally user and categories,
+                     as written by export_games
+    game categories  game, category
+    ratings          game, user, rating, and optionally created_at, the last one
+                     of a user for a game wins
+    reviews          game, user, review, and optionally created_at
+
+Rows point at each other with the ids used in the files, which are mapped
+to the new database ids in memory, so no row is looked up one at a time.
+A game id that is not in the games file is taken to be a game already in
+the database. Users are referred to by username, and categories are
+matched to existing ones by label.
+
+created_at is an ISO 8601 time, such as 2024-05-01T18:30:00Z, taken to be
+in TIME_ZONE when it has no offset. Ratings and reviews without one are
+dated UNDATED, so loading a back catalog does not make its games look
+like they are trending. update_trending only reads activity newer than
+its previous run, so neither do old times from the files.
+"""
+import csv
+import itertools
+import json
+import os
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from gamer_rater_server_api import trending
+from gamer_rater_server_api.cache import bump_versions
+from gamer_rater_server_api.models import Category, Game, GameCategory, Rating, Review
+from gamer_rater_server_api.models.rating import MAX_RATING, MIN_RATING
+from gamer_rater_server_api.search import bitmap, fulltext, fuzzy, suggest
+
+GAME_TEXT_COLUMNS = ('title', 'description', 'designer')
+GAME_NUMBER_COLUMNS = ('number_of_player', 'release_year', 'game_duration', 'age_range')
+
+# Skipped rows reported one by one, the rest are only counted
+MAX_REPORTED_SKIPS = 20
+
+# When ratings and reviews without a created_at column were made, long
+# enough ago to count for nothing on /games/trending
+UNDATED = trending.EPOCH
+
+
+def read_rows(path):
+    """(line number, row dict) for every record of an NDJSON or CSV file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.ndjson', '.jsonl', '.csv'):
+        raise CommandError(f'{path}: expected a .ndjson, .jsonl or .csv file')
+
+    with open(path, newline='', encoding='utf-8') as file:
+        if extension == '.csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for number, line in enumerate(file, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as ex:
+                    raise CommandError(f'{path} line {number}: {ex}')
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Bulk load games, categories, ratings and reviews from NDJSON or CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', help='File of categories')
+        parser.add_argument('--games', help='File of games')
+        parser.add_argument('--game-categories', help='File of game and category pairs')
+        parser.add_argument('--ratings', help='File of ratings')
+        parser.add_argument('--reviews', help='File of reviews')
+        parser.add_argument('--owner', help='Username of the user owning games without a user column')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows read, inserted and committed together')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        self.using = options['database']
+        self.batch_size = options['batch_size']
+        self.skipped = 0
+        self.started_at = timezone.now()
+
+        # File id to database id maps, filled in as rows are inserted
+        self.category_ids = {}
+        self.game_ids = {}
+        self.existing_game_ids = None
+        self.categories_by_label = dict(Category.objects.using(self.using).values_list('label', 'id'))
+        self.users = dict(User.objects.using(self.using).values_list('username', 'id'))
+
+        self.owner_id = None
+        if options['owner'] is not None:
+            if options['owner'] not in self.users:
+                raise CommandError(f'Unknown owner {options["owner"]}')
+            self.owner_id = self.users[options['owner']]
+
+        steps = (
+            ('categories', self.import_categories),
+            ('games', self.import_games),
+            ('game_categories', self.import_game_categories),
+            ('ratings', self.import_ratings),
+            ('reviews', self.import_reviews),
+        )
+        if not any(options[name] for name, _ in steps):
+            raise CommandError('Nothing to import, pass at least one file')
+
+        # The search index is rebuilt once at the end rather than row by row
+        if options['games']:
+            fulltext.drop_triggers(self.using)
+        try:
+            for name, step in steps:
+                if options[name]:
+                    self.import_file(options[name], step)
+        finally:
+            if options['games']:
+                self.stdout.write('Rebuilding the game search index')
+                fulltext.install_triggers(self.using)
+
+        # Also scores the new game categories by their games' ratings
+        if options['ratings'] or options['game_categories']:
+            self.stdout.write('Rebuilding the game rating totals')
+            Game.objects.using(self.using).rebuild_rating_totals()
+
+        bump_versions(*[model._meta.db_table for model in (Category, Game, GameCategory, Rating, Review)],
+                      fuzzy.VERSION_KEY, suggest.VERSION_KEY, bitmap.VERSION_KEY, using=self.using)
+        message = 'Import finished'
+        if self.skipped:
+            message += f', {self.skipped} rows skipped'
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def import_file(self, path, step):
+        """Insert the rows of `path` a chunk at a time, one transaction per chunk"""
+        started = time.perf_counter()
+        count = 0
+        for chunk in chunked(read_rows(path), self.batch_size):
+            with transaction.atomic(using=self.using):
+                count += step(path, chunk)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{path}: {count} rows, {count / elapsed:.0f} rows/s')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{path}: imported {count} rows in {elapsed:.1f} s'))
+
+    def skip(self, path, number, reason):
+        self.skipped += 1
+        if self.skipped <= MAX_REPORTED_SKIPS:
+            self.stderr.write(f'{path} line {number}: skipped, {reason}')
+
+    def category_for_label(self, label):
+        """Id of the category with this label, creating it when there is none"""
+        label = str(label).strip()
+        if not label:
+            raise ValueError('empty category label')
+        if label not in self.categories_by_label:
+            category = Category.objects.using(self.using).create(label=label)
+            self.categories_by_label[label] = category.id
+        return self.categories_by_label[label]
+
+    def game_id(self, value):
+        """Database id of a game from its id in the files"""
+        key = str(value)
+        if key in self.game_ids:
+            return self.game_ids[key]
+        if self.existing_game_ids is None:
+            self.existing_game_ids = set(Game.objects.using(self.using).values_list('id', flat=True))
+        if int(key) not in self.existing_game_ids:
+            raise KeyError(f'unknown game {value}')
+        return int(key)
+
+    def user_id(self, username):
+        if username not in self.users:
+            raise KeyError(f'unknown user {username}')
+        return self.users[username]
+
+    def created_at(self, row):
+        """When a ratings or reviews row was made, from its created_at column"""
+        value = row.get('created_at')
+        if value in (None, ''):
+            return UNDATED
+        created_at = parse_datetime(str(value))
+        if created_at is None:
+            raise ValueError(f'created_at {value} is not a date and time')
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+        if created_at > self.started_at:
+            raise ValueError(f'created_at {value} is in the future')
+        return created_at
+
+    def import_categories(self, path, chunk):
+        count = 0
+        for number, row in chunk:
+            try:
+                category_id = self.category_for_label(row['label'])
+            except (KeyError, ValueError) as ex:
+                self.skip(path, number, ex)
+                continue
+            if row.get('id') not in (None, ''):
+                self.category_ids[str(row['id'])] = category_id
+            count += 1
+        return count
+
+    def game_categories(self, value):
+        """Category ids from a games row, a list from NDJSON or `|` separated labels from CSV"""
+        if value in (None, ''):
+            return []
+        if isinstance(value, str):
+            return [self.category_for_label(label) for label in value.split('|')]
+
+        ids = []
+        for category in value:
+            if isinstance(category, dict):
+                ids.append(self.category_for_label(category['label']))
+            elif isinstance(category, int):
+                ids.append(self.category_ids[str(category)])
+            else:
+                ids.append(self.category_for_label(category))
+        return list(dict.fromkeys(ids))
+
+    def import_games(self, path, chunk):
+        limits = {column: Game._meta.get_field(column).max_length for column in GAME_TEXT_COLUMNS}
+        games, category_ids, file_ids = [], [], []
+        for number, row in chunk:
+            try:
+                game = Game(**{column: int(row[column]) for column in GAME_NUMBER_COLUMNS})
+                for column in GAME_TEXT_COLUMNS:
+                    text = str(row[column])
+                    if len(text) > limits[column]:
+                        raise ValueError(f'{column} is longer than {limits[column]} characters')
+                    setattr(game, column, text)
+                game.user_id = self.user_id(row['user']) if row.get('user') else self.owner_id
+                if game.user_id is None:
+                    raise ValueError('no user column and no --owner')
+                categories = self.game_categories(row.get('categories'))
+            except (KeyError, TypeError, ValueError) as ex:
+                self.skip(path, number, ex)
+                continue
+            games.append(game)
+            category_ids.append(categories)
+            file_ids.append(row.get('id'))
+
+        Game.objects.using(self.using).bulk_insert(games, category_ids, self.batch_size)
+        for file_id, game in zip(file_ids, games):
+            if file_id not in (None, ''):
+                self.game_ids[str(file_id)] = game.id
+        return len(games)
+
+    def import_game_categories(self, path, chunk):
+        rows = []
+        for number, row in chunk:
+            try:
+                rows.append(GameCategory(
+                    game_id=self.game_id(row['game']),
+                    category_id=self.category_ids[str(row['category'])],
+                ))
+            except (KeyError, TypeError, ValueError) as ex:
+                self.skip(path, number, ex)
+        GameCategory.objects.using(self.using).bulk_create(rows, batch_size=self.batch_size)
+        return len(rows)
+
+    def import_ratings(self, path, chunk):
+        # A user has one rating per game, the last one in the files wins
+        rows = []
+        for number, row in chunk:
+            try:
+                rating = int(row['rating'])
+                if not MIN_RATING <= rating <= MAX_RATING:
+                    raise ValueError(f'rating {rating} is not between {MIN_RATING} and {MAX_RATING}')
+                rows.append((self.game_id(row['game']), self.user_id(row['user']), rating, self.created_at(row)))
+            except (KeyError, TypeError, ValueError) as ex:
+                self.skip(path, number, ex)
+        Rating.objects.using(self.using).write_ratings(rows)
+        return len(rows)
+
+    def import_reviews(self, path, chunk):
+        rows = []
+        for number, row in chunk:
+            try:
+                rows.append(Review(
+                    game_id=self.game_id(row['game']),
+                    user_id=self.user_id(row['user']),
+                    review=str(row['review']),
+                    created_at=self.created_at(row),
+                ))
+            except (KeyError, TypeError, ValueError) as ex:
+                self.skip(path, number, ex)
+        Review.objects.using(self.using).bulk_create(rows, batch_size=self.batch_size)
+        return len(rows)
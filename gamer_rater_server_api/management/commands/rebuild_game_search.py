@@ -0,0 +1,19 @@
+"""Management command to rebuild the game full text index"""
+from django.core.management.base import BaseCommand, CommandError
+from gamer_rater_server_api.search import fulltext
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 full text index behind the /games?q= search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not fulltext.is_available(using):
+            raise CommandError('The full text index is only available on SQLite')
+
+        fulltext.install_triggers(using)
+        fulltext.rebuild(using)
+        self.stdout.write(self.style.SUCCESS('Rebuilt the game search index'))
@@ -0,0 +1,16 @@
+"""Management command to recount the stored game rating totals"""
+from django.core.management.base import BaseCommand
+from gamer_rater_server_api.cache import bump_versions
+from gamer_rater_server_api.models import Game, GameCategory
+
+
+class Command(BaseCommand):
+    help = 'Recount the rating totals and leaderboard scores stored on every game'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        Game.objects.using(options['database']).rebuild_rating_totals()
+        bump_versions(Game._meta.db_table, GameCategory._meta.db_table, using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt the game rating totals'))
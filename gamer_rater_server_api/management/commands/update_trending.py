@@ -0,0 +1,62 @@
+"""Management command to fold new ratings and reviews into the trending keys
+
+    python manage.py update_trending [--full]
+
+Meant to run every few minutes. Each run reads the ratings and reviews
+created since the previous run and moves the trending key of only the
+games they belong to, see gamer_rater_server_api.trending. Activity of
+the last TRENDING_SETTLE_SECONDS is left for the next run, so rows of
+requests still committing when this one starts are not skipped over.
+
+Games that lost or moved a rating or review since the previous run have
+their key worked out again from all of their activity, see TrendingRecount.
+
+Changing TRENDING_HALF_LIFE_HOURS makes the next run a full one, which
+works every key out again from all of the history.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from gamer_rater_server_api import trending
+from gamer_rater_server_api.cache import bump_versions
+from gamer_rater_server_api.models import Game, TrendingRecount, TrendingRun
+
+
+class Command(BaseCommand):
+    help = 'Fold the ratings and reviews created since the last run into the scores of /games/trending'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Work every key out again from all activity')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        half_life = settings.TRENDING_HALF_LIFE_HOURS
+        started = time.perf_counter()
+        started_at = timezone.now()
+        read_until = started_at - timedelta(seconds=settings.TRENDING_SETTLE_SECONDS)
+
+        with transaction.atomic(using=using):
+            last = TrendingRun.objects.using(using).order_by('-started_at').first()
+            full = options['full'] or last is None or last.half_life != half_life
+            # Recounts left after this point are for the next run
+            recounts = dict(TrendingRecount.objects.using(using).values_list('id', 'game_id'))
+            if full:
+                Game.objects.using(using).exclude(trending_key=None).update(trending_key=None)
+                since = None
+            else:
+                since = last.read_until
+                read_until = max(read_until, since)
+            games = trending.fold_activity(since, read_until, half_life, recount=recounts.values(), using=using)
+            TrendingRecount.objects.using(using).filter(pk__in=list(recounts)).delete()
+            TrendingRun.objects.using(using).create(
+                started_at=started_at, read_until=read_until, half_life=half_life, full=full, games=games)
+            # Committed with the new keys, so every server answers with them
+            bump_versions(Game._meta.db_table, TrendingRun._meta.db_table, using=using)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved the trending key of {games} games in {elapsed:.1f} s'))
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0004_auto_20210812_1442'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='average_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='categories',
+            field=models.ManyToManyField(related_name='categories', through='gamer_rater_server_api.GameCategory', to='gamer_rater_server_api.Category'),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='image',
+            field=models.ImageField(null=True, upload_to='actionimages'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill_rating_totals(apps, schema_editor):
+    """Populate the stored rating totals from the existing ratings"""
+    Game = apps.get_model('gamer_rater_server_api', 'Game')
+    Rating = apps.get_model('gamer_rater_server_api', 'Rating')
+
+    totals = (Rating.objects.order_by().values('game')
+              .annotate(rating_count=Count('id'), rating_sum=Sum('rating')))
+    for total in totals.iterator():
+        Game.objects.filter(pk=total['game']).update(
+            rating_count=total['rating_count'],
+            rating_sum=total['rating_sum'],
+            average_rating=total['rating_sum'] / total['rating_count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0005_game_rating_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
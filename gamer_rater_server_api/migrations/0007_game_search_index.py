@@ -0,0 +1,41 @@
+from django.db import migrations
+
+GAME_TABLE = 'gamer_rater_server_api_game'
+INDEX_TABLE = 'gamer_rater_server_api_game_fts'
+
+
+def create_search_index(apps, schema_editor):
+    """Create the FTS5 index over games, on SQLite only
+
+    The triggers that keep it in sync are installed after every migrate,
+    see search.fulltext.install_triggers.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"""
+        CREATE VIRTUAL TABLE {INDEX_TABLE} USING fts5(
+            title, description, designer,
+            content='{GAME_TABLE}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    schema_editor.execute(f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {INDEX_TABLE}_{suffix}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0006_backfill_rating_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
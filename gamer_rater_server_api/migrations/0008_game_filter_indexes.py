@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0007_game_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['title'], name='gamer_rater_title_e4ef65_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['release_year'], name='gamer_rater_release_6284a8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['number_of_player'], name='gamer_rater_number__4c92ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['game_duration'], name='gamer_rater_game_du_1f287f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['age_range'], name='gamer_rater_age_ran_7470b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['average_rating'], name='gamer_rater_average_275b07_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamecategory',
+            index=models.Index(fields=['category', 'game'], name='gamer_rater_categor_82c5f7_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:24
+
+from django.db import migrations, models
+import gamer_rater_server_api.models.game
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='bayesian_rating',
+            field=models.FloatField(default=gamer_rater_server_api.models.game.prior_rating),
+        ),
+        migrations.AddField(
+            model_name='gamecategory',
+            name='bayesian_rating',
+            field=models.FloatField(default=gamer_rater_server_api.models.game.prior_rating),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['-bayesian_rating'], name='gamer_rater_bayesia_df5d8e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamecategory',
+            index=models.Index(fields=['category', '-bayesian_rating', 'game'], name='gamer_rater_categor_7c9b9b_idx'),
+        ),
+    ]
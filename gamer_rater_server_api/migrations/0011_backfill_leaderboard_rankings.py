@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast
+
+
+def backfill_rankings(apps, schema_editor):
+    """Score the existing games and copy the scores onto their categories"""
+    Game = apps.get_model('gamer_rater_server_api', 'Game')
+    GameCategory = apps.get_model('gamer_rater_server_api', 'GameCategory')
+
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    Game.objects.update(bayesian_rating=(
+        Cast(Value(weight * settings.LEADERBOARD_PRIOR_RATING) + F('rating_sum'), FloatField()) /
+        Cast(Value(weight) + F('rating_count'), FloatField())))
+    GameCategory.objects.update(bayesian_rating=Subquery(
+        Game.objects.filter(pk=OuterRef('game_id')).values('bayesian_rating')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0010_leaderboard_rankings'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rankings, migrations.RunPython.noop),
+    ]
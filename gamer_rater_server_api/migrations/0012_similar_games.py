@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0011_backfill_leaderboard_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('neighbors', models.IntegerField()),
+                ('full', models.BooleanField()),
+                ('games', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarGame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gamer_rater_server_api.game')),
+                ('similar_game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gamer_rater_server_api.game')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='similargame',
+            index=models.Index(fields=['game', '-score', 'similar_game'], name='gamer_rater_game_id_6cb081_idx'),
+        ),
+    ]
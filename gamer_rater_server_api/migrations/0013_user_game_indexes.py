@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0012_similar_games'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['user', 'game'], name='gamer_rater_user_id_0c5a09_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', 'game'], name='gamer_rater_user_id_98e78d_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast
+
+
+def dedupe_ratings(apps, schema_editor):
+    """Keep only the latest rating of each user for each game, and recount their games"""
+    Game = apps.get_model('gamer_rater_server_api', 'Game')
+    GameCategory = apps.get_model('gamer_rater_server_api', 'GameCategory')
+    Rating = apps.get_model('gamer_rater_server_api', 'Rating')
+
+    repeated = (Rating.objects.order_by().values('game', 'user')
+                .annotate(ratings=Count('id')).filter(ratings__gt=1))
+    game_ids = set()
+    for pair in repeated.iterator():
+        ratings = Rating.objects.filter(game=pair['game'], user=pair['user']).order_by('-updated_at', '-id')
+        Rating.objects.filter(pk__in=list(ratings.values_list('id', flat=True)[1:])).delete()
+        game_ids.add(pair['game'])
+
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    for game_id in game_ids:
+        totals = Rating.objects.filter(game=game_id).aggregate(count=Count('id'), sum=Sum('rating'))
+        Game.objects.filter(pk=game_id).update(
+            rating_count=totals['count'],
+            rating_sum=totals['sum'] or 0,
+            average_rating=(totals['sum'] or 0) / totals['count'] if totals['count'] else 0,
+        )
+        Game.objects.filter(pk=game_id).update(bayesian_rating=(
+            Cast(Value(weight * settings.LEADERBOARD_PRIOR_RATING) + F('rating_sum'), FloatField()) /
+            Cast(Value(weight) + F('rating_count'), FloatField())))
+    GameCategory.objects.filter(game__in=game_ids).update(bayesian_rating=Subquery(
+        Game.objects.filter(pk=OuterRef('game_id')).values('bayesian_rating')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0013_user_game_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_ratings, migrations.RunPython.noop),
+    ]
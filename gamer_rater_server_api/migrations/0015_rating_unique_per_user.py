@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0014_dedupe_ratings'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('game', 'user'), name='unique_rating_per_user'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0015_rating_unique_per_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gamer_rater_server_api.game')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ratingcount',
+            constraint=models.UniqueConstraint(fields=('game', 'rating'), name='unique_rating_count'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_rating_counts(apps, schema_editor):
+    """Count the existing ratings of each game by value"""
+    Rating = apps.get_model('gamer_rater_server_api', 'Rating')
+    RatingCount = apps.get_model('gamer_rater_server_api', 'RatingCount')
+
+    counts = (Rating.objects.order_by('game', 'rating').values('game', 'rating')
+              .annotate(count=Count('id')))
+    RatingCount.objects.bulk_create(
+        [RatingCount(game_id=row['game'], rating=row['rating'], count=row['count']) for row in counts.iterator()],
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0016_rating_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_created_at(apps, schema_editor):
+    """Date the existing ratings and reviews by their last write, the closest thing on record"""
+    for name in ('Rating', 'Review'):
+        apps.get_model('gamer_rater_server_api', name).objects.update(created_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0018_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0020_image_user_game_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamecategory',
+            index=models.Index(fields=['game', 'category'], name='gamer_rater_game_id_8e4d52_idx'),
+        ),
+    ]
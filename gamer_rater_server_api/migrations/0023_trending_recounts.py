@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamer_rater_server_api', '0022_table_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRecount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_id', models.IntegerField()),
+            ],
+        ),
+    ]
@@ -2,5 +2,9 @@ from .game import Game
 from .category import Category
 from .game_category import GameCategory
 from .rating import Rating
+from .rating_count import RatingCount
 from .review import Review
 from .image import Image
+from .similar_game import SimilarGame, SimilarityRun
+from .trending_run import TrendingRecount, TrendingRun
+from .table_version import TableVersion
@@ -1,6 +1,268 @@
-from django.db import models
+import collections
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Prefetch, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.contrib.auth.models import User
+from django.dispatch import Signal
+from django.utils import timezone
+from .category import Category
 from .rating import Rating
+from .rating_count import RatingCount
+
+# Sent with `games`, already saved with their categories, by
+# GameQuerySet.bulk_insert, because bulk_create sends no post_save
+games_bulk_created = Signal()
+
+
+def prior_rating():
+    """Bayesian rating of a game nobody has rated yet"""
+    return float(settings.LEADERBOARD_PRIOR_RATING)
+
+
+def bayesian_rating(rating_sum, rating_count):
+    """Expression for the Bayesian rating of a game from its rating totals
+
+    The game's ratings are pooled with LEADERBOARD_PRIOR_WEIGHT ratings of
+    LEADERBOARD_PRIOR_RATING, so a few votes barely move it off the prior.
+    """
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    return (Cast(Value(weight * settings.LEADERBOARD_PRIOR_RATING) + rating_sum, FloatField()) /
+            Cast(Value(weight) + rating_count, FloatField()))
+
+
+class GameQuerySet(models.QuerySet):
+    """Custom queries for games"""
+
+    def for_display(self):
+        """Games ready for GameSerializer without any per-game queries
+
+        The rating average and count are read straight off the game row and
+        all categories for the result set are fetched in one batch, in id
+        order like the fast serializers read them.
+        """
+        return self.prefetch_related(Prefetch('categories', queryset=Category.objects.order_by('id')))
+
+    def in_categories(self, category_ids):
+        """Games that belong to every one of the given categories
+
+        Each category is a subquery on the (category, game) index of the
+        join table, so this never has to read the join table itself.
+        """
+        game_categories = self.model.categories.through.objects
+        games = self
+        for category_id in category_ids:
+            games = games.filter(id__in=game_categories.filter(category_id=category_id).values('game_id'))
+        return games
+
+    def bulk_insert(self, games, category_ids, batch_size):
+        """Insert games and their GameCategory rows a batch at a time
+
+        Everything goes in one transaction. Sets the id of every game, and
+        sends games_bulk_created once all of them are in.
+
+        Arguments:
+            games -- unsaved Game instances
+            category_ids -- a list of category ids for each game
+            batch_size -- most rows written by one INSERT
+        """
+        connection = connections[self.db]
+        game_category = self.model.categories.through
+        with transaction.atomic(using=self.db):
+            for start in range(0, len(games), batch_size):
+                batch = games[start:start + batch_size]
+                if not connection.features.can_return_rows_from_bulk_insert and connection.vendor != 'sqlite':
+                    for game in batch:
+                        game.save(using=self.db)
+                    continue
+
+                self.bulk_create(batch, batch_size=batch_size)
+                if batch[0].pk is None:
+                    # SQLite cannot return the new ids from a bulk insert, but
+                    # it numbers the rows one after another, as no other
+                    # connection can write until this transaction ends
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT last_insert_rowid()')
+                        last_id = cursor.fetchone()[0]
+                    for offset, game in enumerate(batch):
+                        game.pk = last_id - len(batch) + 1 + offset
+                        game._state.adding = False
+                        game._state.db = self.db
+
+            game_category.objects.using(self.db).bulk_create([
+                game_category(game_id=game.pk, category_id=category_id)
+                for game, ids in zip(games, category_ids)
+                for category_id in ids
+            ], batch_size=batch_size)
+
+            games_bulk_created.send(sender=self.model, games=games, category_ids=category_ids, using=self.db)
+        return games
+
+    def facet_counts(self):
+        """Count the games in this queryset per category and per release decade"""
+        # Grouped straight off this queryset rather than through an id
+        # subquery, so raw search clauses keep the unaliased game table
+        categories = (self.order_by()
+                      .filter(categories__isnull=False)
+                      .values('categories__id', 'categories__label')
+                      .annotate(count=Count('id'))
+                      .order_by('categories__id'))
+        decades = (self.order_by()
+                   .annotate(decade=F('release_year') / 10 * 10)
+                   .values('decade')
+                   .annotate(count=Count('id'))
+                   .order_by('decade'))
+        return {
+            'categories': [
+                {'id': row['categories__id'], 'label': row['categories__label'], 'count': row['count']}
+                for row in categories
+            ],
+            'decades': [{'decade': row['decade'], 'count': row['count']} for row in decades],
+        }
+
+    def apply_rating_change(self, old=None, new=None):
+        """Fold a single rating write into the stored rating totals
+
+        Arguments:
+            old -- rating value being replaced or removed, None when adding
+            new -- rating value being added, None when removing
+        """
+        return self.apply_rating_changes(
+            removed=[old] if old is not None else [], added=[new] if new is not None else [])
+
+    def apply_rating_changes(self, removed=(), added=()):
+        """Fold any number of rating writes into the stored rating totals at once
+
+        Arguments:
+            removed -- rating values being replaced or removed
+            added -- rating values being added
+        """
+        count_delta = len(added) - len(removed)
+        sum_delta = sum(added) - sum(removed)
+
+        # Every expression is evaluated against the row as it was before
+        # the UPDATE, so the new count is zero when the old one was -delta
+        updated = self.update(
+            updated_at=timezone.now(),
+            rating_count=F('rating_count') + count_delta,
+            rating_sum=F('rating_sum') + sum_delta,
+            average_rating=Case(
+                When(rating_count=-count_delta, then=Value(0.0)),
+                default=Cast(F('rating_sum') + sum_delta, FloatField()) / (F('rating_count') + count_delta),
+                output_field=FloatField(),
+            ),
+            bayesian_rating=bayesian_rating(F('rating_sum') + sum_delta, F('rating_count') + count_delta),
+        )
+        histogram = collections.Counter(added)
+        histogram.subtract(removed)
+        for value, delta in sorted(histogram.items()):
+            if delta:
+                self.count_ratings(value, delta)
+        self.sync_category_rankings()
+        return updated
+
+    def count_ratings(self, value, delta):
+        """Move the RatingCount of `value` for these games by `delta`, adding missing ones
+
+        On SQLite and PostgreSQL an increment is a single INSERT ... SELECT
+        ... ON CONFLICT statement over these games.
+        """
+        counts = RatingCount.objects.using(self.db)
+        games = self.order_by().values('pk')
+        if delta < 0:
+            return counts.filter(game__in=games, rating=value).update(count=F('count') + delta)
+
+        connection = connections[self.db]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            counts.filter(game__in=games, rating=value).update(count=F('count') + delta)
+            missing = games.exclude(pk__in=counts.filter(rating=value).values('game'))
+            counts.bulk_create([RatingCount(game_id=row['pk'], rating=value, count=delta) for row in missing])
+            return
+
+        opts, quote = RatingCount._meta, connection.ops.quote_name
+        table = quote(opts.db_table)
+        game, rating, count = (quote(opts.get_field(name).column) for name in ('game', 'rating', 'count'))
+        sql, params = games.query.get_compiler(using=self.db).as_sql()
+        # SQLite needs the WHERE to tell the ON CONFLICT from a join constraint
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({game}, {rating}, {count}) '
+                f'SELECT games.{quote(self.model._meta.pk.column)}, %s, %s FROM ({sql}) games WHERE 1 = 1 '
+                f'ON CONFLICT ({game}, {rating}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+                (value, delta) + tuple(params))
+
+    def rating_stats(self):
+        """Rating histogram, mean and variance of each of these games, from their RatingCount rows
+
+        The counts are whole numbers, so the moments are worked out exactly
+        rather than accumulated in floating point.
+
+        Returns:
+            dict -- {game id: {'count', 'mean', 'variance', 'histogram'}}
+        """
+        histograms = {pk: {} for pk in self.values_list('pk', flat=True)}
+        rows = (RatingCount.objects.using(self.db)
+                .filter(game__in=list(histograms), count__gt=0)
+                .order_by('game', 'rating')
+                .values_list('game_id', 'rating', 'count'))
+        for game_id, value, count in rows:
+            histograms[game_id][value] = count
+
+        stats = {}
+        for game_id, histogram in histograms.items():
+            count = sum(histogram.values())
+            total = sum(value * times for value, times in histogram.items())
+            squares = sum(value * value * times for value, times in histogram.items())
+            stats[game_id] = {
+                'count': count,
+                'mean': total / count if count else 0.0,
+                'variance': (count * squares - total * total) / (count * count) if count else 0.0,
+                'histogram': [{'rating': value, 'count': times} for value, times in histogram.items()],
+            }
+        return stats
+
+    def sync_category_rankings(self):
+        """Copy the Bayesian rating of these games onto their GameCategory rows"""
+        game_category = self.model.categories.through
+        scores = self.model.objects.filter(pk=OuterRef('game_id')).values('bayesian_rating')
+        return (game_category.objects.using(self.db)
+                .filter(game_id__in=self.order_by().values('pk'))
+                .update(bayesian_rating=Subquery(scores)))
+
+    def rebuild_rating_totals(self):
+        """Recompute the stored rating totals from the ratings table"""
+        ratings = Rating.objects.filter(game=OuterRef('pk')).order_by().values('game')
+        rating_count = Coalesce(
+            Subquery(ratings.annotate(total=Count('id')).values('total'), output_field=IntegerField()), 0)
+        rating_sum = Coalesce(
+            Subquery(ratings.annotate(total=Sum('rating')).values('total'), output_field=IntegerField()), 0)
+
+        self.update(rating_count=rating_count, rating_sum=rating_sum, updated_at=timezone.now())
+        updated = self.update(
+            average_rating=Case(
+                When(rating_count=0, then=Value(0.0)),
+                default=Cast(F('rating_sum'), FloatField()) / F('rating_count'),
+                output_field=FloatField(),
+            ),
+            bayesian_rating=bayesian_rating(F('rating_sum'), F('rating_count')),
+        )
+        self.rebuild_rating_counts()
+        self.sync_category_rankings()
+        return updated
+
+    def rebuild_rating_counts(self):
+        """Recount the RatingCount rows of these games from the ratings table"""
+        games = self.order_by().values('pk')
+        RatingCount.objects.using(self.db).filter(game__in=games).delete()
+        counts = (Rating.objects.using(self.db)
+                  .filter(game__in=games)
+                  .order_by('game', 'rating')
+                  .values('game', 'rating')
+                  .annotate(count=Count('id')))
+        RatingCount.objects.using(self.db).bulk_create(
+            (RatingCount(game_id=row['game'], rating=row['rating'], count=row['count']) for row in counts.iterator()),
+            batch_size=5000)
+
 
 class Game(models.Model):
     title = models.CharField(max_length=50)
@@ -13,6 +275,39 @@ class Game(models.Model):
     categories = models.ManyToManyField("Category", through="GameCategory", related_name="categories")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    # Running rating totals, kept in step with the ratings table by
+    # RatingView so that reading an average never has to scan ratings
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+
+    # Ranks the leaderboards, see bayesian_rating(). Changing the prior
+    # settings needs `manage.py rebuild_rating_totals` to rescore games.
+    bayesian_rating = models.FloatField(default=prior_rating)
+
+    # Log of the game's time-decayed activity, null until it has any, see
+    # gamer_rater_server_api.trending. Written by `manage.py update_trending`.
+    trending_key = models.FloatField(null=True, blank=True)
+
+    # Also moved by the rating totals updates, which bypass save()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = GameQuerySet.as_manager()
+
+    class Meta:
+        # Each of these ends in the id on SQLite, which keeps filtered and
+        # ordered list pages on the index alone
+        indexes = [
+            models.Index(fields=['title']),
+            models.Index(fields=['release_year']),
+            models.Index(fields=['number_of_player']),
+            models.Index(fields=['game_duration']),
+            models.Index(fields=['age_range']),
+            models.Index(fields=['average_rating']),
+            models.Index(fields=['-bayesian_rating']),
+            models.Index(fields=['-trending_key']),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -27,25 +322,3 @@ class Game(models.Model):
     # @is_current_user.setter
     # def is_current_user(self, value):
     #     self.__is_current_user = value
-
-    @property
-    def average_rating(self):
-        """Average rating calculated attribute for each game"""
-        ratings = Rating.objects.filter(game=self)
-
-        # Sum all of the ratings for the game
-        total_rating = 0
-        for rating in ratings:
-            total_rating += rating.rating
-            ratings_len = len(ratings)
-            if ratings == 0:
-                return 0
-            else:
-                return total_rating / ratings_len
-        
-
-        # Calculate the averge and return it.
-        # If you don't know how to calculate averge, Google it.
-    @average_rating.setter
-    def average_rating(self, value):
-        self.__average_rating = value
\ No newline at end of file
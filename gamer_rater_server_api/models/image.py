@@ -5,4 +5,11 @@ class Image(models.Model):
     game = models.ForeignKey("Game", on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='actionimages', height_field=None,
-        width_field=None, max_length=None, null=True)
\ No newline at end of file
+        width_field=None, max_length=None, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # One user's images, see ImageView.get_queryset
+        indexes = [
+            models.Index(fields=['user', 'game']),
+        ]
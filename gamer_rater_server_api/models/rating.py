@@ -1,7 +1,188 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Case, Q, Value, When
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.dispatch import Signal
+from django.utils import timezone
+
+# Ratings go from MIN_RATING to MAX_RATING
+MIN_RATING = 1
+MAX_RATING = 10
+
+# Sent with the `game_ids` whose ratings RatingQuerySet.upsert wrote,
+# because its INSERT sends no post_save
+ratings_upserted = Signal()
+
+
+class RatingQuerySet(models.QuerySet):
+    """Custom queries for ratings"""
+
+    # Rows per statement, 5 parameters each stay under SQLite's limit of 999
+    upsert_batch_size = 190
+
+    def upsert(self, user_id, ratings):
+        """Set a user's rating of each game, whether or not they rated it before
+
+        Arguments:
+            ratings -- {game id: rating}
+
+        Returns:
+            dict -- {game id: the rating it replaced, None for a new one}
+        """
+        previous = self.upsert_pairs({(game_id, user_id): rating for game_id, rating in ratings.items()})
+        return {game_id: previous.get((game_id, user_id)) for game_id in ratings}
+
+    def upsert_pairs(self, ratings):
+        """Set the rating of each (game, user) pair, whether or not it was rated before
+
+        New pairs are written by INSERT ... ON CONFLICT DO NOTHING
+        statements on the unique (game, user) constraint, whose RETURNING
+        clause tells which rows they inserted. Two requests adding the same
+        first rating at once therefore count it once: the one that loses
+        the conflict finds the row among those already there, which are
+        locked, read and updated. The rating totals of each game are moved
+        once by the sum of its changes, in the same transaction.
+
+        Arguments:
+            ratings -- {(game id, user id): rating}
+
+        Returns:
+            dict -- {(game id, user id): the rating it replaced} for the
+                    pairs that had one
+        """
+        game_model = self.model._meta.get_field('game').related_model
+        previous = {}
+        with transaction.atomic(using=self.db):
+            pending = dict(ratings)
+            while pending:
+                inserted = self.insert_new_ratings(pending)
+                rest = [pair for pair in pending if pair not in inserted]
+                existing = self.lock_ratings(rest)
+                self.update_ratings({pk: pending[pair] for pair, (pk, rating) in existing.items()
+                                     if rating != pending[pair]})
+                previous.update((pair, rating) for pair, (_, rating) in existing.items())
+                # Deleted since their insert conflicted, inserted next round
+                pending = {pair: pending[pair] for pair in rest if pair not in existing}
+
+            changes = {}
+            for pair, rating in ratings.items():
+                if pair not in previous or previous[pair] != rating:
+                    removed, added = changes.setdefault(pair[0], ([], []))
+                    if pair in previous:
+                        removed.append(previous[pair])
+                    added.append(rating)
+            for game_id, (removed, added) in changes.items():
+                game_model.objects.using(self.db).filter(pk=game_id).apply_rating_changes(removed, added)
+            ratings_upserted.send(sender=self.model, game_ids=list({game_id for game_id, _ in ratings}), using=self.db)
+        return previous
+
+    def insert_new_ratings(self, ratings):
+        """Insert the {(game id, user id): rating} pairs not rated yet
+
+        Returns:
+            set -- the pairs inserted, the others were rated already
+        """
+        connection = connections[self.db]
+        if not (connection.vendor == 'postgresql' or
+                (connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35))):
+            return {pair for pair, rating in ratings.items()
+                    if self.get_or_create(game_id=pair[0], user_id=pair[1], defaults={'rating': rating})[1]}
+
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        game, user, rating, created_at, updated_at = (
+            quote(opts.get_field(name).column) for name in ('game', 'user', 'rating', 'created_at', 'updated_at'))
+        now = opts.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+        items = list(ratings.items())
+        inserted = set()
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), self.upsert_batch_size):
+                batch = items[start:start + self.upsert_batch_size]
+                cursor.execute(
+                    f'INSERT INTO {quote(opts.db_table)} ({game}, {user}, {rating}, {created_at}, {updated_at}) '
+                    f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(batch))} '
+                    f'ON CONFLICT ({game}, {user}) DO NOTHING RETURNING {game}, {user}',
+                    [value for (game_id, user_id), score in batch for value in (game_id, user_id, score, now, now)])
+                inserted.update(map(tuple, cursor.fetchall()))
+        return inserted
+
+    def lock_ratings(self, pairs):
+        """{(game id, user id): (rating id, rating)} of the given pairs, locked where the database can"""
+        found = {}
+        for start in range(0, len(pairs), self.upsert_batch_size):
+            matches = Q()
+            for game_id, user_id in pairs[start:start + self.upsert_batch_size]:
+                matches |= Q(game_id=game_id, user_id=user_id)
+            found.update(((game_id, user_id), (pk, rating)) for pk, game_id, user_id, rating
+                         in self.filter(matches).select_for_update().values_list('id', 'game_id', 'user_id', 'rating'))
+        return found
+
+    def update_ratings(self, ratings):
+        """Set the rating of each {rating id: rating}, one UPDATE per batch"""
+        items = list(ratings.items())
+        now = timezone.now()
+        for start in range(0, len(items), self.upsert_batch_size):
+            batch = items[start:start + self.upsert_batch_size]
+            self.filter(pk__in=[pk for pk, _ in batch]).update(
+                rating=Case(*[When(pk=pk, then=Value(rating)) for pk, rating in batch]), updated_at=now)
+
+    def write_ratings(self, rows):
+        """Write (game id, user id, rating, time) rows, replacing the ratings already there
+
+        A pair listed twice gets its later rating. A new pair is created at
+        its row's time, and a pair already there keeps its created_at and
+        takes the row's time as its updated_at. On SQLite and PostgreSQL
+        each batch is one INSERT ... ON CONFLICT statement. Sends no
+        signals and leaves the rating totals alone, see upsert().
+        """
+        latest = {(game_id, user_id): (rating, when) for game_id, user_id, rating, when in rows}
+        connection = connections[self.db]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            for (game_id, user_id), (rating, when) in latest.items():
+                row, created = self.update_or_create(game_id=game_id, user_id=user_id, defaults={'rating': rating})
+                # auto_now_add and auto_now dated the row by the clock
+                dates = {'created_at': when} if created else {}
+                self.filter(pk=row.pk).update(updated_at=when, **dates)
+            return
+
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        game, user, rating, created_at, updated_at = (
+            quote(opts.get_field(name).column) for name in ('game', 'user', 'rating', 'created_at', 'updated_at'))
+        field = opts.get_field('created_at')
+        items = [(pair, (score, field.get_db_prep_value(when, connection)))
+                 for pair, (score, when) in latest.items()]
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), self.upsert_batch_size):
+                batch = items[start:start + self.upsert_batch_size]
+                cursor.execute(
+                    f'INSERT INTO {quote(opts.db_table)} ({game}, {user}, {rating}, {created_at}, {updated_at}) '
+                    f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(batch))} '
+                    f'ON CONFLICT ({game}, {user}) DO UPDATE '
+                    f'SET {rating} = excluded.{rating}, {updated_at} = excluded.{updated_at}',
+                    [value for (game_id, user_id), (score, when) in batch
+                     for value in (game_id, user_id, score, when, when)])
+
 
 class Rating(models.Model):
     game = models.ForeignKey("Game", on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.IntegerField()
\ No newline at end of file
+    rating = models.IntegerField(validators=[MinValueValidator(MIN_RATING), MaxValueValidator(MAX_RATING)])
+    # When the user first rated the game, rating it again keeps it
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RatingQuerySet.as_manager()
+
+    class Meta:
+        # What one user did with a page of games, see gamer_rater_server_api.overlay,
+        # and the ratings new since the last trending run, see
+        # gamer_rater_server_api.trending
+        indexes = [
+            models.Index(fields=['user', 'game']),
+            models.Index(fields=['created_at']),
+        ]
+        # A user has one rating per game, which RatingView.create upserts
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'user'], name='unique_rating_per_user'),
+        ]
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class RatingCount(models.Model):
+    """How many ratings of one value a game has, one bar of its rating histogram
+
+    Kept in step with the ratings table by GameQuerySet.apply_rating_change,
+    so a game's whole distribution is read off a handful of rows.
+    """
+    game = models.ForeignKey("Game", on_delete=models.CASCADE, related_name="+")
+    rating = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        # A game's histogram is one range of this index
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'rating'], name='unique_rating_count'),
+        ]
@@ -1,7 +1,21 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Review(models.Model):
     game = models.ForeignKey("Game", on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    review = models.TextField()
\ No newline at end of file
+    review = models.TextField()
+    # A default rather than auto_now_add, so import_catalog can date the
+    # reviews it loads
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # What one user did with a page of games, see gamer_rater_server_api.overlay,
+        # and the reviews new since the last trending run, see
+        # gamer_rater_server_api.trending
+        indexes = [
+            models.Index(fields=['user', 'game']),
+            models.Index(fields=['created_at']),
+        ]
@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class SimilarGame(models.Model):
+    """One of the games most often rated alike with `game`, written by `manage.py build_similar_games`"""
+    game = models.ForeignKey("Game", on_delete=models.CASCADE, related_name="+")
+    similar_game = models.ForeignKey("Game", on_delete=models.CASCADE, related_name="+")
+    # Cosine similarity of the two games' rating vectors, in (0, 1]
+    score = models.FloatField()
+
+    class Meta:
+        # A game's whole neighbor list is one range of this index
+        indexes = [
+            models.Index(fields=['game', '-score', 'similar_game']),
+        ]
+
+
+class SimilarityRun(models.Model):
+    """A run of `manage.py build_similar_games`, the next one only redoes games changed since"""
+    started_at = models.DateTimeField()
+    # Neighbors kept per game, changing it needs a full run
+    neighbors = models.IntegerField()
+    full = models.BooleanField()
+    # Games whose neighbor lists were rewritten
+    games = models.IntegerField()
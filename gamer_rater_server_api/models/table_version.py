@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class TableVersion(models.Model):
+    """Version and last write time of a table, see gamer_rater_server_api.cache
+
+    Kept in the database rather than the cache backend, so a write in one
+    process, or in a management command, invalidates the cached responses
+    and ETags of every process.
+    """
+    table = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField()
+    # Unix time of the last write
+    modified = models.FloatField()
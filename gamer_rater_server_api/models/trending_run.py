@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class TrendingRun(models.Model):
+    """A run of `manage.py update_trending`, the next one reads the activity after `read_until`"""
+    started_at = models.DateTimeField()
+    # Ratings and reviews created up to this time are in the trending keys
+    read_until = models.DateTimeField()
+    # Half-life the keys were worked out with, changing it needs a full run
+    half_life = models.FloatField()
+    full = models.BooleanField()
+    # Games whose trending key moved
+    games = models.IntegerField()
+
+
+class TrendingRecount(models.Model):
+    """A game that lost or moved a rating or review, the next `manage.py update_trending` works its key out again"""
+    game_id = models.IntegerField()
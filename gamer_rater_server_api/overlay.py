@@ -0,0 +1,106 @@
+"""What the current user has done with each game of a response
+
+    http://localhost:8000/games?overlay=1
+    http://localhost:8000/games/2?overlay=1
+
+With `overlay=1` every game of the response also gets
+
+    my_rating -- the user's rating of the game, or null
+    i_reviewed -- whether the user has reviewed it
+    is_owner -- whether the user added it
+
+read for the whole page with one query, so clients need not ask
+/ratings about every game they show. The overlay is added on top of the
+response after the shared response cache, see with_overlay, so the
+cached game data stays the same for everyone. Like other fields the
+overlay keys obey `?fields=`, and they need `id` to be among the fields.
+"""
+import functools
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from gamer_rater_server_api.fieldsets import requested_fields
+from gamer_rater_server_api.models import Game, Rating, Review
+
+OVERLAY_PARAM = 'overlay'
+OVERLAY_FIELDS = ('my_rating', 'i_reviewed', 'is_owner')
+
+
+def requested(request):
+    return request.query_params.get(OVERLAY_PARAM) == '1'
+
+
+def overlay_models(request):
+    """`per_user` for conditional_response, the models the overlay is read from"""
+    return (Rating, Review) if requested(request) else None
+
+
+def user_overlay(user_id, game_ids):
+    """{game id: overlay dict} for the given games, one query on the (user, game) indexes"""
+    ratings = (Rating.objects
+               .filter(game=OuterRef('pk'), user_id=user_id)
+               .order_by('-updated_at', '-id')
+               .values('rating')[:1])
+    reviews = Review.objects.filter(game=OuterRef('pk'), user_id=user_id)
+    rows = (Game.objects
+            .filter(pk__in=game_ids)
+            .annotate(my_rating=Subquery(ratings), i_reviewed=Exists(reviews))
+            .values_list('id', 'my_rating', 'i_reviewed', 'user_id'))
+    return {
+        game_id: {'my_rating': my_rating, 'i_reviewed': i_reviewed, 'is_owner': owner_id == user_id}
+        for game_id, my_rating, i_reviewed, owner_id in rows
+    }
+
+
+def games_in(data):
+    """The game dicts of a game, list or page response body"""
+    if isinstance(data, dict):
+        if isinstance(data.get('results'), list):
+            return data['results']
+        return [data]
+    return data
+
+
+def fix_page_links(data, overlaid):
+    """Point a page's links at pages with the overlay when this one has it
+
+    Requests with and without the overlay share their cached pages, whose
+    links are those of whichever request built them.
+    """
+    if not isinstance(data, dict):
+        return
+    for name in ('next', 'previous'):
+        if data.get(name):
+            if overlaid:
+                data[name] = replace_query_param(data[name], OVERLAY_PARAM, '1')
+            else:
+                data[name] = remove_query_param(data[name], OVERLAY_PARAM)
+
+
+def with_overlay(method):
+    """Add the current user's overlay to the games of a ViewSet method's response
+
+    Goes outside cached_response, so the overlay is read fresh for every
+    request while the games come from the cache.
+    """
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        response = method(self, request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        fix_page_links(response.data, requested(request))
+        if not requested(request):
+            return response
+
+        wanted = requested_fields(request)
+        keys = [key for key in OVERLAY_FIELDS if wanted is None or key in wanted]
+        games = [game for game in games_in(response.data) if 'id' in game]
+        if keys and games:
+            overlay = user_overlay(request.auth.user_id, [game['id'] for game in games])
+            for game in games:
+                values = overlay.get(game['id'], {})
+                game.update((key, values.get(key)) for key in keys)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+    return wrapper
@@ -0,0 +1,154 @@
+"""Pagination for the list endpoints of the plain ViewSets"""
+import base64
+import binascii
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from gamer_rater_server_api.fast_serializers import fast_serializer
+from gamer_rater_server_api.fieldsets import prune_queryset
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on (sort key, id)
+
+    Each page is fetched with a WHERE on the last row of the previous page
+    rather than an OFFSET, and no COUNT(*) is run, so a deep page costs the
+    same as the first one.
+
+        http://localhost:8000/ratings?game=1&cursor=
+        http://localhost:8000/ratings?game=1&cursor=WzEyXQ
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+
+        # The sort key comes from the view, and `id` breaks ties so that
+        # every row has exactly one position
+        ordering = view.get_list_ordering() if view is not None else ('id',)
+        self.sort_field = ordering[0].lstrip('-')
+        self.descending = ordering[0].startswith('-')
+        if self.sort_field == 'id':
+            ordering = (ordering[0],)
+        else:
+            ordering = (ordering[0], '-id' if self.descending else 'id')
+        queryset = queryset.order_by(*ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        # Fetch one extra row to find out whether there is a next page
+        rows = list(queryset[:self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def after(self, position):
+        """Build the filter for rows that sort after `position`"""
+        lookup = 'lt' if self.descending else 'gt'
+        if self.sort_field == 'id':
+            return Q(**{f'id__{lookup}': position[0]})
+
+        value, pk = position
+        return (Q(**{f'{self.sort_field}__{lookup}': value}) |
+                Q(**{self.sort_field: value, f'id__{lookup}': pk}))
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+            if limit > 0:
+                return min(limit, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != (1 if self.sort_field == 'id' else 2):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, row):
+        if self.sort_field == 'id':
+            position = [row.id]
+        else:
+            position = [getattr(row, self.sort_field), row.id]
+        encoded = json.dumps(position, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(encoded.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class PaginatedListMixin:
+    """Adds paginated list responses to a plain ViewSet
+
+    Pages with the DEFAULT_PAGINATION_CLASS from settings, or with
+    KeysetPagination when the client sends `?cursor=`.
+    """
+    list_ordering = ('id',)
+
+    def get_list_ordering(self):
+        """Ordering for list pages, most significant field first"""
+        return self.list_ordering
+
+    def get_paginator(self):
+        if KeysetPagination.cursor_query_param in self.request.query_params:
+            return KeysetPagination()
+        if api_settings.DEFAULT_PAGINATION_CLASS is None:
+            return None
+        return api_settings.DEFAULT_PAGINATION_CLASS()
+
+    def paginated_response(self, queryset, serializer_class):
+        """Serialize one page of `queryset` into a paginated Response
+
+        Only the fields a `?fields=` request asks for are loaded, along
+        with the ordering the pages are cut by. Pages are serialized by the
+        fast serializer for `serializer_class` when there is one.
+        """
+        fast = fast_serializer(serializer_class, self.request)
+        if fast is not None:
+            queryset = fast.rows(queryset, keep=self.get_list_ordering())
+            serialize = lambda rows: fast.serialize(rows, self.request)
+        else:
+            queryset = prune_queryset(queryset, serializer_class, self.request, keep=self.get_list_ordering())
+            serialize = lambda rows: serializer_class(rows, many=True, context={'request': self.request}).data
+
+        self.paginator = self.get_paginator()
+        if self.paginator is None:
+            return Response(serialize(queryset))
+
+        if not isinstance(self.paginator, KeysetPagination):
+            ordering = list(self.get_list_ordering())
+            if ordering[-1].lstrip('-') != 'id':
+                ordering.append('id')
+            queryset = queryset.order_by(*ordering)
+        page = self.paginator.paginate_queryset(queryset, self.request, view=self)
+        return self.paginator.get_paginated_response(serialize(page))
@@ -0,0 +1,40 @@
+"""Request body parsers registered in the REST_FRAMEWORK settings
+
+The counterparts of gamer_rater_server_api.renderers: JSON bodies are
+decoded with orjson when it is installed, and `application/msgpack`
+bodies with msgpack.
+"""
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+from gamer_rater_server_api import renderers
+from gamer_rater_server_api.renderers import msgpack, orjson
+
+
+class JSONParser(parsers.JSONParser):
+    """DRF's JSONParser, decoding UTF-8 bodies with orjson when it is installed"""
+    renderer_class = renderers.JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('_', '-') != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        # orjson rejects NaN and Infinity, as the strict stdlib parser does
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(parsers.BaseParser):
+    """Parses `application/msgpack` request bodies"""
+    media_type = 'application/msgpack'
+    renderer_class = renderers.MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
@@ -0,0 +1,239 @@
+"""Personalized game recommendations from a factorization of the ratings
+
+Every rating is modelled as
+
+    rating = mean + game bias + user factors . game factors
+
+The biases are the games' shrunk mean offsets, and the factors are fit to
+what is left by alternating least squares: holding the game factors
+fixed, each user's factors are a small ridge regression over the games
+they rated, solved for every user at once with batched NumPy linear
+algebra, and then the other way round. `manage.py build_recommendations`
+runs it offline and writes the factors to .npy files.
+
+The profile endpoint memory-maps those files. The mean and bias are kept
+as one more column of the game factors, against a constant 1 on the user
+side, so the predicted rating of every game for a user is a single
+matrix-vector product. A user the model has not seen gets just that
+column, which ranks games by their shrunk mean rating.
+
+Needs NumPy:
+
+    pip install numpy
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from gamer_rater_server_api.similarity import ranges
+
+# Most float64 cells of the padded factor blocks a task of solve_side builds
+PADDED_BUDGET = 1 << 22
+
+# Name of the file in the output directory naming the current run
+CURRENT = 'current'
+
+
+def row_groups(ptr, width):
+    """Arrays of rows of a CSR `ptr` to solve together, see solve_rows
+
+    Rows are grouped by their number of entries rounded up to a power of
+    two, so padding every row of a group to its longest at most doubles
+    it, and the groups are cut so their padded blocks fit the budget. A
+    row too long for the budget is a group by itself.
+    """
+    counts = np.diff(ptr)
+    sizes = 1 << np.ceil(np.log2(np.maximum(counts, 1))).astype(np.int64)
+    order = np.argsort(sizes, kind='stable')
+    bounds = np.flatnonzero(np.diff(sizes[order])) + 1
+    for rows in np.split(order, bounds):
+        if not len(rows):
+            continue
+        per_group = max(1, PADDED_BUDGET // (int(sizes[rows[0]]) * width))
+        for first in range(0, len(rows), per_group):
+            yield rows[first:first + per_group]
+
+
+def solve_rows(ptr, indices, values, other, regularization, rows):
+    """Ridge regression factors of some rows of a CSR matrix against `other`
+
+    Each row's factors x solve (F.T F + regularization n I) x = F.T r,
+    where F are the `other` factors of the n entries of the row and r
+    their values. The rows' F are padded with zeros to the same length,
+    which leaves the products alone, so each product is one batched
+    matrix multiplication for all of them.
+    """
+    starts, stops = ptr[rows], ptr[rows + 1]
+    counts = stops - starts
+    entries = ranges(starts, stops)
+    padded_rows = np.repeat(np.arange(len(rows)), counts)
+    positions = np.arange(len(entries)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    factors = np.zeros((len(rows), counts.max(), other.shape[1]))
+    factors[padded_rows, positions] = other[indices[entries]]
+    targets = np.zeros((len(rows), counts.max(), 1))
+    targets[padded_rows, positions, 0] = values[entries]
+
+    transposed = factors.transpose(0, 2, 1)
+    gram = transposed @ factors
+    gram += (regularization * counts)[:, None, None] * np.eye(other.shape[1])
+    return np.linalg.solve(gram, transposed @ targets)[:, :, 0]
+
+
+def solve_side(ptr, indices, values, other, regularization, pool):
+    """Factors of every row of a CSR matrix, a group of rows per task of `pool`"""
+    solved = np.empty((len(ptr) - 1, other.shape[1]))
+    groups = list(row_groups(ptr, other.shape[1]))
+    results = pool.map(lambda rows: solve_rows(ptr, indices, values, other, regularization, rows), groups)
+    for rows, factors in zip(groups, results):
+        solved[rows] = factors
+    return solved
+
+
+def factorize(matrix, factors=32, iterations=10, regularization=0.1, bias_shrink=10,
+              workers=None, seed=1, report=None):
+    """Fit the model to a gamer_rater_server_api.similarity.RatingMatrix
+
+    The chunks of each half step are solved on `workers` threads, NumPy
+    releases the GIL while it multiplies and solves.
+
+    Arguments:
+        bias_shrink -- ratings of the mean each game's bias is pooled with
+        report -- called with (iteration, training RMSE) after each iteration
+
+    Returns:
+        (user factors, game factors) -- float32 arrays with one row per
+                                        user and game of the matrix, and
+                                        the constant and bias columns last
+    """
+    values = matrix.game_values.astype(np.float64)
+    counts = np.diff(matrix.game_ptr)
+    mean = values.mean() if len(values) else 0.0
+    # Every game of the matrix has a rating, so no reduceat range is empty
+    sums = np.add.reduceat(values - mean, matrix.game_ptr[:-1]) if len(values) else np.zeros(0)
+    bias = sums / (counts + bias_shrink)
+
+    # What the factors have to explain, in both orders
+    game_residuals = values - mean - np.repeat(bias, counts)
+    user_games = matrix.user_games
+    user_residuals = matrix.user_values - mean - bias[user_games]
+
+    rng = np.random.default_rng(seed)
+    game_factors = rng.normal(scale=0.1, size=(len(matrix.games), factors))
+    user_factors = np.zeros((len(matrix.users), factors))
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for iteration in range(1, iterations + 1):
+            user_factors = solve_side(matrix.user_ptr, user_games, user_residuals,
+                                      game_factors, regularization, pool)
+            game_factors = solve_side(matrix.game_ptr, matrix.game_users, game_residuals,
+                                      user_factors, regularization, pool)
+            if report is not None and len(values):
+                users = np.repeat(np.arange(len(matrix.users)), np.diff(matrix.user_ptr))
+                errors = user_residuals - np.einsum('ij,ij->i', user_factors[users], game_factors[user_games])
+                report(iteration, float(np.sqrt(np.mean(errors ** 2))))
+
+    users = np.hstack([user_factors, np.ones((len(user_factors), 1))])
+    games = np.hstack([game_factors, (mean + bias)[:, None]])
+    return users.astype(np.float32), games.astype(np.float32)
+
+
+def save(directory, name, matrix, user_factors, game_factors):
+    """Write a run's factors to `directory`/`name` and make it the current run
+
+    The run is written out in full before the `current` file is swapped
+    to name it, so readers never see half of one. Runs older than the
+    previous one are deleted, a process may still be reading that.
+    """
+    run = os.path.join(directory, name)
+    os.makedirs(run, exist_ok=True)
+    np.save(os.path.join(run, 'users.npy'), matrix.users)
+    np.save(os.path.join(run, 'user_factors.npy'), user_factors)
+    np.save(os.path.join(run, 'games.npy'), matrix.games)
+    np.save(os.path.join(run, 'game_factors.npy'), game_factors)
+
+    pointer = os.path.join(directory, CURRENT)
+    previous = Recommender.current_name(directory)
+    with open(pointer + '.tmp', 'w') as file:
+        file.write(name)
+    os.replace(pointer + '.tmp', pointer)
+
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry not in (name, previous) and os.path.isdir(path):
+            for file_name in os.listdir(path):
+                os.remove(os.path.join(path, file_name))
+            os.rmdir(path)
+
+
+class Recommender:
+    """Memory-mapped factors of one run, see recommend()"""
+
+    def __init__(self, run):
+        load = lambda file_name: np.load(os.path.join(run, file_name), mmap_mode='r')
+        self.users = load('users.npy')
+        self.user_factors = load('user_factors.npy')
+        self.games = load('games.npy')
+        self.game_factors = load('game_factors.npy')
+        # A user the model has not seen only has the constant column
+        self.unknown_user = np.zeros(self.user_factors.shape[1], dtype=np.float32)
+        self.unknown_user[-1] = 1
+
+    @staticmethod
+    def current_name(directory):
+        """Name of the current run in `directory`, None before the first"""
+        try:
+            with open(os.path.join(directory, CURRENT)) as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def user_vector(self, user_id):
+        position = int(np.searchsorted(self.users, user_id))
+        if position < len(self.users) and self.users[position] == user_id:
+            return self.user_factors[position]
+        return self.unknown_user
+
+    def recommend(self, user_id, exclude=(), limit=10):
+        """The `limit` games with the highest predicted rating for a user, best first
+
+        Arguments:
+            exclude -- ids of games to leave out, such as those the user rated
+
+        Returns:
+            list -- (game id, predicted rating) pairs
+        """
+        if not len(self.games) or limit < 1:
+            return []
+        scores = self.game_factors @ self.user_vector(user_id)
+        exclude = np.fromiter(exclude, dtype=np.int64)
+        if len(exclude):
+            positions = np.minimum(np.searchsorted(self.games, exclude), len(self.games) - 1)
+            scores[positions[self.games[positions] == exclude]] = -np.inf
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.lexsort((self.games[top], -scores[top]))]
+        top = top[np.isfinite(scores[top])]
+        return list(zip(self.games[top].tolist(), scores[top].tolist()))
+
+
+# The Recommender of the current run by directory, with the run's name
+loaded = {}
+loading = threading.Lock()
+
+
+def current_recommender(directory):
+    """The Recommender of the current run in `directory`, None before the first run
+
+    Picks up a new run the next time it is called after the run is saved.
+    """
+    name = Recommender.current_name(directory)
+    if name is None:
+        return None
+    cached = loaded.get(directory)
+    if cached is None or cached[0] != name:
+        with loading:
+            cached = loaded.get(directory)
+            if cached is None or cached[0] != name:
+                cached = loaded[directory] = (name, Recommender(os.path.join(directory, name)))
+    return cached[1]
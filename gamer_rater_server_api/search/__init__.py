@@ -0,0 +1,4 @@
+from . import bitmap
+from . import fulltext
+from . import fuzzy
+from . import suggest
@@ -0,0 +1,303 @@
+"""In-process bitmap index for filtering games by category and attributes
+
+Every category and every value of the numeric game attributes has a bitmap
+of the game ids it holds. Bitmaps are plain Python ints used as bitsets, bit
+n set meaning game n is in the set, so combining filters is a handful of
+bitwise ANDs and ORs done in C over the whole catalog at once:
+
+    category 3 AND category 4 AND number_of_player >= 6
+        == categories[3] & categories[4] & (players[6] | players[7] | ...)
+
+The index is loaded from the database on first use and then kept current
+by the Game, Category and categories m2m signals, see gamer_rater_server_api.signals.
+Those only reach the index of the process that made the write, so the
+signals, and management commands such as import_catalog, also bump the
+VERSION_KEY table version. Every query checks it and reloads an index
+built at an older version, in step with the response cache, which keys
+the same writes on the game and category table versions.
+"""
+import threading
+from collections import defaultdict
+
+ATTRIBUTES = ('release_year', 'number_of_player', 'age_range', 'game_duration')
+
+# Bytes counted at a time when skipping ahead to an offset
+SKIP_BLOCK = 4096
+
+# Table version bumped by the writes this index holds, see gamer_rater_server_api.cache
+VERSION_KEY = 'search:game_filters'
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bitmap):
+        return bin(bitmap).count('1')
+
+
+class GameIds:
+    """Ascending game ids of a bitmap, as a sequence a paginator can slice"""
+
+    def __init__(self, bitmap):
+        self.bitmap = bitmap
+        self._length = None
+
+    def __len__(self):
+        if self._length is None:
+            self._length = popcount(self.bitmap)
+        return self._length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('GameIds only supports slicing')
+        start, stop, _ = index.indices(len(self))
+        return self.slice(start, stop - start)
+
+    def slice(self, offset, limit):
+        """Up to `limit` ids, skipping the first `offset` of them"""
+        data = self.bitmap.to_bytes((self.bitmap.bit_length() + 7) // 8, 'little')
+        ids = []
+        position = 0
+
+        # Skip whole blocks while the offset lies beyond them
+        while offset and position < len(data):
+            count = popcount(int.from_bytes(data[position:position + SKIP_BLOCK], 'little'))
+            if count > offset:
+                break
+            offset -= count
+            position += SKIP_BLOCK
+
+        for byte_index in range(position, len(data)):
+            byte = data[byte_index]
+            while byte:
+                low = byte & -byte
+                if offset:
+                    offset -= 1
+                else:
+                    ids.append(byte_index * 8 + low.bit_length() - 1)
+                    if len(ids) >= limit:
+                        return ids
+                byte ^= low
+        return ids
+
+
+class BitmapIndex:
+    """Bitmaps of game ids per category and per attribute value"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._loaded = False
+        self._version = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def is_stale(self, version=None):
+        return not self._loaded or version != self._version
+
+    def _reset(self):
+        self._all = 0
+        self._categories = defaultdict(int)
+        self._labels = {}
+        self._values = {attribute: defaultdict(int) for attribute in ATTRIBUTES}
+        self._games = {}
+        self._game_categories = defaultdict(set)
+
+    def load(self, games, game_categories, categories, version=None):
+        """Replace the index contents with rows read at `version`
+
+        Arguments:
+            games -- (id, release_year, number_of_player, age_range, game_duration) rows
+            game_categories -- (game id, category id) rows
+            categories -- (category id, label) rows
+        """
+        with self._lock:
+            # Writes committed while the rows are read wait for the lock,
+            # and are applied on top of the new contents
+            self._reset()
+            # Collect the bits of each bitmap first and build every int once,
+            # rather than reallocating a growing int for each game
+            all_ids = []
+            value_ids = {attribute: defaultdict(list) for attribute in ATTRIBUTES}
+            for game_id, *values in games:
+                all_ids.append(game_id)
+                self._games[game_id] = tuple(values)
+                for attribute, value in zip(ATTRIBUTES, values):
+                    value_ids[attribute][value].append(game_id)
+
+            category_ids = defaultdict(list)
+            for game_id, category_id in game_categories:
+                category_ids[category_id].append(game_id)
+                self._game_categories[game_id].add(category_id)
+
+            self._all = to_bitmap(all_ids)
+            for attribute in ATTRIBUTES:
+                for value, ids in value_ids[attribute].items():
+                    self._values[attribute][value] = to_bitmap(ids)
+            for category_id, ids in category_ids.items():
+                self._categories[category_id] = to_bitmap(ids)
+            self._labels = dict(categories)
+            self._loaded = True
+            self._version = version
+
+    def ensure_loaded(self, load, version=None):
+        """Load the index with `load()`, which returns load's rows, unless it is loaded at `version`"""
+        with self._lock:
+            if self.is_stale(version):
+                self.load(*load(), version=version)
+
+    def clear(self):
+        """Forget everything, the next query will load the index again"""
+        with self._lock:
+            self._reset()
+            self._loaded = False
+
+    def save_game(self, game_id, values):
+        """Add a new game, or move a changed one to its new attribute values"""
+        with self._lock:
+            if not self._loaded:
+                return
+            bit = 1 << game_id
+            old_values = self._games.get(game_id)
+            if old_values is not None:
+                for attribute, value in zip(ATTRIBUTES, old_values):
+                    self._discard(self._values[attribute], value, bit)
+            for attribute, value in zip(ATTRIBUTES, values):
+                self._values[attribute][value] |= bit
+            self._games[game_id] = tuple(values)
+            self._all |= bit
+
+    def delete_game(self, game_id):
+        with self._lock:
+            if not self._loaded:
+                return
+            self.clear_game_categories(game_id)
+            self._game_categories.pop(game_id, None)
+            old_values = self._games.pop(game_id, None)
+            bit = 1 << game_id
+            if old_values is not None:
+                for attribute, value in zip(ATTRIBUTES, old_values):
+                    self._discard(self._values[attribute], value, bit)
+            self._all &= ~bit
+
+    def add_categories(self, game_id, category_ids):
+        with self._lock:
+            if not self._loaded:
+                return
+            bit = 1 << game_id
+            for category_id in category_ids:
+                self._categories[category_id] |= bit
+                self._game_categories[game_id].add(category_id)
+
+    def clear_game_categories(self, game_id):
+        """Remove a game from all of its categories"""
+        with self._lock:
+            if self._loaded:
+                self.remove_categories(game_id, list(self._game_categories.get(game_id, ())))
+
+    def remove_categories(self, game_id, category_ids):
+        with self._lock:
+            if not self._loaded:
+                return
+            bit = 1 << game_id
+            for category_id in category_ids:
+                self._discard(self._categories, category_id, bit)
+                self._game_categories[game_id].discard(category_id)
+
+    def clear_category(self, category_id):
+        """Remove every game from a category"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._categories.pop(category_id, None)
+            for categories in self._game_categories.values():
+                categories.discard(category_id)
+
+    def save_category(self, category_id, label):
+        with self._lock:
+            if self._loaded:
+                self._labels[category_id] = label
+
+    def delete_category(self, category_id):
+        with self._lock:
+            if self._loaded:
+                self._labels.pop(category_id, None)
+                self.clear_category(category_id)
+
+    @staticmethod
+    def _discard(bitmaps, key, bit):
+        bitmap = bitmaps.get(key, 0) & ~bit
+        if bitmap:
+            bitmaps[key] = bitmap
+        else:
+            bitmaps.pop(key, None)
+
+    def match(self, category_ids=(), ranges=None):
+        """Bitmap of the games in every category and inside every (low, high) range
+
+        Arguments:
+            category_ids -- categories a game has to belong to, all of them
+            ranges -- {attribute: (low, high)}, either bound may be None
+        """
+        with self._lock:
+            result = self._all
+            for category_id in category_ids:
+                result &= self._categories.get(category_id, 0)
+            for attribute, (low, high) in (ranges or {}).items():
+                allowed = 0
+                for value, bitmap in self._values[attribute].items():
+                    if (low is None or value >= low) and (high is None or value <= high):
+                        allowed |= bitmap
+                result &= allowed
+            return result
+
+    def facet_counts(self, bitmap):
+        """Per category and per release decade counts, shaped like GameQuerySet.facet_counts"""
+        with self._lock:
+            categories = []
+            for category_id in sorted(self._categories):
+                count = popcount(bitmap & self._categories[category_id])
+                if count:
+                    categories.append({'id': category_id, 'label': self._labels.get(category_id), 'count': count})
+
+            decades = defaultdict(int)
+            for year, year_bitmap in self._values['release_year'].items():
+                count = popcount(bitmap & year_bitmap)
+                if count:
+                    decades[year // 10 * 10] += count
+
+        return {
+            'categories': categories,
+            'decades': [{'decade': decade, 'count': count} for decade, count in sorted(decades.items())],
+        }
+
+
+def to_bitmap(ids):
+    """Build a bitmap int from game ids in one allocation"""
+    if not ids:
+        return 0
+    data = bytearray((max(ids) >> 3) + 1)
+    for game_id in ids:
+        data[game_id >> 3] |= 1 << (game_id & 7)
+    return int.from_bytes(data, 'little')
+
+
+game_filters = BitmapIndex()
+
+
+def ensure_loaded():
+    """Load the shared index from the database unless it is loaded at the current version"""
+    from gamer_rater_server_api.cache import table_versions
+    from gamer_rater_server_api.models import Category, Game, GameCategory
+
+    def load():
+        return (
+            Game.objects.values_list('id', *ATTRIBUTES).iterator(),
+            GameCategory.objects.values_list('game_id', 'category_id').iterator(),
+            Category.objects.values_list('id', 'label'),
+        )
+    # Read before the rows, so a write landing in between only costs another load
+    version, = table_versions([VERSION_KEY])
+    game_filters.ensure_loaded(load, version)
+    return game_filters
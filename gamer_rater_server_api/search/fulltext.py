@@ -0,0 +1,112 @@
+"""SQLite FTS5 full text index over game titles, descriptions and designers
+
+The index is an external content FTS5 table that reads its text from the
+games table. Triggers on the games table keep it in step with every insert,
+update and delete, including bulk inserts that never reach the ORM.
+"""
+import re
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+GAME_TABLE = 'gamer_rater_server_api_game'
+INDEX_TABLE = 'gamer_rater_server_api_game_fts'
+COLUMNS = ('title', 'description', 'designer')
+
+TRIGGERS = {
+    f'{INDEX_TABLE}_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_insert AFTER INSERT ON {GAME_TABLE} BEGIN
+            INSERT INTO {INDEX_TABLE}(rowid, title, description, designer)
+            VALUES (new.id, new.title, new.description, new.designer);
+        END
+    """,
+    f'{INDEX_TABLE}_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_delete AFTER DELETE ON {GAME_TABLE} BEGIN
+            INSERT INTO {INDEX_TABLE}({INDEX_TABLE}, rowid, title, description, designer)
+            VALUES ('delete', old.id, old.title, old.description, old.designer);
+        END
+    """,
+    f'{INDEX_TABLE}_update': f"""
+        CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_update AFTER UPDATE OF title, description, designer
+        ON {GAME_TABLE} BEGIN
+            INSERT INTO {INDEX_TABLE}({INDEX_TABLE}, rowid, title, description, designer)
+            VALUES ('delete', old.id, old.title, old.description, old.designer);
+            INSERT INTO {INDEX_TABLE}(rowid, title, description, designer)
+            VALUES (new.id, new.title, new.description, new.designer);
+        END
+    """,
+}
+
+
+def is_available(using='default'):
+    """True when the database can serve FTS5 searches"""
+    return connections[using].vendor == 'sqlite'
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query where every word is a prefix term
+
+    Only word characters are kept, so user input can never inject FTS5
+    query syntax.
+    """
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', text))
+
+
+def search(queryset, text):
+    """Filter a game queryset down to full text matches for `text`
+
+    Matching games get a `search_rank` annotation, the FTS5 bm25 rank,
+    where lower is more relevant.
+    """
+    expression = match_expression(text)
+    if not expression:
+        return queryset.annotate(search_rank=RawSQL('0', ()))
+
+    if not is_available(queryset.db):
+        return queryset.filter(title__icontains=text).annotate(search_rank=RawSQL('0', ()))
+
+    return queryset.extra(
+        tables=[INDEX_TABLE],
+        where=[f'{INDEX_TABLE}.rowid = {GAME_TABLE}.id', f'{INDEX_TABLE} MATCH %s'],
+        params=[expression],
+    ).annotate(search_rank=RawSQL(f'{INDEX_TABLE}.rank', ()))
+
+
+def install_triggers(using='default', **kwargs):
+    """Make sure the sync triggers exist on the games table
+
+    Connected to post_migrate. SQLite drops triggers when a migration
+    rebuilds the games table, so they are recreated after every migrate
+    and the index is rebuilt whenever any of them had gone missing.
+    """
+    connection = connections[using]
+    if not is_available(using):
+        return
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if INDEX_TABLE not in tables or GAME_TABLE not in tables:
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+    if missing:
+        rebuild(using)
+
+
+def drop_triggers(using='default'):
+    """Stop syncing the index, for bulk loads that rebuild it afterwards
+
+    install_triggers puts them back and rebuilds the index.
+    """
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def rebuild(using='default'):
+    """Rebuild the whole index from the games table"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}) VALUES ('rebuild')")
@@ -0,0 +1,250 @@
+"""Typo tolerant search over game titles and designers
+
+An in-process trigram index narrows the catalog down to a handful of
+candidates, which are then checked with a bounded edit distance, so
+"Milton Bradly" still finds the games designed by Milton Bradley.
+
+The index is loaded from the database on first use and then kept up to
+date by the Game save and delete signals, see gamer_rater_server_api.signals.
+Those only reach the index of the process that made the write, so the
+signals, and management commands such as import_catalog, also bump the
+VERSION_KEY table version. Every search checks it and reloads an index
+built at an older version, in step with the response cache, which keys
+the same writes on the game table version.
+"""
+import re
+import threading
+from collections import Counter, defaultdict
+from django.db.models import Case, IntegerField, Value, When
+
+# Most matches a single search will return
+MAX_RESULTS = 100
+
+# Most candidates checked with the edit distance, best trigram overlap first.
+# Short queries share trigrams with much of the catalog, this bounds their cost.
+MAX_CANDIDATES = 2000
+
+# Table version bumped by the writes this index holds, see gamer_rater_server_api.cache
+VERSION_KEY = 'search:game_titles'
+
+
+def normalize(text):
+    """Lower case `text` and reduce it to single spaced words"""
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def trigrams(text):
+    """Trigrams of every word in normalized `text`, padded like pg_trgm"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def allowed_distance(text):
+    """How many typos a query of this length may contain"""
+    return max(1, min(3, len(text) // 4))
+
+
+def edit_distance(source, target, limit):
+    """Levenshtein distance between two strings, or limit + 1 once it exceeds limit"""
+    if abs(len(source) - len(target)) > limit:
+        return limit + 1
+    previous = list(range(len(target) + 1))
+    for i, source_char in enumerate(source, 1):
+        current = [i]
+        for j, target_char in enumerate(target, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (source_char != target_char),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def field_distance(query, field, limit):
+    """Smallest edit distance between the query and any run of words in the field
+
+    Runs have as many words as the query, so "bradly" matches the designer
+    "Milton Bradley" as well as "milton bradly" does.
+    """
+    best = edit_distance(query, field, limit)
+    words = field.split()
+    width = len(query.split())
+    if len(words) > width:
+        for start in range(len(words) - width + 1):
+            window = ' '.join(words[start:start + width])
+            best = min(best, edit_distance(query, window, limit))
+            if best == 0:
+                break
+    return best
+
+
+class FuzzyIndex:
+    """Trigram index with edit distance verification over (title, designer)
+
+    Trigrams are indexed per distinct normalized string rather than per
+    game, so a designer shared by thousands of games is only checked once.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._fields = {}
+        self._games = {}
+        self._postings = defaultdict(set)
+        self._loaded = False
+        self._version = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def is_stale(self, version=None):
+        return not self._loaded or version != self._version
+
+    def load(self, rows, version=None):
+        """Replace the index contents with (id, title, designer) rows read at `version`"""
+        with self._lock:
+            # Writes committed while the rows are read wait for the lock,
+            # and are applied on top of the new contents
+            self._reset()
+            for game_id, title, designer in rows:
+                self._add(game_id, title, designer)
+            self._loaded = True
+            self._version = version
+
+    def ensure_loaded(self, load_rows, version=None):
+        """Load the index from `load_rows()` unless it is loaded at `version`"""
+        with self._lock:
+            if self.is_stale(version):
+                self.load(load_rows(), version)
+
+    def clear(self):
+        """Forget everything, the next search will load the index again"""
+        with self._lock:
+            self._reset()
+            self._loaded = False
+
+    def add(self, game_id, title, designer):
+        """Index a new game, or re-index a changed one"""
+        with self._lock:
+            if self._loaded:
+                self._remove(game_id)
+                self._add(game_id, title, designer)
+
+    def remove(self, game_id):
+        """Drop a deleted game from the index"""
+        with self._lock:
+            if self._loaded:
+                self._remove(game_id)
+
+    def _reset(self):
+        self._fields = {}
+        self._games = {}
+        self._postings = defaultdict(set)
+
+    def _add(self, game_id, title, designer):
+        fields = (normalize(title), normalize(designer))
+        self._fields[game_id] = fields
+        for text in fields:
+            games = self._games.get(text)
+            if games is None:
+                games = self._games[text] = set()
+                for gram in trigrams(text):
+                    self._postings[gram].add(text)
+            games.add(game_id)
+
+    def _remove(self, game_id):
+        for text in self._fields.pop(game_id, ()):
+            games = self._games.get(text)
+            if games is None:
+                continue
+            games.discard(game_id)
+            if games:
+                continue
+            del self._games[text]
+            for gram in trigrams(text):
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    postings.discard(text)
+                    if not postings:
+                        del self._postings[gram]
+
+    def search(self, text, limit=MAX_RESULTS):
+        """Ids of the games whose title or designer is within a few typos of `text`
+
+        Returns (game id, distance) pairs, closest first.
+        """
+        query = normalize(text)
+        if not query:
+            return []
+        limit_distance = allowed_distance(query)
+        grams = trigrams(query)
+
+        with self._lock:
+            # One typo can break at most three trigrams, so a match shares at
+            # least `needed` of them. Any such string must then contain one of
+            # the 3k + 1 rarest query trigrams, which seeds the candidates.
+            needed = max(1, len(grams) - 3 * limit_distance)
+            by_rarity = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+            candidates = set()
+            for gram in by_rarity[:len(grams) - needed + 1]:
+                candidates |= self._postings.get(gram, set())
+
+            overlap = Counter()
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings:
+                    overlap.update(postings & candidates)
+
+            matches = []
+            for candidate, shared in overlap.most_common(MAX_CANDIDATES):
+                if shared < needed:
+                    break
+                distance = field_distance(query, candidate, limit_distance)
+                if distance <= limit_distance:
+                    matches.append((distance, -shared, candidate))
+            matches.sort()
+
+            results = {}
+            for distance, _, candidate in matches:
+                for game_id in sorted(self._games[candidate]):
+                    results.setdefault(game_id, distance)
+                if len(results) >= limit:
+                    break
+
+        return list(results.items())[:limit]
+
+
+game_index = FuzzyIndex()
+
+
+def search(text, limit=MAX_RESULTS):
+    """Search the shared game index, loading it from the database when its version moved"""
+    from gamer_rater_server_api.cache import table_versions
+    from gamer_rater_server_api.models import Game
+    # Read before the rows, so a write landing in between only costs another load
+    version, = table_versions([VERSION_KEY])
+    game_index.ensure_loaded(lambda: Game.objects.values_list('id', 'title', 'designer').iterator(), version)
+    return game_index.search(text, limit)
+
+
+def search_games(queryset, text):
+    """Filter a game queryset down to the fuzzy matches for `text`
+
+    Matching games get a `search_rank` annotation, their position in the
+    match list, where lower is closer.
+    """
+    matches = search(text)
+    if not matches:
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+    rank = Case(
+        *[When(pk=game_id, then=Value(position)) for position, (game_id, _) in enumerate(matches)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=[game_id for game_id, _ in matches]).annotate(search_rank=rank)
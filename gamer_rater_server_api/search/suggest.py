@@ -0,0 +1,130 @@
+"""Prefix autocomplete over game titles
+
+Titles are kept in one sorted array, so the games starting with a prefix
+are a contiguous slice found with two binary searches. Within that slice
+the most rated games win. The top games for every one and two letter
+prefix are worked out when the index is built, because those slices cover
+a large part of the catalog.
+
+The index is rebuilt lazily: game writes only mark it stale and bump the
+VERSION_KEY table version, and the next suggestion in any process that
+finds the index built at an older version reloads it. Rating counts move
+too often for that, so the ranking is also refreshed every MAX_AGE seconds.
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+# Most suggestions a single request can ask for
+MAX_LIMIT = 20
+
+# Seconds before the index is reloaded to pick up new rating counts
+MAX_AGE = 300
+
+# Table version bumped by title writes, see gamer_rater_server_api.cache
+VERSION_KEY = 'search:game_suggestions'
+
+# Prefixes up to this length have their top games precomputed
+PRECOMPUTED_PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    return text.casefold()
+
+
+class SuggestIndex:
+    """Sorted array index of (title, id) ranked by rating count"""
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # (keys, titles, ids, counts, top) swapped in as one tuple so a
+        # reader never sees arrays from two different builds
+        self._state = ([], [], array('q'), array('q'), {})
+        self._built_at = None
+        self._version = None
+        self._stale = True
+
+    def mark_stale(self):
+        """Rebuild the index before the next suggestion"""
+        self._stale = True
+
+    def clear(self):
+        with self._lock:
+            self._state = ([], [], array('q'), array('q'), {})
+            self._built_at = None
+            self._version = None
+            self._stale = True
+
+    def is_stale(self, version=None):
+        return (self._stale or version != self._version
+                or time.monotonic() - self._built_at > self.max_age)
+
+    def ensure_fresh(self, load_rows, version=None):
+        """Rebuild from `load_rows()` when the index is stale or was built at another version"""
+        if not self.is_stale(version):
+            return
+        with self._lock:
+            if self.is_stale(version):
+                self.build(load_rows(), version)
+
+    def build(self, rows, version=None):
+        """Build the index from (id, title, rating count) rows read at `version`"""
+        # Cleared before the rows are read, so a write that lands while
+        # building marks the new index stale again
+        self._stale = False
+        built_at = time.monotonic()
+        entries = sorted((normalize(title), game_id, title, count) for game_id, title, count in rows)
+
+        keys = [entry[0] for entry in entries]
+        titles = [entry[2] for entry in entries]
+        ids = array('q', (entry[1] for entry in entries))
+        counts = array('q', (entry[3] for entry in entries))
+
+        # Walk each short prefix group once and keep its best positions
+        top = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+            groups = {}
+            for position, key in enumerate(keys):
+                if len(key) >= length:
+                    groups.setdefault(key[:length], []).append(position)
+            for prefix, positions in groups.items():
+                top[prefix] = heapq.nsmallest(
+                    MAX_LIMIT, positions, key=lambda position: (-counts[position], position))
+
+        self._state = (keys, titles, ids, counts, top)
+        self._built_at = built_at
+        self._version = version
+
+    def suggest(self, prefix, limit=10):
+        """(id, title) pairs for the most rated games whose title starts with `prefix`"""
+        prefix = normalize(prefix)
+        limit = max(1, min(limit, MAX_LIMIT))
+        if not prefix:
+            return []
+        keys, titles, ids, counts, top = self._state
+
+        if prefix in top:
+            positions = top[prefix][:limit]
+        else:
+            start = bisect_left(keys, prefix)
+            end = bisect_left(keys, prefix + '\U0010ffff', start)
+            positions = heapq.nsmallest(
+                limit, range(start, end), key=lambda position: (-counts[position], position))
+
+        return [(ids[position], titles[position]) for position in positions]
+
+
+title_index = SuggestIndex()
+
+
+def suggest_titles(prefix, limit=10):
+    """Suggest titles from the shared index, rebuilding it first when stale"""
+    from gamer_rater_server_api.cache import table_versions
+    from gamer_rater_server_api.models import Game
+    version, = table_versions([VERSION_KEY])
+    title_index.ensure_fresh(
+        lambda: Game.objects.values_list('id', 'title', 'rating_count').iterator(), version)
+    return title_index.suggest(prefix, limit)
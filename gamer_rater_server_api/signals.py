@@ -0,0 +1,171 @@
+"""Signal handlers that keep the in-process game indexes, the leaderboard
+scores of GameCategory rows, the trending keys and the response cache up
+to date
+
+Index updates are deferred until the surrounding transaction commits, so a
+rolled back write never reaches an index.
+"""
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from gamer_rater_server_api import trending
+from gamer_rater_server_api.cache import bump_versions_on_commit
+from gamer_rater_server_api.models import Category, Game, GameCategory, Image, Rating, Review
+from gamer_rater_server_api.models.game import games_bulk_created
+from gamer_rater_server_api.models.rating import ratings_upserted
+from gamer_rater_server_api.search import bitmap, fuzzy, suggest
+
+
+@receiver(post_save, sender=Game)
+def game_saved(sender, instance, **kwargs):
+    game_id, title, designer = instance.id, instance.title, instance.designer
+    values = tuple(int(getattr(instance, attribute)) for attribute in bitmap.ATTRIBUTES)
+    transaction.on_commit(lambda: fuzzy.game_index.add(game_id, title, designer))
+    transaction.on_commit(suggest.title_index.mark_stale)
+    transaction.on_commit(lambda: bitmap.game_filters.save_game(game_id, values))
+
+
+@receiver(post_delete, sender=Game)
+def game_deleted(sender, instance, **kwargs):
+    game_id = instance.id
+    transaction.on_commit(lambda: fuzzy.game_index.remove(game_id))
+    transaction.on_commit(suggest.title_index.mark_stale)
+    transaction.on_commit(lambda: bitmap.game_filters.delete_game(game_id))
+
+
+@receiver(games_bulk_created, sender=Game)
+def games_created(sender, games, category_ids, **kwargs):
+    """Index games written by bulk_create, which sends no post_save"""
+    rows = [
+        (game.id, game.title, game.designer,
+         tuple(int(getattr(game, attribute)) for attribute in bitmap.ATTRIBUTES), ids)
+        for game, ids in zip(games, category_ids)
+    ]
+
+    def index_games():
+        for game_id, title, designer, values, ids in rows:
+            fuzzy.game_index.add(game_id, title, designer)
+            bitmap.game_filters.save_game(game_id, values)
+            bitmap.game_filters.add_categories(game_id, ids)
+        suggest.title_index.mark_stale()
+
+    transaction.on_commit(index_games)
+    tables = [Game._meta.db_table, GameCategory._meta.db_table] + index_versions(Game)
+    bump_versions_on_commit(*tables, using=kwargs.get('using'))
+
+
+@receiver(ratings_upserted, sender=Rating)
+def ratings_written(sender, game_ids, **kwargs):
+    """Invalidate responses after RatingQuerySet.upsert, whose INSERT sends no post_save"""
+    tables = [Rating._meta.db_table, Game._meta.db_table]
+    bump_versions_on_commit(*tables, using=kwargs.get('using'))
+
+
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=Review)
+def activity_deleted(sender, instance, using, **kwargs):
+    """Take a deleted rating or review back out of its game's trending key, which can only grow otherwise"""
+    trending.recount_on_commit([instance.game_id], using)
+
+
+@receiver(pre_save, sender=Rating)
+@receiver(pre_save, sender=Review)
+def activity_moving(sender, instance, raw, using, **kwargs):
+    """Work out the trending keys of both games again when a rating or review moves to another game"""
+    if raw or instance._state.adding:
+        return
+    old_game_id = sender.objects.using(using).filter(pk=instance.pk).values_list('game_id', flat=True).first()
+    if old_game_id is not None and old_game_id != instance.game_id:
+        trending.recount_on_commit([old_game_id, instance.game_id], using)
+
+
+@receiver(m2m_changed, sender=Game.categories.through)
+def game_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Follow game.categories.set(), add(), remove() and clear(), from either side"""
+    index = bitmap.game_filters
+    changed = set(pk_set or ())
+    if not reverse:
+        game_id = instance.id
+        if action == 'post_add':
+            transaction.on_commit(lambda: index.add_categories(game_id, changed))
+        elif action == 'post_remove':
+            transaction.on_commit(lambda: index.remove_categories(game_id, changed))
+        elif action == 'post_clear':
+            transaction.on_commit(lambda: index.clear_game_categories(game_id))
+    else:
+        category_id = instance.id
+        if action == 'post_add':
+            transaction.on_commit(lambda: [index.add_categories(game_id, [category_id]) for game_id in changed])
+        elif action == 'post_remove':
+            transaction.on_commit(lambda: [index.remove_categories(game_id, [category_id]) for game_id in changed])
+        elif action == 'post_clear':
+            transaction.on_commit(lambda: index.clear_category(category_id))
+
+
+@receiver(m2m_changed, sender=Game.categories.through)
+def game_categories_added(sender, instance, action, reverse, pk_set, **kwargs):
+    """Give new GameCategory rows the Bayesian rating of their game, which may already have ratings"""
+    if action != 'post_add' or not pk_set:
+        return
+    games = Game.objects.filter(pk__in=pk_set) if reverse else Game.objects.filter(pk=instance.pk)
+    games.sync_category_rankings()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    category_id, label = instance.id, instance.label
+    transaction.on_commit(lambda: bitmap.game_filters.save_category(category_id, label))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    category_id = instance.id
+    transaction.on_commit(lambda: bitmap.game_filters.delete_category(category_id))
+
+
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+@receiver(post_save, sender=GameCategory)
+@receiver(post_delete, sender=GameCategory)
+@receiver(m2m_changed, sender=Game.categories.through)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_responses(sender, **kwargs):
+    """Bump the cache version of the written table
+
+    The bump happens once the write's transaction commits, once per table
+    however many rows it wrote, see bump_versions_on_commit. Rating writes
+    also change the rating totals on their game, and writes to indexed
+    tables also bump the versions of their indexes.
+    """
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    # Logging in only records last_login, which no response shows
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        return
+    tables = [sender._meta.db_table] + index_versions(sender)
+    if sender is Rating:
+        tables.append(Game._meta.db_table)
+    bump_versions_on_commit(*tables, using=kwargs.get('using'))
+
+
+def index_versions(model):
+    """Version keys of the in-process indexes holding rows of `model`
+
+    Bumped together with the table, so the indexes of other processes
+    reload exactly when the responses built from the table go stale.
+    """
+    if model is Game:
+        return [fuzzy.VERSION_KEY, suggest.VERSION_KEY, bitmap.VERSION_KEY]
+    if model in (GameCategory, Category):
+        return [bitmap.VERSION_KEY]
+    return []
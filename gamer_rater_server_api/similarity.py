@@ -0,0 +1,134 @@
+"""Item to item similarity between games from their ratings
+
+Every game is a vector of the ratings users gave it, and two games are as
+similar as the cosine of their vectors. The ratings are loaded into a
+sparse user x game matrix kept twice, ordered by user and by game, and
+the similarities of a block of games to every other game are one dense
+matrix product over just the users who rated the block:
+
+    S[:, block] = X[users, :].T @ X[users, block] / (norms * norms[block])
+
+Only the top `k` neighbors of each game are kept, see build_similar_games.
+
+Needs NumPy:
+
+    pip install numpy
+"""
+import numpy as np
+
+# Most float32 cells of the dense user x game slices a block multiplies
+DENSE_BUDGET = 1 << 24
+
+
+def ranges(starts, stops):
+    """Concatenation of range(start, stop) for each pair, without a Python loop"""
+    lengths = stops - starts
+    if not lengths.sum():
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+class RatingMatrix:
+    """Sparse user x game matrix of ratings
+
+    Attributes:
+        games -- game id of each column, ascending
+        norms -- length of each column's rating vector
+    """
+
+    def __init__(self, user_ids, game_ids, ratings):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        game_ids = np.asarray(game_ids, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float64)
+
+        self.users, user_columns = np.unique(user_ids, return_inverse=True)
+        self.games, game_columns = np.unique(game_ids, return_inverse=True)
+        width = max(len(self.games), 1)
+
+        # A user who rated a game more than once counts with their mean rating
+        cells, inverse = np.unique(user_columns * width + game_columns, return_inverse=True)
+        values = (np.bincount(inverse, weights=ratings) / np.bincount(inverse)).astype(np.float32)
+        cell_users, cell_games = cells // width, cells % width
+
+        # Ordered by user, then game
+        self.user_games = cell_games
+        self.user_values = values
+        self.user_ptr = np.searchsorted(cell_users, np.arange(len(self.users) + 1))
+
+        # Ordered by game, then user
+        order = np.argsort(cell_games, kind='stable')
+        self.game_users = cell_users[order]
+        self.game_values = values[order]
+        self.game_ptr = np.searchsorted(cell_games[order], np.arange(len(self.games) + 1))
+
+        self.norms = np.sqrt(np.bincount(cell_games, weights=values ** 2.0, minlength=len(self.games)))
+        # Only all zero ratings give a zero norm, and their products are zero anyway
+        self.norms[self.norms == 0] = 1
+
+    @classmethod
+    def from_ratings(cls, ratings):
+        """Matrix of a Rating queryset"""
+        rows = np.array(list(ratings.values_list('user_id', 'game_id', 'rating').iterator()), dtype=np.int64)
+        rows = rows.reshape(-1, 3)
+        return cls(rows[:, 0], rows[:, 1], rows[:, 2])
+
+    def columns(self, game_ids):
+        """Column of each game id, -1 for games nobody rated"""
+        game_ids = np.asarray(game_ids, dtype=np.int64)
+        if not len(self.games):
+            return np.full(len(game_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.games, game_ids), len(self.games) - 1)
+        return np.where(self.games[positions] == game_ids, positions, -1)
+
+    def similarities(self, block):
+        """Cosine similarity of other games to each game of `block`, an array of columns
+
+        Returns:
+            (columns, scores) -- the columns of the games sharing a rater
+                                 with the block, and their similarity to
+                                 each block game, shape (len(columns), len(block))
+        """
+        starts, stops = self.game_ptr[block], self.game_ptr[block + 1]
+        entries = ranges(starts, stops)
+        block_positions = np.repeat(np.arange(len(block)), stops - starts)
+        raters, rater_rows = np.unique(self.game_users[entries], return_inverse=True)
+
+        block_matrix = np.zeros((len(raters), len(block)), dtype=np.float32)
+        block_matrix[rater_rows, block_positions] = self.game_values[entries]
+
+        # Everything the block's raters rated, ordered by rater
+        rated = ranges(self.user_ptr[raters], self.user_ptr[raters + 1])
+        rated_rows = np.repeat(np.arange(len(raters)), self.user_ptr[raters + 1] - self.user_ptr[raters])
+        columns, rated_columns = np.unique(self.user_games[rated], return_inverse=True)
+
+        # Dense slices of a few raters at a time, so memory stays bounded
+        # however many games the raters have rated between them
+        scores = np.zeros((len(columns), len(block)), dtype=np.float32)
+        chunk = max(1, DENSE_BUDGET // max(len(columns), 1))
+        for first in range(0, len(raters), chunk):
+            start, stop = np.searchsorted(rated_rows, [first, first + chunk])
+            dense = np.zeros((min(chunk, len(raters) - first), len(columns)), dtype=np.float32)
+            dense[rated_rows[start:stop] - first, rated_columns[start:stop]] = self.user_values[rated[start:stop]]
+            scores += dense.T @ block_matrix[first:first + chunk]
+
+        scores /= np.outer(self.norms[columns], self.norms[block]).astype(np.float32)
+        # A game is not its own neighbor
+        scores[np.searchsorted(columns, block), np.arange(len(block))] = 0
+        return columns, scores
+
+
+def top_neighbors(columns, scores, k):
+    """The `k` best (columns, scores) for each column of `scores`, best first
+
+    Ties go to the lowest column, which is the lowest game id.
+    """
+    rows, positions = np.nonzero(scores > 0)
+    values = scores[rows, positions]
+    order = np.lexsort((rows, -values, positions))
+    rows, positions, values = rows[order], positions[order], values[order]
+    bounds = np.searchsorted(positions, np.arange(scores.shape[1] + 1))
+    return [
+        (columns[rows[start:min(stop, start + k)]], values[start:min(stop, start + k)])
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
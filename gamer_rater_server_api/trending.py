@@ -0,0 +1,147 @@
+"""Games with the most rating and review activity lately
+
+Each new rating counts 1 and each new review TRENDING_REVIEW_WEIGHT, and
+the count decays by half every TRENDING_HALF_LIFE_HOURS, so a game's
+score at time T is
+
+    sum of weight * 2 ** -((T - created_at) / half life)
+
+over its ratings and reviews. Every term shrinks by the same factor as
+time goes on, so how games rank against each other only changes when
+they get new activity. Each game therefore stores the time-independent
+
+    trending_key = log(sum of weight * exp(rate * (created_at - EPOCH)))
+
+which ranks games the same way as their scores at any moment, and
+`manage.py update_trending` only moves the keys of games that have
+ratings or reviews created since its last run, see fold_activity. The
+score at time T is exp(trending_key - rate * (T - EPOCH)).
+
+New activity can only add to a key. A rating or review that is deleted,
+or moved to another game, leaves a TrendingRecount row for its game
+instead, see recount_on_commit, and the next run works the keys of those
+games out again from all of their remaining activity.
+
+/games/trending reads the keys off the descending index on the game
+table, as many index entries as it returns games.
+"""
+import math
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from gamer_rater_server_api.models import Game, Rating, Review, TrendingRecount, TrendingRun
+
+# Most games a single trending request can ask for
+MAX_LIMIT = 100
+
+# Keys are offsets from this time. Far later activity only makes them
+# larger numbers, which a float holds for millennia of half-lives.
+EPOCH = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def decay_rate(half_life_hours):
+    """Decay per second of a score with the given half-life"""
+    return math.log(2) / (half_life_hours * 3600)
+
+
+def merge_keys(first, second):
+    """The key of the activity of two keys together, either may be None"""
+    if first is None or second is None:
+        return second if first is None else first
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def activity_keys(events, half_life_hours):
+    """{game id: key} of (game id, created_at, weight) events"""
+    rate = decay_rate(half_life_hours)
+    exponents = {}
+    for game_id, created_at, weight in events:
+        exponents.setdefault(game_id, []).append(
+            (rate * (created_at - EPOCH).total_seconds(), weight))
+    keys = {}
+    for game_id, terms in exponents.items():
+        # Summed relative to the largest exponent, which would overflow on its own
+        top = max(exponent for exponent, _ in terms)
+        keys[game_id] = top + math.log(sum(weight * math.exp(exponent - top) for exponent, weight in terms))
+    return keys
+
+
+def fold_activity(since, until, half_life_hours, recount=(), using='default'):
+    """Move the trending key of every game with ratings or reviews created in (since, until]
+
+    Both tables are read on their created_at index, so only the new
+    activity is read however long the history is. `since` None reads
+    everything up to `until`. The keys of the `recount` games are worked
+    out again from all of their activity up to `until`, read on the game
+    index, rather than moved.
+
+    Returns:
+        int -- the number of games whose key moved
+    """
+    recount = set(recount) if since is not None else set()
+    events = []
+    for model, weight in ((Rating, 1), (Review, settings.TRENDING_REVIEW_WEIGHT)):
+        rows = model.objects.using(using).filter(created_at__lte=until)
+        new_rows = rows
+        if since is not None:
+            new_rows = rows.filter(created_at__gt=since).exclude(game_id__in=list(recount))
+        querysets = [new_rows, rows.filter(game_id__in=list(recount))] if recount else [new_rows]
+        events.extend((game_id, created_at, weight)
+                      for queryset in querysets
+                      for game_id, created_at in queryset.values_list('game_id', 'created_at').iterator())
+
+    new_keys = activity_keys(events, half_life_hours)
+    games = Game.objects.using(using).filter(pk__in=list(set(new_keys) | recount)).only('id', 'trending_key')
+    changed = []
+    for game in games.iterator():
+        if game.pk in recount:
+            game.trending_key = new_keys.get(game.pk)
+        else:
+            game.trending_key = merge_keys(game.trending_key, new_keys[game.pk])
+        changed.append(game)
+    Game.objects.using(using).bulk_update(changed, ['trending_key'], batch_size=500)
+    return len(changed)
+
+
+def recount_on_commit(game_ids, using=None):
+    """Have the next update_trending work out the keys of these games again
+
+    The games are collected on the connection and written as one
+    TrendingRecount row each once the transaction commits, leaving out
+    games that no longer exist, such as the game whose deletion took its
+    ratings and reviews along.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    connection = connections[using]
+    if not hasattr(connection, 'pending_trending_recounts'):
+        connection.pending_trending_recounts = set()
+    connection.pending_trending_recounts.update(game_ids)
+    transaction.on_commit(lambda: flush_recounts(using), using=using)
+
+
+def flush_recounts(using):
+    """Write the TrendingRecount rows recount_on_commit collected on a connection"""
+    connection = connections[using]
+    game_ids, connection.pending_trending_recounts = connection.pending_trending_recounts, set()
+    if game_ids:
+        existing = Game.objects.using(using).filter(pk__in=list(game_ids)).values_list('id', flat=True)
+        TrendingRecount.objects.using(using).bulk_create(
+            [TrendingRecount(game_id=game_id) for game_id in existing])
+
+
+def trending_games(limit=10):
+    """[(game, score)] of the `limit` games with the highest trending score, hottest first
+
+    The scores are as of the last `manage.py update_trending` run, which
+    is as far as the keys go.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    last = TrendingRun.objects.order_by('-started_at').first()
+    if last is None:
+        return []
+    offset = decay_rate(last.half_life) * (last.read_until - EPOCH).total_seconds()
+    games = (Game.objects.for_display()
+             .filter(trending_key__isnull=False)
+             .order_by('-trending_key', 'id')[:limit])
+    return [(game, math.exp(game.trending_key - offset)) for game in games]
@@ -1,9 +1,15 @@
 """View module for handling requests about game types"""
 from django.http import HttpResponseServerError
+from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
-from gamer_rater_server_api.models import Category
+from gamer_rater_server_api import leaderboard
+from gamer_rater_server_api.cache import cached_response, conditional_response
+from gamer_rater_server_api.fieldsets import SparseFieldsMixin, prune_queryset
+from gamer_rater_server_api.models import Category, Game, GameCategory
+from gamer_rater_server_api.views.game import LeaderboardSerializer
 
 
 class CategoryView(ViewSet):
@@ -22,13 +28,15 @@ class CategoryView(ViewSet):
     #     except Exception as ex:
     #         return HttpResponseServerError(ex)
 
+    @conditional_response(Category)
+    @cached_response(Category)
     def list(self, request):
         """Handle GET requests to get all game types
 
         Returns:
             Response -- JSON serialized list of game types
         """
-        categories = Category.objects.all()
+        categories = prune_queryset(Category.objects.all(), CategorySerializer, request)
 
         # Note the addtional `many=True` argument to the
         # serializer. It's needed when you are serializing
@@ -37,7 +45,32 @@ class CategoryView(ViewSet):
             categories, many=True, context={'request': request})
         return Response(serializer.data)
 
-class CategorySerializer(serializers.ModelSerializer):
+    @action(methods=['get'], detail=True)
+    @conditional_response(Game, GameCategory, Category)
+    @cached_response(Game, GameCategory, Category)
+    def top(self, request, pk=None):
+        """Handle GET requests for the best rated games of a category
+
+            http://localhost:8000/categories/3/top?limit=10
+
+        Returns:
+            Response -- JSON list of the category's games by Bayesian rating, best first
+        """
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            category = Category.objects.get(pk=pk)
+        except (Category.DoesNotExist, ValueError):
+            return Response({'message': 'Category matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = LeaderboardSerializer(
+            leaderboard.top_games_in_category(category.id, limit), many=True, context={'request': request})
+        return Response(serializer.data)
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for game types
 
     Arguments:
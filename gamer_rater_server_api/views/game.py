@@ -1,19 +1,148 @@
 """View module for handling requests about games"""
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from rest_framework import status
-from django.http import HttpResponseServerError
+from django.http import HttpResponseServerError, StreamingHttpResponse
 from rest_framework.viewsets import ViewSet
+from gamer_rater_server_api import export, leaderboard, overlay, trending
+from gamer_rater_server_api.cache import cached_response, conditional_response, rows_by_pk
+from gamer_rater_server_api.fast_serializers import fast_serializer
+from gamer_rater_server_api.fieldsets import SparseFieldsMixin, prune_queryset
+from gamer_rater_server_api.pagination import PaginatedListMixin
 from rest_framework.response import Response
 from rest_framework import serializers
-from gamer_rater_server_api.models import Game
+from gamer_rater_server_api.models import Category, Game, GameCategory, Rating, SimilarGame, SimilarityRun, TrendingRun
 from django.contrib.auth.models import User
-from django.db.models import Q
+from gamer_rater_server_api.search import bitmap, fulltext, fuzzy
+from gamer_rater_server_api.search.suggest import suggest_titles
+from rest_framework.decorators import action
 
 
 
-class GameView(ViewSet):
+class GameView(PaginatedListMixin, ViewSet):
     """Level up games"""
 
+    # Numeric columns games can be filtered on, each by exact value
+    # or by range with the `_min` and `_max` variants
+    #    http://localhost:8000/games?release_year_min=1990&number_of_player=4
+    numeric_filters = ('release_year', 'number_of_player', 'age_range', 'game_duration')
+
+    # Columns games can be ordered by, descending with a leading `-`
+    #    http://localhost:8000/games?ordering=-average_rating
+    ordering_fields = ('average_rating', 'release_year', 'title')
+
+    # Request keys of a new game and the Game fields they fill
+    game_fields = {
+        'title': 'title',
+        'description': 'description',
+        'designer': 'designer',
+        'numberOfPlayers': 'number_of_player',
+        'releaseYear': 'release_year',
+        'gameDuration': 'game_duration',
+        'ageRange': 'age_range',
+    }
+
+    def get_list_ordering(self):
+        """Ordering from `?ordering=`, otherwise relevance for searches and id for the rest"""
+        ordering = self.request.query_params.get('ordering')
+        if ordering is not None:
+            if ordering.lstrip('-') not in self.ordering_fields:
+                raise ValueError(f'ordering must be one of {", ".join(self.ordering_fields)}')
+            return (ordering,)
+        if 'q' in self.request.query_params:
+            return ('search_rank',)
+        return super().get_list_ordering()
+
+    def category_filter(self):
+        """Category ids from `?category=1,2` or `?category=1&category=2`"""
+        values = self.request.query_params.getlist('category')
+        try:
+            return [int(value) for param in values for value in param.split(',') if value]
+        except ValueError:
+            raise ValueError('category must be a list of category ids')
+
+    def numeric_ranges(self):
+        """{field: (low, high)} from the numeric filters, either bound may be None
+
+        Raises:
+            ValueError -- when a filter value is not a number
+        """
+        ranges = {}
+        for field in self.numeric_filters:
+            low = high = None
+            for suffix in ('', '_min', '_max'):
+                value = self.request.query_params.get(field + suffix)
+                if value is None:
+                    continue
+                try:
+                    number = int(value)
+                except ValueError:
+                    raise ValueError(f'{field}{suffix} must be a number')
+                if suffix != '_max':
+                    low = number if low is None else max(low, number)
+                if suffix != '_min':
+                    high = number if high is None else min(high, number)
+            if low is not None or high is not None:
+                ranges[field] = (low, high)
+        return ranges
+
+    def filter_games(self, games, category_ids, ranges):
+        """Apply the category and numeric filters to a game queryset"""
+        if category_ids:
+            games = games.in_categories(category_ids)
+        for field, (low, high) in ranges.items():
+            if low is not None:
+                games = games.filter(**{f'{field}__gte': low})
+            if high is not None:
+                games = games.filter(**{f'{field}__lte': high})
+        return games
+
+    def wants_facets(self):
+        """True when the list request asks for facet counts
+
+            http://localhost:8000/games?category=3&facets=1
+
+        Counting reads every matching game, so only requests that show
+        the counts pay for them.
+        """
+        return self.request.query_params.get('facets') == '1'
+
+    def can_use_bitmaps(self):
+        """True when the bitmap index alone can pick the games for this list request
+
+        It knows categories and numeric attributes, and pages in id order
+        by offset, so searches, other orderings and cursors go to the database.
+        """
+        params = self.request.query_params
+        return ('q' not in params and 'ordering' not in params and
+                'cursor' not in params and self.get_paginator() is not None)
+
+    def bitmap_list_response(self, category_ids, ranges):
+        """Paginated games and facets worked out on the bitmap index
+
+        Only the games on the requested page are read from the database.
+        """
+        index = bitmap.ensure_loaded()
+        matches = index.match(category_ids, ranges)
+
+        self.paginator = self.get_paginator()
+        page_ids = self.paginator.paginate_queryset(bitmap.GameIds(matches), self.request, view=self)
+        fast = fast_serializer(GameSerializer, self.request)
+        if fast is not None:
+            # The ids come in ascending order
+            games = fast.rows(Game.objects.filter(pk__in=page_ids).order_by('id'))
+            data = fast.serialize(games, self.request)
+        else:
+            games = prune_queryset(Game.objects.for_display(), GameSerializer, self.request).in_bulk(page_ids)
+            data = GameSerializer(
+                [games[game_id] for game_id in page_ids if game_id in games],
+                many=True, context={'request': self.request}).data
+
+        response = self.paginator.get_paginated_response(data)
+        if self.wants_facets():
+            response.data['facets'] = index.facet_counts(matches)
+        return response
+
     def create(self, request):
         """Handle POST operations
 
@@ -21,8 +150,9 @@ class GameView(ViewSet):
             Response -- JSON serialized game instance
         """
 
-        # Uses the token passed in the `Authorization` header
-        user = User.objects.get(username=request.auth.user)
+        # Uses the token passed in the `Authorization` header,
+        # which was loaded along with its user
+        user = request.auth.user
 
         # Create a new Python instance of the Game class
         # and set its properties from what was sent in the
@@ -66,9 +196,15 @@ class GameView(ViewSet):
 
 
 
+    @conditional_response(GameCategory, Category, rows=rows_by_pk(Game), per_user=overlay.overlay_models)
+    @overlay.with_overlay
+    @cached_response(Game, GameCategory, Category, Rating, ignore_params=(overlay.OVERLAY_PARAM,))
     def retrieve(self, request, pk=None):
         """Handle GET requests for single game
 
+        `?overlay=1` adds the current user's rating of the game, whether
+        they reviewed it and whether they added it, see gamer_rater_server_api.overlay
+
         Returns:
             Response -- JSON serialized game instance
         """
@@ -80,7 +216,7 @@ class GameView(ViewSet):
             #   http://localhost:8000/games/2
             #
             # The `2` at the end of the route becomes `pk`
-            game = Game.objects.get(pk=pk)
+            game = prune_queryset(Game.objects.for_display(), GameSerializer, request).get(pk=pk)
             # if game.user == user:
             #     game.is_current_user = True
             # else:
@@ -142,40 +278,296 @@ class GameView(ViewSet):
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+    @conditional_response(Game, GameCategory, Category, Rating, per_user=overlay.overlay_models)
+    @overlay.with_overlay
+    @cached_response(Game, GameCategory, Category, Rating, ignore_params=(overlay.OVERLAY_PARAM,))
     def list(self, request):
         """Handle GET requests to games resource
 
+        `?overlay=1` adds what the current user did with each game on the
+        page, see gamer_rater_server_api.overlay
+
         Returns:
             Response -- JSON serialized list of games
         """
-        # Get all game records from the database
-        games = Game.objects.all()
+        # Narrow down by category and game attributes, games have to
+        # be in every category asked for
+        #    http://localhost:8000/games?category=3,4&number_of_player_min=6
+        try:
+            category_ids = self.category_filter()
+            ranges = self.numeric_ranges()
+            self.get_list_ordering()
+        except ValueError as ex:
+            return Response({'message': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Plain filtered listings are answered from the in-process bitmap
+        # index, and the database is only asked for the page of games
+        if (category_ids or ranges) and self.can_use_bitmaps():
+            return self.bitmap_list_response(category_ids, ranges)
+
+        # Get all game records from the database, with their
+        # categories loaded in a single batch
+        games = Game.objects.for_display()
 
         # Support searching games by paraM
         #    http://localhost:8000/games?q=param
         #
         # That URL will retrieve all tabletop games
-        
+        # whose title, description or designer match, best match first.
+        # Adding `fuzzy=1` forgives typos in the title or designer
+        #    http://localhost:8000/games?q=milton+bradly&fuzzy=1
         search_text = self.request.query_params.get('q', None)
         if search_text is not None:
-            games = Game.objects.filter(
-                    Q(title__contains=search_text) 
-                    # |
-                    # Q(description__contains=search_text) |
-                    # Q(designer__contains=search_text))
-            )
-
-        serializer = GameSerializer(
-            games, many=True, context={'request': request})
+            if self.request.query_params.get('fuzzy') == '1':
+                games = fuzzy.search_games(games, search_text)
+            else:
+                games = fulltext.search(games, search_text)
+
+        games = self.filter_games(games, category_ids, ranges)
+
+        # Only one page is serialized, see PaginatedListMixin. The facet
+        # counts cover every game that matched, not just this page.
+        response = self.paginated_response(games, GameSerializer)
+        if isinstance(response.data, dict) and self.wants_facets():
+            response.data['facets'] = games.facet_counts()
+        return response
+
+    @action(methods=['post'], detail=False)
+    def bulk(self, request):
+        """Handle POST requests with a list of games to create at once
+
+            http://localhost:8000/games/bulk
+
+        Every game is checked before any is written, then they are all
+        inserted in one transaction, GAME_BULK_BATCH_SIZE rows at a time.
+
+        Returns:
+            Response -- JSON list of the new game ids by position in the request,
+                        or the errors of the invalid games with a 400 status code
+        """
+        if not isinstance(request.data, list):
+            return Response({'message': 'Expected a list of games'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Look up every category the games mention in one query
+        mentioned = {
+            category_id
+            for item in request.data if isinstance(item, dict) and isinstance(item.get('categories'), list)
+            for category_id in item['categories'] if isinstance(category_id, int)
+        }
+        known_categories = set(Category.objects.filter(id__in=mentioned).values_list('id', flat=True))
+
+        games, category_ids, errors = [], [], []
+        for index, item in enumerate(request.data):
+            try:
+                game, ids = self.game_from_data(item, request.auth.user, known_categories)
+            except ValidationError as ex:
+                errors.append({'index': index, 'errors': ex.message_dict})
+                continue
+            games.append(game)
+            category_ids.append(ids)
+
+        if errors:
+            return Response({
+                'message': f'{len(errors)} of {len(request.data)} games are invalid, none were created',
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        batch_size = getattr(settings, 'GAME_BULK_BATCH_SIZE', 500)
+        Game.objects.bulk_insert(games, category_ids, batch_size)
+        return Response(
+            [{'index': index, 'id': game.id} for index, game in enumerate(games)],
+            status=status.HTTP_201_CREATED)
+
+    def game_from_data(self, data, user, known_categories):
+        """An unsaved Game and its category ids from one game of a bulk request
+
+        Raises:
+            ValidationError -- with the errors of each request key
+        """
+        if not isinstance(data, dict):
+            raise ValidationError({'game': ['Expected a game object']})
+
+        errors = {key: ['This field is required.'] for key in self.game_fields if key not in data}
+        categories = data.get('categories')
+        if not isinstance(categories, list) or not all(isinstance(value, int) for value in categories):
+            errors['categories'] = ['Expected a list of category ids']
+        elif not known_categories.issuperset(categories):
+            missing = sorted(set(categories) - known_categories)
+            errors['categories'] = [f'Unknown category ids {missing}']
+
+        game = Game(user=user, **{
+            field: data[key] for key, field in self.game_fields.items() if key in data
+        })
+        try:
+            # The user comes from the token, checking it would cost a query per game
+            game.full_clean(exclude=['user'] + [
+                field for key, field in self.game_fields.items() if key not in data])
+        except ValidationError as ex:
+            keys = {field: key for key, field in self.game_fields.items()}
+            for field, messages in ex.message_dict.items():
+                errors.setdefault(keys.get(field, field), []).extend(messages)
+
+        if errors:
+            raise ValidationError(errors)
+        return game, list(dict.fromkeys(categories))
+
+    @action(methods=['get'], detail=False)
+    @conditional_response(Game, GameCategory, Category, Rating)
+    def export(self, request):
+        """Handle GET requests to download the whole catalog
+
+            http://localhost:8000/games/export?output=csv
+
+        `output` is `ndjson`, the default, or `csv`. The body is streamed
+        while the games are read, a chunk at a time.
+
+        Returns:
+            StreamingHttpResponse -- every game with its categories and rating totals
+        """
+        output = request.query_params.get('output', 'ndjson')
+        try:
+            lines = export.export_lines(output)
+        except ValueError as ex:
+            return Response({'message': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(lines, content_type=export.CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="games.{output}"'
+        return response
+
+    @action(methods=['get'], detail=False)
+    @conditional_response(Game, GameCategory, Category)
+    @cached_response(Game, GameCategory, Category)
+    def top(self, request):
+        """Handle GET requests for the best rated games
+
+            http://localhost:8000/games/top?limit=10
+
+        Returns:
+            Response -- JSON list of games by Bayesian rating, best first
+        """
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = LeaderboardSerializer(
+            leaderboard.top_games(limit), many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(methods=['get'], detail=False)
+    @conditional_response(Game, GameCategory, Category, TrendingRun)
+    @cached_response(Game, GameCategory, Category, TrendingRun)
+    def trending(self, request):
+        """Handle GET requests for the games with the most activity lately
+
+            http://localhost:8000/games/trending?limit=10
+
+        Ranked by the time-decayed count of their new ratings and reviews,
+        which `manage.py update_trending` keeps up to date.
+
+        Returns:
+            Response -- JSON list of games with their `trending_score`, hottest first
+        """
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        games = trending.trending_games(limit)
+        serializer = GameSerializer([game for game, _ in games], many=True, context={'request': request})
+        data = serializer.data
+        for item, (_, score) in zip(data, games):
+            item['trending_score'] = score
+        return Response(data)
+
+    @action(methods=['get'], detail=True)
+    @conditional_response(Game, GameCategory, Category, SimilarGame, SimilarityRun)
+    @cached_response(Game, GameCategory, Category, SimilarGame, SimilarityRun)
+    def similar(self, request, pk=None):
+        """Handle GET requests for the games most often rated like this one
+
+            http://localhost:8000/games/2/similar?limit=5
+
+        The neighbors are worked out ahead of time by
+        `manage.py build_similar_games`, and read here with one lookup.
+
+        Returns:
+            Response -- JSON list of games with their `similarity`, most similar first
+        """
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            found = Game.objects.filter(pk=pk).exists()
+        except ValueError:
+            found = False
+        if not found:
+            return Response({'message': 'Game matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+
+        neighbors = list(SimilarGame.objects
+                         .filter(game_id=pk)
+                         .order_by('-score', 'similar_game')
+                         .values_list('similar_game_id', 'score')[:max(1, limit)])
+        games = Game.objects.for_display().in_bulk([game_id for game_id, _ in neighbors])
+        neighbors = [(games[game_id], score) for game_id, score in neighbors if game_id in games]
+
+        serializer = GameSerializer([game for game, _ in neighbors], many=True, context={'request': request})
+        data = serializer.data
+        for item, (_, score) in zip(data, neighbors):
+            item['similarity'] = score
+        return Response(data)
+
+    @action(methods=['get'], detail=True, url_path='rating-stats')
+    @conditional_response(rows=rows_by_pk(Game))
+    @cached_response(Game)
+    def rating_stats(self, request, pk=None):
+        """Handle GET requests for the distribution of a game's ratings
+
+            http://localhost:8000/games/2/rating-stats
+
+        Read off the game's RatingCount rows, one per rating value, which
+        every rating write keeps in step, so no ratings are scanned.
+
+        Returns:
+            Response -- JSON with the rating `count`, `mean`, `variance`
+                        and a `histogram` of the count of each rating value
+        """
+        try:
+            stats = Game.objects.filter(pk=pk).rating_stats()
+        except ValueError:
+            stats = {}
+        if not stats:
+            return Response({'message': 'Game matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+        game_id, data = stats.popitem()
+        return Response({'game': game_id, **data})
+
+    @action(methods=['get'], detail=False)
+    def suggest(self, request):
+        """Handle GET requests for title suggestions while typing
+
+            http://localhost:8000/games/suggest?prefix=mon&limit=5
+
+        Returns:
+            Response -- JSON list of the most rated matching games, id and title only
+        """
+        prefix = request.query_params.get('prefix', '')
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        suggestions = suggest_titles(prefix, limit)
+        return Response([{'id': game_id, 'title': title} for game_id, title in suggestions])
+
 # class UserSerializer(serializers.ModelSerializer):
 #     """JSON serializer for gamer's related Django user"""
 #     class Meta:
 #         model = User
 #         fields = ('id', )
 
-class GameSerializer(serializers.ModelSerializer):
+class GameSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for games
 
     Arguments:
@@ -187,4 +579,9 @@ class GameSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'description', 'number_of_player', 'designer', 'age_range', 'release_year', 'game_duration', 'categories', 'average_rating')
         # , 'user'
         depth = 1
- 
\ No newline at end of file
+ 
+
+class LeaderboardSerializer(GameSerializer):
+    """JSON serializer for games on a leaderboard, with the score they are ranked by"""
+    class Meta(GameSerializer.Meta):
+        fields = GameSerializer.Meta.fields + ('rating_count', 'bayesian_rating')
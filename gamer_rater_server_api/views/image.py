@@ -3,6 +3,9 @@ from django.core.exceptions import ValidationError
 from rest_framework import status
 from django.http import HttpResponseServerError
 from rest_framework.viewsets import ViewSet
+from gamer_rater_server_api.cache import conditional_response, rows_by_pk, rows_listed
+from gamer_rater_server_api.fieldsets import SparseFieldsMixin, eager_queryset, prune_queryset
+from gamer_rater_server_api.pagination import PaginatedListMixin
 from rest_framework.response import Response
 from rest_framework import serializers
 from gamer_rater_server_api.models import Review, Game, Image
@@ -12,7 +15,7 @@ import base64
 from django.core.files.base import ContentFile
 
 
-class ImageView(ViewSet):
+class ImageView(PaginatedListMixin, ViewSet):
     """Level up games"""
 
     def create(self, request):
@@ -69,6 +72,7 @@ class ImageView(ViewSet):
 
 
 
+    @conditional_response(User, rows=rows_by_pk(Image), related=('game',))
     def retrieve(self, request, pk=None):
         """Handle GET requests for single game
 
@@ -81,7 +85,8 @@ class ImageView(ViewSet):
             #   http://localhost:8000/games/2
             #
             # The `2` at the end of the route becomes `pk`
-            image = Image.objects.get(pk=pk)
+            images = eager_queryset(Image.objects.all(), ImageSerializer)
+            image = prune_queryset(images, ImageSerializer, request).get(pk=pk)
             serializer = ImageSerializer(image, context={'request': request})
             return Response(serializer.data)
         except Exception as ex:
@@ -139,12 +144,8 @@ class ImageView(ViewSet):
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def list(self, request):
-        """Handle GET requests to games resource
-
-        Returns:
-            Response -- JSON serialized list of games
-        """
+    def get_queryset(self):
+        """The images a list request asks for"""
         # Get all game records from the database
         images = Image.objects.all()
 
@@ -152,13 +153,40 @@ class ImageView(ViewSet):
         #    http://localhost:8000/games?type=1
         #
         # That URL will retrieve all tabletop games
-        game = self.request.query_params.get('game', None)
+        game = self.id_param('game')
         if game is not None:
             images = images.filter(game__id=game)
 
-        serializer = ImageSerializer(
-            images, many=True, context={'request': request})
-        return Response(serializer.data)
+        # One user's images, on the (user, game) index
+        #    http://localhost:8000/images?user=3
+        user = self.id_param('user')
+        if user is not None:
+            images = images.filter(user_id=user)
+        return images
+
+    def id_param(self, name):
+        """The id in `?<name>=`, or None when the filter is absent
+
+        Raises:
+            ValidationError -- (400) when the value is not an integer
+        """
+        value = self.request.query_params.get(name, None)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise serializers.ValidationError({name: ['A valid integer is required.']})
+
+    @conditional_response(User, rows=rows_listed, related=('game',))
+    def list(self, request):
+        """Handle GET requests to games resource
+
+        Returns:
+            Response -- JSON serialized list of games
+        """
+        # Only one page is serialized, see PaginatedListMixin
+        return self.paginated_response(eager_queryset(self.get_queryset(), ImageSerializer), ImageSerializer)
 
 class UserSerializer(serializers.ModelSerializer):
     """JSON serializer for gamer's related Django user"""
@@ -177,7 +205,7 @@ class GameSerializer(serializers.ModelSerializer):
         fields = ( 'id', 'title', )
         depth = 1
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for games
 
     Arguments:
@@ -1,10 +1,17 @@
 """View module for handling requests about park areas"""
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers
+from gamer_rater_server_api.models import Game, Rating
+from gamer_rater_server_api.views.game import GameSerializer
+try:
+    from gamer_rater_server_api.recommendations import current_recommender
+except ImportError:
+    current_recommender = None
 # from levelupapi.models import Event, Gamer, Game
 
 
@@ -15,7 +22,8 @@ class ProfileView(ViewSet):
         """Handle GET requests to profile resource
 
         Returns:
-            Response -- JSON representation of user info and events
+            Response -- JSON representation of user info and the games
+                        recommended to them, see recommended_games
         """
         user = request.auth.user
         # gamer = Gamer.objects.get(user=request.auth.user)
@@ -30,9 +38,37 @@ class ProfileView(ViewSet):
         profile = {}
         profile["user"] = user.data
         # profile["events"] = events.data
+        profile["recommended"] = recommended_games(request)
 
         return Response(profile)
 
+
+def recommended_games(request):
+    """Games the user has not rated yet with the highest predicted rating for them
+
+    Scored against the factors `manage.py build_recommendations` last
+    wrote, so nothing is recommended before it has run or without NumPy.
+
+    Returns:
+        list -- serialized games with their `predicted_rating`, best first
+    """
+    if current_recommender is None:
+        return []
+    recommender = current_recommender(str(settings.RECOMMENDATIONS_DIR))
+    if recommender is None:
+        return []
+
+    user_id = request.auth.user_id
+    rated = Rating.objects.filter(user_id=user_id).values_list('game_id', flat=True)
+    scored = recommender.recommend(user_id, exclude=rated, limit=settings.RECOMMENDED_GAMES)
+    games = Game.objects.for_display().in_bulk([game_id for game_id, _ in scored])
+    scored = [(games[game_id], score) for game_id, score in scored if game_id in games]
+
+    data = GameSerializer([game for game, _ in scored], many=True, context={'request': request}).data
+    for item, (_, score) in zip(data, scored):
+        item['predicted_rating'] = score
+    return data
+
 class UserSerializer(serializers.ModelSerializer):
     """JSON serializer for gamer's related Django user"""
     class Meta:
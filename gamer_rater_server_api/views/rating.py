@@ -1,67 +1,138 @@
 """View module for handling requests about games"""
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from rest_framework import status
 from django.http import HttpResponseServerError
+from rest_framework.decorators import action
 from rest_framework.viewsets import ViewSet
+from gamer_rater_server_api import ingest
+from gamer_rater_server_api.cache import conditional_response, rows_by_pk, rows_listed
+from gamer_rater_server_api.fieldsets import SparseFieldsMixin, eager_queryset, prune_queryset
+from gamer_rater_server_api.pagination import PaginatedListMixin
 from rest_framework.response import Response
 from rest_framework import serializers
 from gamer_rater_server_api.models import Rating, Game
+from gamer_rater_server_api.models.rating import MAX_RATING, MIN_RATING
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 
 
-class RatingView(ViewSet):
+class RatingView(PaginatedListMixin, ViewSet):
     """Level up games"""
 
     def create(self, request):
         """Handle POST operations
 
+        A user has one rating per game, so rating a game again replaces
+        the earlier rating rather than adding another. With
+        RATING_WRITE_BEHIND on the rating is queued and written shortly
+        after, see gamer_rater_server_api.ingest.
+
         Returns:
-            Response -- JSON serialized game instance
+            Response -- JSON serialized rating instance, with a 201 status
+                        code when it is new and 200 when it replaced one,
+                        or 202 when it was queued
         """
-
         # Uses the token passed in the `Authorization` header
-        # gamer = Gamer.objects.get(user=request.auth.user)
-        user = User.objects.get(username=request.auth.user)
-        # Create a new Python instance of the Game class
-        # and set its properties from what was sent in the
-        # body of the request from the client.
-        rating = Rating()
-        rating.rating = request.data["rating"]
-
-        rating.game = Game.objects.get(pk=request.data["gameId"])
-        rating.user = user
-        # game.description = request.data["description"]
-        # game.designer = request.data["designer"]
-        # game.number_of_player = request.data["numberOfPlayers"]
-        # game.release_year = request.data["releaseYear"]
-        # game.game_duration = request.data["gameDuration"]
-        # game.age_range = request.data["ageRange"]
-        # game.categories = request.data["categories"]                
-
-        # Use the Django ORM to get the record from the database
-        # whose `id` is what the client passed as the
-        # `gameTypeId` in the body of the request.
-        # game_type = GameType.objects.get(pk=request.data["gameTypeId"])
-        # game.game_type = game_type
-
-        # Try to save the new game to the database, then
-        # serialize the game instance as JSON, and send the
-        # JSON as a response to the client request
+        user_id = request.auth.user_id
         try:
-            rating.save()
-            #  game.categories.set(request.data["categories"])
-            #  game.categories.add(request.data["categories"])
-            serializer = RatingSerializer(rating, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        # If anything went wrong, catch the exception and
-        # send a response with a 400 status code to tell the
-        # client that something was wrong with its request data
+            game_id, value = self.rating_from_data(request.data)
         except ValidationError as ex:
-            return Response({"reason": ex.message}, status=status.HTTP_400_BAD_REQUEST)
-
-
+            return Response({"reason": ex.message_dict}, status=status.HTTP_400_BAD_REQUEST)
+        if not Game.objects.filter(pk=game_id).exists():
+            return Response({'message': 'Game matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+
+        if settings.RATING_WRITE_BEHIND:
+            if not ingest.rating_buffer().submit(game_id, user_id, value, settings.RATING_WRITE_BEHIND_TIMEOUT):
+                response = Response({'message': 'Too many ratings are waiting to be saved, try again shortly'},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                response['Retry-After'] = '1'
+                return response
+            return Response({'gameId': game_id, 'rating': value}, status=status.HTTP_202_ACCEPTED)
+
+        # Write the rating and fold it into the game's stored totals
+        # together, so the average can never drift
+        previous = Rating.objects.upsert(user_id, {game_id: value})
+        rating = Rating.objects.select_related('user', 'game').get(game_id=game_id, user_id=user_id)
+        serializer = RatingSerializer(rating, context={'request': request})
+        created = game_id not in previous or previous[game_id] is None
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=False)
+    def batch(self, request):
+        """Handle POST requests rating many games at once
+
+            http://localhost:8000/ratings/batch
+            [{"gameId": 1, "rating": 8}, {"gameId": 2, "rating": 5}]
+
+        Every rating is checked before any is written, then they are all
+        upserted in one transaction. A game listed twice gets the later rating.
 
+        Returns:
+            Response -- JSON list of the ratings by game, or the errors of
+                        the invalid ratings with a 400 status code
+        """
+        if not isinstance(request.data, list):
+            return Response({'message': 'Expected a list of ratings'}, status=status.HTTP_400_BAD_REQUEST)
+
+        parsed, errors = [], []
+        for index, item in enumerate(request.data):
+            try:
+                parsed.append((index,) + self.rating_from_data(item))
+            except ValidationError as ex:
+                errors.append({'index': index, 'errors': ex.message_dict})
+
+        # Look up every game the ratings mention in one query
+        mentioned = {game_id for _, game_id, _ in parsed}
+        known_games = set(Game.objects.filter(id__in=mentioned).values_list('id', flat=True))
+
+        ratings = {}
+        for index, game_id, value in parsed:
+            if game_id not in known_games:
+                errors.append({'index': index, 'errors': {'gameId': [f'Unknown game id {game_id}']}})
+            ratings[game_id] = value
+        errors.sort(key=lambda error: error['index'])
+
+        if errors:
+            return Response({
+                'message': f'{len(errors)} of {len(request.data)} ratings are invalid, none were saved',
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        previous = Rating.objects.upsert(request.auth.user_id, ratings)
+        saved = Rating.objects.filter(user_id=request.auth.user_id, game_id__in=list(ratings))
+        ids = dict(saved.values_list('game_id', 'id'))
+        return Response([
+            {'gameId': game_id, 'id': ids[game_id], 'rating': value, 'previous': previous[game_id]}
+            for game_id, value in ratings.items()
+        ])
+
+    def rating_from_data(self, data):
+        """The game id and rating value of one rating of a request
+
+        Raises:
+            ValidationError -- with the errors of each request key
+        """
+        if not isinstance(data, dict):
+            raise ValidationError({'rating': ['Expected a rating object']})
+        errors, values = {}, {}
+        for key in ('gameId', 'rating'):
+            try:
+                if isinstance(data[key], bool):
+                    # int(True) would pass as 1
+                    raise TypeError
+                values[key] = int(data[key])
+            except KeyError:
+                errors[key] = ['This field is required.']
+            except (TypeError, ValueError):
+                errors[key] = ['A valid integer is required.']
+        if 'rating' in values and not MIN_RATING <= values['rating'] <= MAX_RATING:
+            errors['rating'] = [f'Ensure this value is between {MIN_RATING} and {MAX_RATING}.']
+        if errors:
+            raise ValidationError(errors)
+        return values['gameId'], values['rating']
+
+    @conditional_response(User, rows=rows_by_pk(Rating), related=('game',))
     def retrieve(self, request, pk=None):
         """Handle GET requests for single game
 
@@ -74,7 +145,8 @@ class RatingView(ViewSet):
             #   http://localhost:8000/games/2
             #
             # The `2` at the end of the route becomes `pk`
-            rating = Rating.objects.get(pk=pk)
+            ratings = eager_queryset(Rating.objects.all(), RatingSerializer)
+            rating = prune_queryset(ratings, RatingSerializer, request).get(pk=pk)
             serializer = RatingSerializer(rating, context={'request': request})
             return Response(serializer.data)
         except Exception as ex:
@@ -88,14 +160,26 @@ class RatingView(ViewSet):
         """
         # gamer = Gamer.objects.get(user=request.auth.user)
 
+        try:
+            game_id, value = self.rating_from_data(request.data)
+        except ValidationError as ex:
+            return Response({"reason": ex.message_dict}, status=status.HTTP_400_BAD_REQUEST)
+
         # Do mostly the same thing as POST, but instead of
         # creating a new instance of Game, get the game record
         # from the database whose primary key is `pk`
-        rating = Rating.objects.get(pk=pk)
-        rating.rating = request.data["rating"]
+        try:
+            rating = Rating.objects.get(pk=pk)
+        except (Rating.DoesNotExist, ValueError):
+            return Response({'message': 'Rating matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+        old_game_id = rating.game_id
+        old_rating = rating.rating
+        rating.rating = value
 
-        rating.game = Game.objects.get(pk=request.data["gameId"])
-        rating.user = request.auth.user
+        try:
+            rating.game = Game.objects.get(pk=game_id)
+        except Game.DoesNotExist:
+            return Response({'message': 'Game matching query does not exist.'}, status=status.HTTP_404_NOT_FOUND)
         # game = Game.objects.get(pk=pk)
         # game.title = request.data["title"]
         # game.description = request.data["description"]
@@ -108,12 +192,25 @@ class RatingView(ViewSet):
 
         # game_type = GameType.objects.get(pk=request.data["gameTypeId"])
         # game.game_type = game_type
-        rating.save()
+        try:
+            with transaction.atomic():
+                self.save_rating_change(rating, old_game_id, old_rating)
+        except IntegrityError:
+            return Response({'message': 'You have already rated that game'}, status=status.HTTP_400_BAD_REQUEST)
 
         # 204 status code means everything worked but the
         # server is not sending back any data in the response
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    def save_rating_change(self, rating, old_game_id, old_rating):
+        """Save an edited rating and move the totals of the games it left and joined"""
+        rating.save()
+        if old_game_id == rating.game_id:
+            Game.objects.filter(pk=rating.game_id).apply_rating_change(old=old_rating, new=rating.rating)
+        else:
+            Game.objects.filter(pk=old_game_id).apply_rating_change(old=old_rating)
+            Game.objects.filter(pk=rating.game_id).apply_rating_change(new=rating.rating)
+
     def destroy(self, request, pk=None):
         """Handle DELETE requests for a single game
 
@@ -122,22 +219,20 @@ class RatingView(ViewSet):
         """
         try:
             rating = Rating.objects.get(pk=pk)
-            rating.delete()
+            with transaction.atomic():
+                rating.delete()
+                Game.objects.filter(pk=rating.game_id).apply_rating_change(old=rating.rating)
 
             return Response({}, status=status.HTTP_204_NO_CONTENT)
 
-        except rating.DoesNotExist as ex:
+        except Rating.DoesNotExist as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
 
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def list(self, request):
-        """Handle GET requests to games resource
-
-        Returns:
-            Response -- JSON serialized list of games
-        """
+    def get_queryset(self):
+        """The ratings a list request asks for"""
         # Get all game records from the database
         ratings = Rating.objects.all()
 
@@ -145,13 +240,40 @@ class RatingView(ViewSet):
         #    http://localhost:8000/games?type=1
         #
         # That URL will retrieve all tabletop games
-        game = self.request.query_params.get('game', None)
+        game = self.id_param('game')
         if game is not None:
             ratings = ratings.filter(game__id=game)
 
-        serializer = RatingSerializer(
-            ratings, many=True, context={'request': request})
-        return Response(serializer.data)
+        # One user's ratings, on the (user, game) index
+        #    http://localhost:8000/ratings?user=3
+        user = self.id_param('user')
+        if user is not None:
+            ratings = ratings.filter(user_id=user)
+        return ratings
+
+    def id_param(self, name):
+        """The id in `?<name>=`, or None when the filter is absent
+
+        Raises:
+            ValidationError -- (400) when the value is not an integer
+        """
+        value = self.request.query_params.get(name, None)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise serializers.ValidationError({name: ['A valid integer is required.']})
+
+    @conditional_response(User, rows=rows_listed, related=('game',))
+    def list(self, request):
+        """Handle GET requests to games resource
+
+        Returns:
+            Response -- JSON serialized list of games
+        """
+        # Only one page is serialized, see PaginatedListMixin
+        return self.paginated_response(eager_queryset(self.get_queryset(), RatingSerializer), RatingSerializer)
 
 class UserSerializer(serializers.ModelSerializer):
     """JSON serializer for gamer's related Django user"""
@@ -170,7 +292,7 @@ class GameSerializer(serializers.ModelSerializer):
         fields = ( 'title', )
         depth = 1
 
-class RatingSerializer(serializers.ModelSerializer):
+class RatingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for games
 
     Arguments:
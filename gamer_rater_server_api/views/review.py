@@ -3,13 +3,16 @@ from django.core.exceptions import ValidationError
 from rest_framework import status
 from django.http import HttpResponseServerError
 from rest_framework.viewsets import ViewSet
+from gamer_rater_server_api.cache import conditional_response, rows_by_pk, rows_listed
+from gamer_rater_server_api.fieldsets import SparseFieldsMixin, eager_queryset, prune_queryset
+from gamer_rater_server_api.pagination import PaginatedListMixin
 from rest_framework.response import Response
 from rest_framework import serializers
 from gamer_rater_server_api.models import Review, Game
 from django.contrib.auth.models import User
 
 
-class ReviewView(ViewSet):
+class ReviewView(PaginatedListMixin, ViewSet):
     """Level up games"""
 
     def create(self, request):
@@ -62,6 +65,7 @@ class ReviewView(ViewSet):
 
 
 
+    @conditional_response(User, rows=rows_by_pk(Review), related=('game',))
     def retrieve(self, request, pk=None):
         """Handle GET requests for single game
 
@@ -74,7 +78,8 @@ class ReviewView(ViewSet):
             #   http://localhost:8000/games/2
             #
             # The `2` at the end of the route becomes `pk`
-            review = Review.objects.get(pk=pk)
+            reviews = eager_queryset(Review.objects.all(), ReviewSerializer)
+            review = prune_queryset(reviews, ReviewSerializer, request).get(pk=pk)
             serializer = ReviewSerializer(review, context={'request': request})
             return Response(serializer.data)
         except Exception as ex:
@@ -132,12 +137,8 @@ class ReviewView(ViewSet):
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def list(self, request):
-        """Handle GET requests to games resource
-
-        Returns:
-            Response -- JSON serialized list of games
-        """
+    def get_queryset(self):
+        """The reviews a list request asks for"""
         # Get all game records from the database
         reviews = Review.objects.all()
 
@@ -145,13 +146,40 @@ class ReviewView(ViewSet):
         #    http://localhost:8000/games?type=1
         #
         # That URL will retrieve all tabletop games
-        game = self.request.query_params.get('game', None)
+        game = self.id_param('game')
         if game is not None:
             reviews = reviews.filter(game__id=game)
 
-        serializer = ReviewSerializer(
-            reviews, many=True, context={'request': request})
-        return Response(serializer.data)
+        # One user's reviews, on the (user, game) index
+        #    http://localhost:8000/reviews?user=3
+        user = self.id_param('user')
+        if user is not None:
+            reviews = reviews.filter(user_id=user)
+        return reviews
+
+    def id_param(self, name):
+        """The id in `?<name>=`, or None when the filter is absent
+
+        Raises:
+            ValidationError -- (400) when the value is not an integer
+        """
+        value = self.request.query_params.get(name, None)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise serializers.ValidationError({name: ['A valid integer is required.']})
+
+    @conditional_response(User, rows=rows_listed, related=('game',))
+    def list(self, request):
+        """Handle GET requests to games resource
+
+        Returns:
+            Response -- JSON serialized list of games
+        """
+        # Only one page is serialized, see PaginatedListMixin
+        return self.paginated_response(eager_queryset(self.get_queryset(), ReviewSerializer), ReviewSerializer)
 
 class UserSerializer(serializers.ModelSerializer):
     """JSON serializer for gamer's related Django user"""
@@ -170,7 +198,7 @@ class GameSerializer(serializers.ModelSerializer):
         fields = ( 'title', )
         depth = 1
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for games
 
     Arguments:
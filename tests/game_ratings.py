@@ -1,7 +1,21 @@
 import json
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from gamer_rater_server_api.models import Game, Rating, Category
+from django.contrib.auth.models import User
+from gamer_rater_server_api import fast_serializers, ingest
+from gamer_rater_server_api.models import Game, Rating, RatingCount, Review, Category, SimilarGame, SimilarityRun, TrendingRecount, TrendingRun
+from gamer_rater_server_api.models.rating import RatingQuerySet
 
 
 class RatingTests(APITestCase):
@@ -44,6 +58,16 @@ class RatingTests(APITestCase):
         category.save()
 
 
+    def register(self, username):
+        """
+        Register another account and return its token.
+        """
+        response = self.client.post("/register", {
+            "username": username, "password": "Admin8*", "email": f"{username}@example.com",
+            "first_name": username, "last_name": "Tester",
+        }, format='json')
+        return json.loads(response.content)["token"]
+
     def test_create_rating(self):
         """
         Ensure we can create a new game rating.
@@ -108,3 +132,592 @@ class RatingTests(APITestCase):
         # Assert that the properties are correct
         self.assertEqual(json_response["game"], {'title': 'Clue'})
         self.assertEqual(json_response["rating"], 1)
+
+        # Bad input is answered without touching the rating
+        for data in ({"gameId": 1}, {"gameId": 1, "rating": "x"}, {"rating": 5}):
+            response = self.client.put(f"/ratings/{rating.id}", data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(f"/ratings/{rating.id}", {"gameId": 99, "rating": 5}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.put("/ratings/999", {"gameId": 1, "rating": 5}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Rating.objects.get(pk=rating.id).rating, 1)
+
+    def test_rating_totals_follow_rating_writes(self):
+        """
+        Ensure the stored game rating totals follow creates, changes and deletes.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.register("joe"))
+        self.client.post("/ratings", {"gameId": 1, "rating": 4}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.post("/ratings", {"gameId": 1, "rating": 6}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        first_id = json.loads(response.content)["id"]
+
+        # Rating the game again replaces the rating
+        response = self.client.post("/ratings", {"gameId": 1, "rating": 8}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["id"], first_id)
+
+        game = Game.objects.get(pk=1)
+        self.assertEqual(game.rating_count, 2)
+        self.assertEqual(game.rating_sum, 12)
+        self.assertEqual(game.average_rating, 6)
+
+        self.client.put(f"/ratings/{first_id}", {"gameId": 1, "rating": 2}, format='json')
+        game = Game.objects.get(pk=1)
+        self.assertEqual(game.rating_count, 2)
+        self.assertEqual(game.average_rating, 3)
+
+        self.client.delete(f"/ratings/{first_id}")
+        game = Game.objects.get(pk=1)
+        self.assertEqual(game.rating_count, 1)
+        self.assertEqual(game.average_rating, 4)
+
+        # The incremental totals agree with a full recount
+        Game.objects.rebuild_rating_totals()
+        self.assertEqual(Game.objects.get(pk=1).average_rating, 4)
+
+    def test_list_ratings_pages(self):
+        """
+        Ensure rating lists are paginated by offset and by cursor.
+        """
+        for index in range(3):
+            rating = Rating()
+            rating.game_id = 1
+            rating.user = User.objects.create(username=f"rater{index}")
+            rating.rating = index + 1
+            rating.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get("/ratings?game=1&limit=2")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["count"], 3)
+        self.assertEqual([r["rating"] for r in json_response["results"]], [1, 2])
+
+        response = self.client.get("/ratings?game=1&limit=2&cursor=")
+        json_response = json.loads(response.content)
+        self.assertNotIn("count", json_response)
+        self.assertEqual([r["rating"] for r in json_response["results"]], [1, 2])
+
+        response = self.client.get(json_response["next"])
+        json_response = json.loads(response.content)
+        self.assertEqual([r["rating"] for r in json_response["results"]], [3])
+        self.assertIsNone(json_response["next"])
+
+    def test_list_ratings_sparse_fields(self):
+        """
+        Ensure ?fields= leaves out the nested user and game along with their lookups.
+        """
+        for index in range(3):
+            rating = Rating()
+            rating.game_id = 1
+            rating.user = User.objects.create(username=f"rater{index}")
+            rating.rating = index + 1
+            rating.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/ratings", {"game": 1, "fields": "id,rating"})
+        json_response = json.loads(response.content)
+        self.assertEqual([sorted(r) for r in json_response["results"]], [["id", "rating"]] * 3)
+        self.assertFalse(any("auth_user" in query["sql"] for query in queries.captured_queries
+                             if "authtoken" not in query["sql"] and "tableversion" not in query["sql"]))
+
+        # Unknown names are dropped before the fast serializers are looked
+        # up, and naming only unknown fields gets them all
+        for fast in (True, False):
+            with self.settings(FAST_READ_SERIALIZERS=fast):
+                compiled = len(fast_serializers.compiled)
+                for junk in ("nope", "nada", "zilch"):
+                    response = self.client.get("/ratings", {"game": 1, "fields": f"id,rating,{junk}"})
+                    self.assertEqual([sorted(r) for r in json.loads(response.content)["results"]], [["id", "rating"]] * 3)
+                response = self.client.get("/ratings", {"game": 1, "fields": "nope"})
+                self.assertEqual([sorted(r) for r in json.loads(response.content)["results"]],
+                                 [["game", "id", "rating", "user"]] * 3)
+                self.assertLessEqual(len(fast_serializers.compiled), compiled + 2)
+
+    def test_list_ratings_query_count_is_constant(self):
+        """
+        Ensure listing ratings joins their users and games in, and ?user= lists one user's ratings.
+        """
+        raters = []
+
+        def seed_ratings(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(count):
+                    raters.append(User.objects.create(username=f"rater{len(raters)}"))
+                    Rating.objects.create(game_id=1, user=raters[-1], rating=5)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for fast in (True, False):
+            with self.settings(FAST_READ_SERIALIZERS=fast):
+                seed_ratings(2)
+                with CaptureQueriesContext(connection) as few_ratings:
+                    self.client.get("/ratings")
+                seed_ratings(6)
+                with CaptureQueriesContext(connection) as many_ratings:
+                    response = self.client.get("/ratings")
+                self.assertEqual(len(few_ratings), len(many_ratings))
+                json_response = json.loads(response.content)
+                self.assertEqual(json_response["results"][0]["user"]["username"], "rater0")
+                self.assertEqual(json_response["results"][0]["game"], {"title": "Clue"})
+
+                response = self.client.get("/ratings", {"user": raters[3].id})
+                self.assertEqual([r["user"]["username"] for r in json.loads(response.content)["results"]], ["rater3"])
+
+        for param in ("user", "game"):
+            response = self.client.get("/ratings", {param: "abc"})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(param, json.loads(response.content))
+
+        rating = Rating.objects.get(user=raters[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/ratings/{rating.id}")
+        self.assertEqual(json.loads(response.content)["user"]["username"], "rater0")
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if '"gamer_rater_server_api_rating"' in query["sql"] and "COUNT" not in query["sql"]]), 1)
+
+    def test_list_ratings_not_modified(self):
+        """
+        Ensure an unchanged rating list is answered with 304 until a rating of that game changes.
+        """
+        other_game = Game()
+        other_game.release_year = 1935
+        other_game.game_duration = 90
+        other_game.description = 'some generic description'
+        other_game.age_range = 8
+        other_game.title = "Monopoly"
+        other_game.designer = "Parker Brothers"
+        other_game.number_of_player = 4
+        other_game.user_id = 1
+        other_game.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.post("/ratings", {"gameId": 1, "rating": 8}, format='json')
+        response = self.client.get("/ratings?game=1")
+        etag = response["ETag"]
+
+        response = self.client.get("/ratings?game=1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        # Ratings of another game leave this list alone
+        self.client.post("/ratings", {"gameId": other_game.id, "rating": 3}, format='json')
+        response = self.client.get("/ratings?game=1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post("/ratings", {"gameId": 1, "rating": 4}, format='json')
+        response = self.client.get("/ratings?game=1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual([r["rating"] for r in json.loads(response.content)["results"]], [4])
+
+    def test_list_all_ratings_not_modified_without_reading_them(self):
+        """
+        Ensure the ETag of the unfiltered rating list comes from table versions rather than a scan of every rating.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/ratings", {"gameId": 1, "rating": 8}, format='json')
+        etag = self.client.get("/ratings")["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/ratings", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql'] or 'MAX(' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/ratings", {"gameId": 1, "rating": 4}, format='json')
+        response = self.client.get("/ratings", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_rating_writes_bump_versions_once_per_commit(self):
+        """
+        Ensure a transaction writing many ratings bumps each cached table once, after it commits.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            raters = [User.objects.create(username=f"rater{index}") for index in range(3)]
+            Rating.objects.create(game_id=1, user=raters[0], rating=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for rater in raters[1:]:
+                        Rating.objects.create(game_id=1, user=rater, rating=5)
+                    Rating.objects.filter(user=raters[0]).delete()
+                    self.assertFalse([query for query in queries.captured_queries if "tableversion" in query["sql"]])
+        self.assertEqual(len([query for query in queries.captured_queries if "tableversion" in query["sql"]]), 1)
+
+    def test_leaderboards_follow_rating_writes(self):
+        """
+        Ensure the leaderboards rank by Bayesian rating and move with rating writes.
+        """
+        other_game = Game()
+        other_game.release_year = 1934
+        other_game.game_duration = 30
+        other_game.description = 'some generic description'
+        other_game.age_range = 6
+        other_game.title = "Sorry"
+        other_game.designer = "Parker Brothers"
+        other_game.number_of_player = 4
+        other_game.user_id = 1
+        other_game.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        rating_ids = []
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/ratings", {"gameId": other_game.id, "rating": 10}, format='json')
+            for index in range(3):
+                rater = User.objects.create(username=f"rater{index}")
+                rating = Rating.objects.create(game_id=1, user=rater, rating=5)
+                rating_ids.append(rating.id)
+            Game.objects.rebuild_rating_totals()
+
+        # A single 10 loses to three 5s only while they stay near the prior
+        response = self.client.get("/games/top")
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Sorry", "Clue"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for rating_id in rating_ids:
+                self.client.put(f"/ratings/{rating_id}", {"gameId": 1, "rating": 8}, format='json')
+        response = self.client.get("/games/top")
+        json_response = json.loads(response.content)
+        self.assertEqual([g["title"] for g in json_response], ["Clue", "Sorry"])
+        self.assertAlmostEqual(json_response[0]["bayesian_rating"], (10 * 5.5 + 24) / 13)
+
+        # Adding a rated game to a category brings its score along
+        other_game.categories.add(1)
+        response = self.client.get("/categories/1/top", {"limit": 1})
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Clue"])
+
+        self.client.delete(f"/ratings/{rating_ids[0]}")
+        self.client.delete(f"/ratings/{rating_ids[1]}")
+        response = self.client.get("/categories/1/top")
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Sorry", "Clue"])
+
+        response = self.client.get("/categories/99/top")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_similar_games(self):
+        """
+        Ensure build_similar_games ranks co-rated games and only redoes changed ones afterwards.
+        """
+        games = [Game.objects.get(pk=1)]
+        for title in ("Sorry", "Monopoly", "Risk"):
+            games.append(Game.objects.create(
+                title=title, description='some generic description', designer="Parker Brothers",
+                release_year=1950, number_of_player=4, game_duration=60, age_range=8, user_id=1))
+        clue, sorry, monopoly, risk = games
+        raters = [User.objects.create(username=f"rater{index}") for index in range(3)]
+        for rater, ratings in zip(raters, ([8, 8, 2, 0], [9, 9, 0, 0], [0, 0, 5, 5])):
+            for game, rating in zip(games, ratings):
+                if rating:
+                    Rating.objects.create(game=game, user=rater, rating=rating)
+        Game.objects.rebuild_rating_totals()
+        call_command("build_similar_games", stdout=StringIO())
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get(f"/games/{clue.id}/similar")
+        json_response = json.loads(response.content)
+        self.assertEqual([g["title"] for g in json_response], ["Sorry", "Monopoly"])
+        self.assertAlmostEqual(json_response[0]["similarity"], 1, places=5)
+
+        # Risk now shares a rater with Clue, and only the games it touches are redone
+        Rating.objects.create(game=risk, user=raters[0], rating=9)
+        Game.objects.filter(pk=risk.id).apply_rating_change(new=9)
+        call_command("build_similar_games", stdout=StringIO())
+        self.assertEqual(SimilarityRun.objects.order_by("-started_at").first().games, 4)
+        incremental = sorted(SimilarGame.objects.values_list("game", "similar_game", "score"))
+
+        call_command("build_similar_games", full=True, stdout=StringIO())
+        full = sorted(SimilarGame.objects.values_list("game", "similar_game", "score"))
+        self.assertEqual([row[:2] for row in incremental], [row[:2] for row in full])
+
+        # A rebuild is seen by clients holding the old list, even for
+        # ratings written without this process's signals
+        etag = self.client.get(f"/games/{clue.id}/similar")["ETag"]
+        Rating.objects.filter(game=monopoly, user=raters[0]).update(rating=9)
+        Game.objects.filter(pk=monopoly.id).update(updated_at=timezone.now())
+        response = self.client.get(f"/games/{clue.id}/similar", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        call_command("build_similar_games", stdout=StringIO())
+        response = self.client.get(f"/games/{clue.id}/similar", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        response = self.client.get(f"/games/{clue.id}/similar", {"limit": 1})
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Sorry"])
+        response = self.client.get("/games/99/similar")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_profile_recommendations(self):
+        """
+        Ensure the profile recommends unrated games once build_recommendations has run.
+        """
+        games = [Game.objects.get(pk=1)]
+        for title in ("Sorry", "Monopoly", "Risk"):
+            games.append(Game.objects.create(
+                title=title, description='some generic description', designer="Parker Brothers",
+                release_year=1950, number_of_player=4, game_duration=60, age_range=8, user_id=1))
+        clue, sorry, monopoly, risk = games
+        raters = [User.objects.create(username=f"rater{index}") for index in range(4)]
+        for rater in raters:
+            for game, rating in zip(games, (9, 8, 2, 3)):
+                Rating.objects.create(game=game, user=rater, rating=rating)
+        Rating.objects.create(game=clue, user_id=1, rating=10)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with tempfile.TemporaryDirectory() as directory, override_settings(RECOMMENDATIONS_DIR=directory):
+            response = self.client.get("/profile")
+            self.assertEqual(json.loads(response.content)["recommended"], [])
+
+            call_command("build_recommendations", stdout=StringIO())
+            response = self.client.get("/profile")
+            recommended = json.loads(response.content)["recommended"]
+            self.assertEqual([g["title"] for g in recommended], ["Sorry", "Risk", "Monopoly"])
+            self.assertGreater(recommended[0]["predicted_rating"], recommended[-1]["predicted_rating"])
+
+    def test_batch_ratings(self):
+        """
+        Ensure /ratings/batch upserts many ratings at once and keeps the totals in step.
+        """
+        sorry = Game.objects.create(
+            title="Sorry", description='some generic description', designer="Parker Brothers",
+            release_year=1950, number_of_player=4, game_duration=60, age_range=8, user_id=1)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.post("/ratings", {"gameId": 1, "rating": 3}, format='json')
+        response = self.client.post("/ratings/batch", [
+            {"gameId": 1, "rating": 9}, {"gameId": sorry.id, "rating": 2}, {"gameId": sorry.id, "rating": 5},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(r["gameId"], r["rating"], r["previous"]) for r in json.loads(response.content)],
+                         [(1, 9, 3), (sorry.id, 5, None)])
+        self.assertEqual(Rating.objects.count(), 2)
+        self.assertEqual(Game.objects.get(pk=1).average_rating, 9)
+        self.assertEqual(Game.objects.get(pk=sorry.id).average_rating, 5)
+
+        # Nothing is written when any rating is invalid
+        response = self.client.post("/ratings/batch", [
+            {"gameId": 1, "rating": 1}, {"gameId": 99, "rating": 4}, {"rating": "x"},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = json.loads(response.content)["errors"]
+        self.assertEqual([(e["index"], sorted(e["errors"])) for e in errors], [(1, ["gameId"]), (2, ["gameId", "rating"])])
+        self.assertEqual(Game.objects.get(pk=1).average_rating, 9)
+
+        # Ids given as strings are looked up like any other, booleans are no ids
+        response = self.client.post("/ratings/batch", [{"gameId": str(sorry.id), "rating": "5"}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(r["gameId"], r["previous"]) for r in json.loads(response.content)], [(sorry.id, 5)])
+        response = self.client.post("/ratings/batch", [{"gameId": True, "rating": 4}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content)["errors"][0]["errors"], {"gameId": ["A valid integer is required."]})
+        response = self.client.post("/ratings", {"gameId": 1, "rating": False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Ratings outside 1 to 10 are refused wherever they come in
+        for value in (-5, 0, 11, 10 ** 12):
+            response = self.client.post("/ratings", {"gameId": 1, "rating": value}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post("/ratings/batch", [{"gameId": 1, "rating": 11}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(RatingCount.objects.values_list("rating", flat=True)) - set(range(1, 11)), set())
+        self.assertEqual(Game.objects.get(pk=1).average_rating, 9)
+
+        # The incremental totals agree with a full recount
+        Game.objects.rebuild_rating_totals()
+        self.assertEqual(Game.objects.get(pk=sorry.id).average_rating, 5)
+
+    def test_upsert_counts_a_raced_first_rating_once(self):
+        """
+        Ensure a first rating that another request inserts while this one runs is counted once.
+        """
+        user_id = User.objects.get(username="steve").id
+        insert_new_ratings = RatingQuerySet.insert_new_ratings
+        raced = []
+
+        def racing_insert(queryset, ratings):
+            if not raced:
+                # The other request commits the same pair just before this insert
+                raced.append(True)
+                Rating.objects.upsert_pairs({(1, user_id): 4})
+            return insert_new_ratings(queryset, ratings)
+
+        with mock.patch.object(RatingQuerySet, "insert_new_ratings", racing_insert):
+            previous = Rating.objects.upsert_pairs({(1, user_id): 8})
+        self.assertEqual(previous, {(1, user_id): 4})
+        game = Game.objects.get(pk=1)
+        self.assertEqual((game.rating_count, game.average_rating), (1, 8))
+
+    def test_rating_stats(self):
+        """
+        Ensure /games/{id}/rating-stats follows rating writes without reading the ratings.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.register("joe"))
+        self.client.post("/ratings", {"gameId": 1, "rating": 4}, format='json')
+        self.client.post("/ratings/batch", [{"gameId": 1, "rating": 9}], format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.post("/ratings", {"gameId": 1, "rating": 6}, format='json')
+        rating_id = json.loads(response.content)["id"]
+        self.client.put(f"/ratings/{rating_id}", {"gameId": 1, "rating": 9}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(2):
+                Rating.objects.create(game_id=1, user=User.objects.create(username=f"rater{index}"), rating=3)
+                Game.objects.filter(pk=1).apply_rating_change(new=3)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/games/1/rating-stats")
+        self.assertFalse(any('"gamer_rater_server_api_rating"' in query["sql"] for query in queries.captured_queries))
+        stats = json.loads(response.content)
+        values = [9, 9, 3, 3]
+        self.assertEqual(stats["histogram"], [{"rating": 3, "count": 2}, {"rating": 9, "count": 2}])
+        self.assertEqual(stats["count"], 4)
+        self.assertAlmostEqual(stats["mean"], statistics.mean(values))
+        self.assertAlmostEqual(stats["variance"], statistics.pvariance(values))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/ratings/{rating_id}")
+        stats = json.loads(self.client.get("/games/1/rating-stats").content)
+        self.assertEqual(stats["histogram"], [{"rating": 3, "count": 2}, {"rating": 9, "count": 1}])
+        self.assertAlmostEqual(stats["variance"], statistics.pvariance([9, 3, 3]))
+
+        # The incremental counts agree with a full recount
+        Game.objects.rebuild_rating_totals()
+        self.assertEqual(json.loads(self.client.get("/games/1/rating-stats").content), stats)
+        response = self.client.get("/games/99/rating-stats")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_write_behind_ratings(self):
+        """
+        Ensure queued ratings are coalesced per user and game, refused when the buffer is full, and written on flush.
+        """
+        buffer = ingest.RatingBuffer(max_pending=2, background=False)
+        joe = self.register("joe")
+        with override_settings(RATING_WRITE_BEHIND=True, RATING_WRITE_BEHIND_TIMEOUT=0), \
+                mock.patch.object(ingest, "buffer", buffer):
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+            response = self.client.post("/ratings", {"gameId": 1, "rating": 6}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.client.post("/ratings", {"gameId": 1, "rating": 8}, format='json')
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + joe)
+            self.client.post("/ratings", {"gameId": 1, "rating": 4}, format='json')
+            self.assertFalse(Rating.objects.exists())
+
+            other_game = Game.objects.create(
+                title="Sorry", description='some generic description', designer="Parker Brothers",
+                release_year=1950, number_of_player=4, game_duration=60, age_range=8, user_id=1)
+            response = self.client.post("/ratings", {"gameId": other_game.id, "rating": 4}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            self.assertEqual(buffer.flush(), 2)
+            response = self.client.post("/ratings", {"gameId": other_game.id, "rating": 4}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            buffer.close()
+
+        self.assertEqual(sorted(Rating.objects.values_list("game_id", "rating")), [(1, 4), (1, 8), (other_game.id, 4)])
+        game = Game.objects.get(pk=1)
+        self.assertEqual((game.rating_count, game.average_rating), (2, 6))
+
+    def test_write_behind_survives_a_failed_batch(self):
+        """
+        Ensure the writer thread logs a batch that raises and goes on writing the next ones.
+        """
+        buffer = ingest.RatingBuffer(batch_size=1, interval=0.01)
+        with mock.patch.object(Rating.objects, "upsert_pairs", side_effect=[RuntimeError("boom"), None]) as upsert, \
+                self.assertLogs(ingest.logger, "ERROR") as logs:
+            self.assertTrue(buffer.submit(1, 1, 5))
+            deadline = time.monotonic() + 5
+            while upsert.call_count < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(buffer.submit(1, 2, 6))
+            while upsert.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(buffer.thread.is_alive())
+            buffer.close()
+
+        self.assertEqual([call.args[0] for call in upsert.call_args_list], [{(1, 1): 5}, {(1, 2): 6}])
+        self.assertIn("boom", logs.output[0])
+
+    @override_settings(TRENDING_HALF_LIFE_HOURS=24, TRENDING_REVIEW_WEIGHT=2, TRENDING_SETTLE_SECONDS=0)
+    def test_trending_games(self):
+        """
+        Ensure /games/trending ranks games by decayed activity and update_trending only touches active games.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.assertEqual(json.loads(self.client.get("/games/trending").content), [])
+
+        clue = Game.objects.get(pk=1)
+        sorry = Game.objects.create(
+            title="Sorry", description='some generic description', designer="Parker Brothers",
+            release_year=1950, number_of_player=4, game_duration=60, age_range=8, user_id=1)
+        raters = [User.objects.create(username=f"rater{index}") for index in range(3)]
+        for rater in raters:
+            Rating.objects.create(game=clue, user=rater, rating=7)
+        # Two half-lives ago, so Clue's three ratings count 0.75 now
+        Rating.objects.update(created_at=timezone.now() - timedelta(hours=48))
+        self.client.post("/ratings", {"gameId": sorry.id, "rating": 8}, format='json')
+        Review.objects.create(game=sorry, user_id=1, review="Quick and mean")
+        call_command("update_trending", stdout=StringIO())
+
+        response = self.client.get("/games/trending")
+        json_response = json.loads(response.content)
+        self.assertEqual([g["title"] for g in json_response], ["Sorry", "Clue"])
+        self.assertAlmostEqual(json_response[0]["trending_score"], 3, places=3)
+        self.assertAlmostEqual(json_response[1]["trending_score"], 0.75, places=3)
+
+        # New ratings of Clue only move Clue's key, to where a full run puts it
+        for rater in raters[:2]:
+            self.client.post("/ratings", {"gameId": sorry.id, "rating": 5}, format='json')
+            Rating.objects.create(game=clue, user=User.objects.create(username=f"new{rater.id}"), rating=9)
+        call_command("update_trending", stdout=StringIO())
+        self.assertEqual(TrendingRun.objects.order_by("-started_at").first().games, 1)
+        incremental = dict(Game.objects.values_list("id", "trending_key"))
+        call_command("update_trending", full=True, stdout=StringIO())
+        for game_id, key in Game.objects.values_list("id", "trending_key"):
+            self.assertAlmostEqual(incremental[game_id], key, places=6)
+
+        # Deleted and moved activity leaves the keys, to where a full run puts them
+        moved = Rating.objects.filter(game=clue, user=raters[0]).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(game=sorry).delete()
+            self.client.put(f"/ratings/{moved.id}", {"gameId": sorry.id, "rating": 6}, format='json')
+        self.assertEqual(sorted(TrendingRecount.objects.values_list("game_id", flat=True)), [clue.id, sorry.id])
+        call_command("update_trending", stdout=StringIO())
+        self.assertEqual(TrendingRun.objects.order_by("-started_at").first().games, 2)
+        self.assertFalse(TrendingRecount.objects.exists())
+        incremental = dict(Game.objects.values_list("id", "trending_key"))
+        call_command("update_trending", full=True, stdout=StringIO())
+        for game_id, key in Game.objects.values_list("id", "trending_key"):
+            self.assertAlmostEqual(incremental[game_id], key, places=6)
+
+        # A run is seen by clients holding the old list, even for activity
+        # written without this process's signals
+        etag = self.client.get("/games/trending")["ETag"]
+        Rating.objects.bulk_create([Rating(game=clue, user=User.objects.create(username=f"late{index}"), rating=9)
+                                    for index in range(5)])
+        response = self.client.get("/games/trending", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        call_command("update_trending", stdout=StringIO())
+        response = self.client.get("/games/trending", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Clue", "Sorry"])
+
+        response = self.client.get("/games/trending", {"limit": 1})
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Clue"])
+
+        # Deleting a game takes its activity along in a few queries, however
+        # much there is, without leaving recounts behind
+        Rating.objects.bulk_create([Rating(game=clue, user=User.objects.create(username=f"fan{index}"), rating=9)
+                                    for index in range(30)])
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                clue.delete()
+        self.assertLess(len(queries), 12)
+        self.assertEqual(len([query for query in queries.captured_queries if "tableversion" in query["sql"]]), 1)
+        self.assertFalse(TrendingRecount.objects.exists())
+        response = self.client.get("/games/trending", {"limit": "many"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,7 +1,10 @@
 import json
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
-from gamer_rater_server_api.models import Game, review, Category
+from gamer_rater_server_api.models import Game, Review, review, Category
 
 
 class ReviewTests(APITestCase):
@@ -61,4 +64,36 @@ class ReviewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
         self.assertEqual(json_response["game"], {'title': 'Clue'})
-        self.assertEqual(json_response["review"], 'generic review')
\ No newline at end of file
+        self.assertEqual(json_response["review"], 'generic review')
+
+    def test_list_reviews_query_count_is_constant(self):
+        """
+        Ensure listing reviews joins their users and games in, and ?user= lists one user's reviews.
+        """
+        reviewers = []
+
+        def seed_reviews(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(count):
+                    reviewers.append(User.objects.create(username=f"reviewer{len(reviewers)}"))
+                    Review.objects.create(game_id=1, user=reviewers[-1], review="generic review")
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for fast in (True, False):
+            with self.settings(FAST_READ_SERIALIZERS=fast):
+                seed_reviews(2)
+                with CaptureQueriesContext(connection) as few_reviews:
+                    self.client.get("/reviews")
+                seed_reviews(6)
+                with CaptureQueriesContext(connection) as many_reviews:
+                    response = self.client.get("/reviews")
+                self.assertEqual(len(few_reviews), len(many_reviews))
+                self.assertEqual(json.loads(response.content)["results"][0]["game"], {"title": "Clue"})
+
+                response = self.client.get("/reviews", {"user": reviewers[3].id})
+                results = json.loads(response.content)["results"]
+                self.assertEqual([r["user"]["username"] for r in results], ["reviewer3"])
+
+        for param in ("user", "game"):
+            response = self.client.get("/reviews", {param: "abc"})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
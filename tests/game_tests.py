@@ -1,8 +1,22 @@
 import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock, skipIf
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from gamer_rater_server_api import renderers
+from gamer_rater_server_api.cache import bump_versions, response_cache
+from gamer_rater_server_api.management.commands import import_catalog
 from gamer_rater_server_api.models import Game
-from gamer_rater_server_api.models import Category
+from gamer_rater_server_api.models import Category, GameCategory, Image, Rating, Review, TableVersion
+from gamer_rater_server_api.search import bitmap, fuzzy, suggest
 
 
 class GameTests(APITestCase):
@@ -40,6 +54,13 @@ class GameTests(APITestCase):
         category.label = "Board game"
         category.save()
 
+        # The in-process search indexes and the response cache outlive
+        # each test's database
+        fuzzy.game_index.clear()
+        suggest.title_index.clear()
+        bitmap.game_filters.clear()
+        response_cache().clear()
+
 
     def test_create_game(self):
         """
@@ -238,3 +259,664 @@ class GameTests(APITestCase):
 
         # Assert that the game was retrieved
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_games_query_count_is_constant(self):
+        """
+        Ensure listing games costs the same number of queries for any number of games.
+        """
+        def seed_games(count):
+            for index in range(count):
+                game = Game()
+                game.release_year = 1995
+                game.game_duration = 60
+                game.description = 'some generic description'
+                game.age_range = 60
+                game.title = f"Game {index}"
+                game.designer = "Milton Bradley"
+                game.number_of_player = 6
+                game.user_id = 1
+                game.save()
+                game.categories.set([1])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        # The first request also creates the table version rows
+        self.client.get("/games")
+
+        seed_games(2)
+        with CaptureQueriesContext(connection) as few_games:
+            response = self.client.get("/games")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        seed_games(8)
+        with CaptureQueriesContext(connection) as many_games:
+            response = self.client.get("/games")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(len(few_games), len(many_games))
+
+    def test_list_games_sparse_fields(self):
+        """
+        Ensure ?fields= narrows the games and skips the category prefetch.
+        """
+        game = Game()
+        game.release_year = 1995
+        game.game_duration = 60
+        game.description = 'some generic description'
+        game.age_range = 60
+        game.title = "Clue"
+        game.designer = "Milton Bradley"
+        game.number_of_player = 6
+        game.user_id = 1
+        game.save()
+        game.categories.set([1])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with CaptureQueriesContext(connection) as all_fields:
+            self.client.get("/games")
+        with CaptureQueriesContext(connection) as few_fields:
+            response = self.client.get("/games", {"fields": "id,title,average_rating"})
+        self.assertEqual(json.loads(response.content)["results"],
+                         [{"id": game.id, "title": "Clue", "average_rating": 0}])
+        self.assertLess(len(few_fields), len(all_fields))
+        self.assertFalse(any("description" in query["sql"] for query in few_fields.captured_queries
+                             if "gamer_rater_server_api_game" in query["sql"] and "COUNT" not in query["sql"]))
+
+        response = self.client.get(f"/games/{game.id}", {"fields": "title,categories,unknown"})
+        self.assertEqual(json.loads(response.content), {"title": "Clue", "categories": [{"id": 1, "label": "Board game"}]})
+
+        # The bitmap filtered listing narrows the same way
+        response = self.client.get("/games", {"category": 1, "fields": "title"})
+        self.assertEqual(json.loads(response.content)["results"], [{"title": "Clue"}])
+
+    def test_list_games_with_overlay(self):
+        """
+        Ensure ?overlay=1 adds the current user's rating, review and ownership in one query.
+        """
+        other = User.objects.create(username="other")
+        games = []
+        for title, owner in (("Clue", 1), ("Sorry", other.id), ("Risk", other.id)):
+            game = Game.objects.create(
+                title=title, description='some generic description', designer="Milton Bradley",
+                release_year=1995, number_of_player=6, game_duration=60, age_range=8, user_id=owner)
+            games.append(game)
+        clue, sorry, risk = games
+        Review.objects.create(game=sorry, user_id=1, review="Fun")
+        Rating.objects.create(game=risk, user=other, rating=2)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/ratings", {"gameId": clue.id, "rating": 7}, format='json')
+        self.client.get("/games")
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get("/games")
+        with CaptureQueriesContext(connection) as overlaid:
+            response = self.client.get("/games", {"overlay": "1"})
+        self.assertEqual(len(overlaid), len(plain) + 1)
+        self.assertEqual(
+            [(g["title"], g["my_rating"], g["i_reviewed"], g["is_owner"]) for g in json.loads(response.content)["results"]],
+            [("Clue", 7, False, True), ("Sorry", None, True, False), ("Risk", None, False, False)])
+        self.assertIn("Authorization", response["Vary"])
+        response = self.client.get("/games", {"overlay": "1", "limit": 1})
+        self.assertIn("overlay=1", json.loads(response.content)["next"])
+        response = self.client.get("/games", {"limit": 1})
+        self.assertNotIn("overlay", json.loads(response.content)["next"])
+
+        # The overlaid ETag is the user's own, and moves with their ratings
+        etag = self.client.get("/games", {"overlay": "1"})["ETag"]
+        self.assertNotEqual(etag, self.client.get("/games")["ETag"])
+        response = self.client.get("/games", {"overlay": "1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+        response = self.client.get("/games", {"overlay": "1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/ratings", {"gameId": sorry.id, "rating": 4}, format='json')
+        response = self.client.get("/games", {"overlay": "1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual([g["my_rating"] for g in json.loads(response.content)["results"]], [7, 4, None])
+        response = self.client.get(f"/games/{sorry.id}", {"overlay": "1", "fields": "id,my_rating"})
+        self.assertEqual(json.loads(response.content), {"id": sorry.id, "my_rating": 4})
+
+    def test_fast_serializers_match_drf(self):
+        """
+        Ensure the fast list serializers write the same bytes as the DRF serializers.
+        """
+        strategy = Category.objects.create(label="Strategy")
+        for index in range(3):
+            game = Game.objects.create(
+                title=f"Game {index}", description="some generic description", designer="Milton Bradley",
+                release_year=1995 + index, number_of_player=6, game_duration=60, age_range=8, user_id=1)
+            game.categories.set([strategy.id, 1] if index else [])
+            Rating.objects.create(game=game, user_id=1, rating=index + 3)
+            Review.objects.create(game=game, user_id=1, review=f"Review {index}")
+            Image.objects.create(game=game, user_id=1, image=f"actionimages/{index}.png" if index else None)
+        Game.objects.rebuild_rating_totals()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        urls = ["/games", "/games?fields=title,categories", "/games?category=1", "/games?cursor=&ordering=title",
+                "/ratings", "/ratings?fields=id,user", "/reviews", "/images"]
+        for url in urls:
+            with self.settings(FAST_READ_SERIALIZERS=True):
+                response_cache().clear()
+                fast = self.client.get(url)
+            with self.settings(FAST_READ_SERIALIZERS=False):
+                response_cache().clear()
+                slow = self.client.get(url)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content, url)
+
+    def test_list_images_query_count_is_constant(self):
+        """
+        Ensure listing images joins their users and games in, and ?user= lists one user's images.
+        """
+        uploaders = []
+
+        def seed_images(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(count):
+                    uploaders.append(User.objects.create(username=f"uploader{len(uploaders)}"))
+                    Image.objects.create(game_id=1, user=uploaders[-1], image=f"actionimages/{len(uploaders)}.png")
+
+        game = Game.objects.create(
+            title="Clue", description="some generic description", designer="Milton Bradley",
+            release_year=1995, number_of_player=6, game_duration=60, age_range=8, user_id=1)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        for fast in (True, False):
+            with self.settings(FAST_READ_SERIALIZERS=fast):
+                seed_images(2)
+                with CaptureQueriesContext(connection) as few_images:
+                    self.client.get("/images")
+                seed_images(6)
+                with CaptureQueriesContext(connection) as many_images:
+                    response = self.client.get("/images")
+                self.assertEqual(len(few_images), len(many_images))
+                self.assertEqual(json.loads(response.content)["results"][0]["game"], {"id": game.id, "title": "Clue"})
+
+                response = self.client.get("/images", {"user": uploaders[3].id})
+                results = json.loads(response.content)["results"]
+                self.assertEqual([i["user"]["username"] for i in results], ["uploader3"])
+
+        for param in ("user", "game"):
+            response = self.client.get("/images", {param: "abc"})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipIf(renderers.msgpack is None, "msgpack is not installed")
+    def test_render_games_as_json_and_msgpack(self):
+        """
+        Ensure orjson renders the same bytes as the stdlib, and MessagePack can be sent and asked for.
+        """
+        msgpack = renderers.msgpack
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        data = {
+            "categories": [1],
+            "releaseYear": 1995,
+            "gameDuration": 60,
+            "ageRange": 8,
+            "description": 'line\u2028separator and caf\u00e9',
+            "title": "Clue",
+            "designer": "Milton Bradley",
+            "numberOfPlayers": 6,
+        }
+        response = self.client.post("/games", msgpack.packb(data), content_type="application/msgpack",
+                                    HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content)["description"], data["description"])
+
+        fast = self.client.get("/games")
+        response_cache().clear()
+        with mock.patch.object(renderers, "orjson", None):
+            slow = self.client.get("/games")
+        self.assertEqual(fast.content, slow.content)
+        self.assertIn(b"\\u2028", fast.content)
+
+        response = self.client.get("/games", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(fast.content))
+
+    def test_list_games_from_cache(self):
+        """
+        Ensure repeated game lists skip the database until a game or rating changes.
+        """
+        game = Game()
+        game.release_year = 1995
+        game.game_duration = 60
+        game.description = 'some generic description'
+        game.age_range = 60
+        game.title = "Clue"
+        game.designer = "Milton Bradley"
+        game.number_of_player = 6
+        game.user_id = 1
+        game.save()
+        game.categories.set([1])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        first = self.client.get("/games")
+
+        # Only the token lookup and the table versions are left
+        with self.assertNumQueries(2):
+            second = self.client.get("/games")
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/ratings", {"gameId": game.id, "rating": 8}, format='json')
+        response = self.client.get("/games")
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["results"][0]["average_rating"], 8)
+
+        self.client.get(f"/games/{game.id}")
+        game.title = "Cluedo"
+        with self.captureOnCommitCallbacks(execute=True):
+            game.save()
+        response = self.client.get(f"/games/{game.id}")
+        self.assertEqual(json.loads(response.content)["title"], "Cluedo")
+
+    def test_cache_versions_are_shared_between_processes(self):
+        """
+        Ensure ETags and cached lists follow table versions stored in the database, not in one process.
+        """
+        game = Game.objects.create(
+            title="Clue", description="some generic description", designer="Milton Bradley",
+            release_year=1995, number_of_player=6, game_duration=60, age_range=8, user_id=1)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        etag = self.client.get("/games")["ETag"]
+
+        # A worker with an empty cache of its own agrees on the ETag
+        response_cache().clear()
+        response = self.client.get("/games", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Another process writes the game and bumps the version, this
+        # process's cached body is passed over
+        Game.objects.filter(pk=game.id).update(title="Cluedo")
+        TableVersion.objects.filter(table=Game._meta.db_table).update(version=F("version") + 1)
+        response = self.client.get("/games", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["results"][0]["title"], "Cluedo")
+
+    def test_bulk_create_games(self):
+        """
+        Ensure games can be created in bulk, and that one invalid game stops all of them.
+        """
+        def game_data(index):
+            return {
+                "title": f"Game {index}",
+                "description": "some generic description",
+                "designer": "Milton Bradley",
+                "numberOfPlayers": 4,
+                "releaseYear": 1990 + index,
+                "gameDuration": 60,
+                "ageRange": 8,
+                "categories": [1],
+            }
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        invalid = game_data(2)
+        del invalid["designer"]
+        invalid["releaseYear"] = "soon"
+        invalid["categories"] = [1, 99]
+        response = self.client.post("/games/bulk", [game_data(1), invalid], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        json_response = json.loads(response.content)
+        self.assertEqual([e["index"] for e in json_response["errors"]], [1])
+        self.assertEqual(set(json_response["errors"][0]["errors"]), {"designer", "releaseYear", "categories"})
+        self.assertEqual(Game.objects.count(), 0)
+
+        # Load the search indexes before the games arrive
+        self.client.get("/games", {"q": "Game", "fuzzy": "1"})
+        self.client.get("/games", {"category": "1"})
+
+        with self.settings(GAME_BULK_BATCH_SIZE=2):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/games/bulk", [game_data(index) for index in range(5)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        json_response = json.loads(response.content)
+        self.assertEqual([r["index"] for r in json_response], [0, 1, 2, 3, 4])
+
+        # The returned ids point at the right games, with their categories
+        for result in json_response:
+            game = Game.objects.get(pk=result["id"])
+            self.assertEqual(game.title, f"Game {result['index']}")
+            self.assertEqual([c.id for c in game.categories.all()], [1])
+
+        # The new games reach the search indexes without a post_save
+        response = self.client.get("/games", {"q": "Game 3", "fuzzy": "1"})
+        self.assertIn("Game 3", [g["title"] for g in json.loads(response.content)["results"]])
+        response = self.client.get("/games", {"category": "1", "release_year_min": 1993})
+        self.assertEqual(json.loads(response.content)["count"], 2)
+
+    def test_export_games(self):
+        """
+        Ensure the whole catalog streams out as NDJSON and as CSV.
+        """
+        for index in range(3):
+            game = Game()
+            game.release_year = 1995
+            game.game_duration = 60
+            game.description = 'some generic description'
+            game.age_range = 60
+            game.title = f"Game {index}"
+            game.designer = "Milton Bradley"
+            game.number_of_player = 6
+            game.user_id = 1
+            game.save()
+            game.categories.set([1] if index else [])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get("/games/export")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        games = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([g["title"] for g in games], ["Game 0", "Game 1", "Game 2"])
+        self.assertEqual(games[0]["categories"], [])
+        self.assertEqual(games[1]["categories"], [{"id": 1, "label": "Board game"}])
+        self.assertEqual(games[1]["average_rating"], 0)
+
+        response = self.client.get("/games/export", {"output": "csv"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith("id,title,"))
+        self.assertTrue(lines[2].endswith(",Board game"))
+
+        response = self.client.get("/games/export", {"output": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_catalog(self):
+        """
+        Ensure import_catalog loads linked files and rebuilds the totals and search index.
+        """
+        files = {
+            "categories.csv": "id,label\n7,Strategy\n8,Board game\n",
+            "games.ndjson": "\n".join(json.dumps(game) for game in [
+                {"id": 100, "title": "Catan", "description": "trading", "designer": "Klaus Teuber",
+                 "number_of_player": 4, "release_year": 1995, "game_duration": 90, "age_range": 10,
+                 "categories": [{"id": 7, "label": "Strategy"}]},
+                {"id": 101, "title": "Azul", "description": "tiles", "designer": "Michael Kiesling",
+                 "number_of_player": 4, "release_year": 2017, "game_duration": 45, "age_range": 8,
+                 "categories": [7, 8]},
+                {"id": 102, "title": "Broken", "description": "no year", "designer": "Nobody"},
+            ]),
+            "ratings.csv": "game,user,rating,created_at\n100,steve,8,\n100,steve,6,\n101,nobody,5,\n"
+                           "101,steve,7,2999-01-01T00:00:00Z\n101,steve,7,yesterday\n",
+            "reviews.ndjson": json.dumps({"game": 101, "user": "steve", "review": "Pretty tiles",
+                                          "created_at": "2024-05-01T18:30:00Z"}),
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for name, content in files.items():
+                with open(os.path.join(directory, name), "w") as file:
+                    file.write(content)
+            call_command(
+                "import_catalog", owner="steve", batch_size=1,
+                categories=os.path.join(directory, "categories.csv"),
+                games=os.path.join(directory, "games.ndjson"),
+                ratings=os.path.join(directory, "ratings.csv"),
+                reviews=os.path.join(directory, "reviews.ndjson"),
+                stdout=StringIO(), stderr=StringIO())
+
+        catan = Game.objects.get(title="Catan")
+        azul = Game.objects.get(title="Azul")
+        self.assertFalse(Game.objects.filter(title="Broken").exists())
+        self.assertEqual([c.label for c in catan.categories.all()], ["Strategy"])
+        self.assertEqual(sorted(c.id for c in azul.categories.all()), [1, Category.objects.get(label="Strategy").id])
+
+        # The unknown user's rating and the badly dated ones were skipped,
+        # and steve's second rating replaced the first
+        self.assertEqual(catan.rating_count, 1)
+        self.assertEqual(catan.average_rating, 6)
+        self.assertEqual(azul.rating_count, 0)
+        self.assertEqual(azul.review_set.get().review, "Pretty tiles")
+
+        # Undated rows are back catalog, dated ones keep their time
+        self.assertEqual(catan.rating_set.get().created_at, import_catalog.UNDATED)
+        self.assertEqual(azul.review_set.get().created_at.isoformat(), "2024-05-01T18:30:00+00:00")
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get("/games", {"q": "teuber"})
+        self.assertEqual([g["title"] for g in json.loads(response.content)["results"]], ["Catan"])
+
+    def test_get_game_not_modified(self):
+        """
+        Ensure an unchanged game is answered with 304 until the game or its ratings change.
+        """
+        game = Game()
+        game.release_year = 1995
+        game.game_duration = 60
+        game.description = 'some generic description'
+        game.age_range = 60
+        game.title = "Clue"
+        game.designer = "Milton Bradley"
+        game.number_of_player = 6
+        game.user_id = 1
+        game.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        etag = self.client.get(f"/games/{game.id}")["ETag"]
+        response = self.client.get(f"/games/{game.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/ratings", {"gameId": game.id, "rating": 8}, format='json')
+        response = self.client.get(f"/games/{game.id}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["average_rating"], 8)
+
+    def test_search_games(self):
+        """
+        Ensure games are found by title, description or designer prefix.
+        """
+        game = Game()
+        game.release_year = 1995
+        game.game_duration = 60
+        game.description = 'a murder mystery'
+        game.age_range = 60
+        game.title = "Clue"
+        game.designer = "Hasbro"
+        game.number_of_player = 6
+        game.user_id = 1
+        game.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        for search_text in ("clu", "murd", "hasbro"):
+            response = self.client.get("/games", {"q": search_text})
+            json_response = json.loads(response.content)
+            self.assertEqual([g["title"] for g in json_response["results"]], ["Clue"])
+
+        # Changes to the game are reflected in the index
+        self.client.get(f"/games/{game.id}")
+        game.title = "Cluedo"
+        with self.captureOnCommitCallbacks(execute=True):
+            game.save()
+        response = self.client.get("/games", {"q": "cluedo"})
+        self.assertEqual(json.loads(response.content)["count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            game.delete()
+        response = self.client.get("/games", {"q": "clu"})
+        self.assertEqual(json.loads(response.content)["count"], 0)
+
+    def test_fuzzy_search_games(self):
+        """
+        Ensure misspelled titles and designers still find games.
+        """
+        game = Game()
+        game.release_year = 1995
+        game.game_duration = 60
+        game.description = 'some generic description'
+        game.age_range = 60
+        game.title = "Monopoly"
+        game.designer = "Milton Bradley"
+        game.number_of_player = 6
+        game.user_id = 1
+        game.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        for search_text in ("Milton Bradly", "monopolly", "bradlee"):
+            response = self.client.get("/games", {"q": search_text, "fuzzy": 1})
+            json_response = json.loads(response.content)
+            self.assertEqual([g["title"] for g in json_response["results"]], ["Monopoly"])
+
+        # Saved changes reach the loaded index once they commit
+        with self.captureOnCommitCallbacks(execute=True):
+            game.title = "Scrabble"
+            game.save()
+        response = self.client.get("/games", {"q": "scrable", "fuzzy": 1})
+        self.assertEqual(json.loads(response.content)["count"], 1)
+        response = self.client.get("/games", {"q": "monopolly", "fuzzy": 1})
+        self.assertEqual(json.loads(response.content)["count"], 0)
+
+        # A write from another process sends this one no signal, only the
+        # version bumps its own signals make, which reload the index
+        etag = self.client.get("/games", {"q": "risc", "fuzzy": 1})["ETag"]
+        Game.objects.filter(pk=game.id).update(title="Risk")
+        bump_versions(Game._meta.db_table, fuzzy.VERSION_KEY)
+        response = self.client.get("/games", {"q": "risc", "fuzzy": 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["count"], 1)
+
+    def test_suggest_titles(self):
+        """
+        Ensure title suggestions match the prefix and put the most rated games first.
+        """
+        for title, rating_count in (("Monopoly", 2), ("Mouse Trap", 9), ("Clue", 50)):
+            game = Game()
+            game.release_year = 1995
+            game.game_duration = 60
+            game.description = 'some generic description'
+            game.age_range = 60
+            game.title = title
+            game.designer = "Milton Bradley"
+            game.number_of_player = 6
+            game.user_id = 1
+            game.rating_count = rating_count
+            game.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get("/games/suggest", {"prefix": "mo"})
+        json_response = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([g["title"] for g in json_response], ["Mouse Trap", "Monopoly"])
+        self.assertEqual(set(json_response[0]), {"id", "title"})
+
+        response = self.client.get("/games/suggest", {"prefix": "mono"})
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Monopoly"])
+
+        # A title written by another process shows once it bumps the version
+        Game.objects.filter(title="Monopoly").update(title="Mastermind")
+        bump_versions(Game._meta.db_table, suggest.VERSION_KEY)
+        response = self.client.get("/games/suggest", {"prefix": "ma"})
+        self.assertEqual([g["title"] for g in json.loads(response.content)], ["Mastermind"])
+
+    def test_filter_and_order_games(self):
+        """
+        Ensure games can be filtered by category and attributes, ordered, and counted per facet.
+        """
+        strategy = Category()
+        strategy.label = "Strategy"
+        strategy.save()
+
+        for title, release_year, players, average, categories in (
+                ("Risk", 1959, 6, 7.5, [1, 2]),
+                ("Catan", 1995, 4, 9.0, [1, 2]),
+                ("Clue", 1949, 6, 6.0, [1])):
+            game = Game()
+            game.release_year = release_year
+            game.game_duration = 60
+            game.description = 'some generic description'
+            game.age_range = 10
+            game.title = title
+            game.designer = "Milton Bradley"
+            game.number_of_player = players
+            game.user_id = 1
+            game.average_rating = average
+            game.save()
+            game.categories.set(categories)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        response = self.client.get("/games", {"category": "1,2", "ordering": "-average_rating"})
+        json_response = json.loads(response.content)
+        self.assertEqual([g["title"] for g in json_response["results"]], ["Catan", "Risk"])
+
+        response = self.client.get("/games", {"number_of_player_min": 6, "release_year_max": 1960, "ordering": "title"})
+        json_response = json.loads(response.content)
+        self.assertEqual([g["title"] for g in json_response["results"]], ["Clue", "Risk"])
+        self.assertNotIn("facets", json_response)
+
+        response = self.client.get("/games", {"number_of_player_min": 6, "release_year_max": 1960, "ordering": "title",
+                                              "facets": 1})
+        json_response = json.loads(response.content)
+        self.assertEqual(json_response["facets"]["categories"], [
+            {"id": 1, "label": "Board game", "count": 2},
+            {"id": 2, "label": "Strategy", "count": 1},
+        ])
+        self.assertEqual(json_response["facets"]["decades"], [
+            {"decade": 1940, "count": 1},
+            {"decade": 1950, "count": 1},
+        ])
+
+        response = self.client.get("/games", {"ordering": "designer"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_games_with_bitmaps(self):
+        """
+        Ensure filtered lists from the bitmap index page, count and follow category changes.
+        """
+        strategy = Category()
+        strategy.label = "Strategy"
+        strategy.save()
+
+        games = []
+        for index in range(5):
+            game = Game()
+            game.release_year = 1990 + index * 5
+            game.game_duration = 60
+            game.description = 'some generic description'
+            game.age_range = 10
+            game.title = f"Game {index}"
+            game.designer = "Milton Bradley"
+            game.number_of_player = 2 + index
+            game.user_id = 1
+            game.save()
+            game.categories.set([1, 2] if index % 2 == 0 else [1])
+            games.append(game)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = self.client.get("/games", {"category": "1,2", "number_of_player_min": 3, "limit": 1, "offset": 1,
+                                              "facets": 1})
+        json_response = json.loads(response.content)
+
+        # Games 2 and 4 match, and the second page holds game 4
+        self.assertEqual(json_response["count"], 2)
+        self.assertEqual([g["title"] for g in json_response["results"]], ["Game 4"])
+        self.assertEqual(json_response["results"][0]["categories"], [
+            {"id": 1, "label": "Board game"}, {"id": 2, "label": "Strategy"}])
+        self.assertEqual(json_response["facets"], {
+            "categories": [{"id": 1, "label": "Board game", "count": 2}, {"id": 2, "label": "Strategy", "count": 2}],
+            "decades": [{"decade": 2000, "count": 1}, {"decade": 2010, "count": 1}],
+        })
+
+        # Category changes reach the loaded index once they commit
+        with self.captureOnCommitCallbacks(execute=True):
+            games[3].categories.set([1, 2])
+            games[4].categories.set([1])
+        response = self.client.get("/games", {"category": "1,2", "number_of_player_min": 3})
+        json_response = json.loads(response.content)
+        self.assertEqual([g["title"] for g in json_response["results"]], ["Game 2", "Game 3"])
+
+        # A write from another process sends this one no signal, only the
+        # version bumps its own signals make, which reload the index
+        GameCategory.objects.filter(game=games[1]).delete()
+        games[1].categories.through.objects.bulk_create([
+            GameCategory(game=games[1], category_id=1), GameCategory(game=games[1], category_id=2)])
+        bump_versions(GameCategory._meta.db_table, bitmap.VERSION_KEY)
+        response = self.client.get("/games", {"category": "1,2", "number_of_player_min": 3})
+        self.assertEqual([g["title"] for g in json.loads(response.content)["results"]], ["Game 1", "Game 2", "Game 3"])